@@ -1,12 +1,89 @@
 import cv2
+import numpy as np
 import mediapipe as mp
 
 red = (0, 0, 255)
 green = (0, 255, 0)
 blue = (255, 0, 0)
 
+fingerTips = np.array([4, 8, 12, 16, 20])
+
+class HandLandmarks:
+    """The 21 landmarks of one hand as an int (21, 3) array of [id, x, y] rows, plus handedness."""
+    def __init__(self, points, label=None, score=0.0):
+        self.points = points
+        self.label = label
+        self.score = score
+
+    @classmethod
+    def fromMediapipe(cls, handLandmarks, w, h, label=None, score=0.0):
+        coords = np.fromiter((c for lm in handLandmarks.landmark for c in (lm.x, lm.y)),
+                             dtype=np.float64, count=2 * len(handLandmarks.landmark)).reshape(-1, 2)
+        points = np.empty((len(coords), 3), dtype=np.int32)
+        points[:, 0] = np.arange(len(coords))
+        points[:, 1:] = coords * (w, h)
+        return cls(points, label, score)
+
+    # Indexing and len() behave like the old list of [id, x, y] lists
+    def __len__(self):
+        return len(self.points)
+
+    def __getitem__(self, index):
+        return self.points[index]
+
+    def fingersUp(self):
+        """[index, middle, ring, pinky, thumb] as 1 (up) or 0, in the order fing_up always returned."""
+        tips = self.points[fingerTips]
+        joints = self.points[fingerTips - 2]
+        fingers = (tips[1:, 2] < joints[1:, 2]).astype(int).tolist()
+        fingers.append(int(tips[0, 1] > joints[0, 1]))
+        return fingers
+
+    def distance(self, a, b):
+        dx, dy = self.points[a, 1:] - self.points[b, 1:]
+        return float(np.hypot(dx, dy))
+
+    def pinchDistance(self):
+        return self.distance(4, 8)
+
+    def fingertipDistances(self):
+        """(5, 5) matrix of pixel distances between all pairs of fingertips."""
+        tips = self.points[fingerTips, 1:].astype(np.float32)
+        diff = tips[:, None, :] - tips[None, :, :]
+        return np.sqrt((diff * diff).sum(axis=2))
+
+    def fingertipSpread(self):
+        return float(self.fingertipDistances().max())
+
+class HandTracker:
+    """Two MediaPipe Hands instances with separate tracking state: searchHands looks for every hand, trackHands
+    (max_num_hands=1) follows a single known hand without re-running palm detection for a second one on each
+    frame. Both get full frames so the rect MediaPipe tracks between frames stays in the same coordinates."""
+    def __init__(self, searchHands, trackHands, refreshInterval=15):
+        self.searchHands = searchHands
+        self.trackHands = trackHands
+        self.refreshInterval = refreshInterval
+        self.tracking = False
+        self.framesSinceSearch = 0
+        self.trackedFrames = 0
+        self.searchFrames = 0
+
+    def process(self, frameRGB):
+        if self.tracking and self.framesSinceSearch < self.refreshInterval:
+            results = self.trackHands.process(frameRGB)
+            if results.multi_hand_landmarks:
+                self.trackedFrames += 1
+                self.framesSinceSearch += 1
+                return results
+        # Hand lost, no or two hands, or periodic refresh: look for every hand in the frame
+        results = self.searchHands.process(frameRGB)
+        self.searchFrames += 1
+        self.framesSinceSearch = 0
+        self.tracking = bool(results.multi_hand_landmarks) and len(results.multi_hand_landmarks) == 1
+        return results
+
 class Detector:
-    def __init__(self, mode=False, maxHands=2, detectionCon=0.5, trackingCon=0.5):
+    def __init__(self, mode=False, maxHands=2, detectionCon=0.5, trackingCon=0.5, handTracking=True):
         self.mode = mode
         self.maxHands = maxHands
         self.detectionCon = detectionCon
@@ -20,10 +97,22 @@ class Detector:
         )
         self.Draw = mp.solutions.drawing_utils
         self.Indexes = [4, 8, 12, 16, 20]
+        self.tracker = None
+        if handTracking and not self.mode and self.maxHands > 1:
+            trackHands = self.mediapipeHands.Hands(
+                static_image_mode=False,
+                max_num_hands=1,
+                min_detection_confidence=self.detectionCon,
+                min_tracking_confidence=self.trackingCon
+            )
+            self.tracker = HandTracker(self.hands, trackHands)
 
     def findHands(self, frame, draw=True):
         frameRGB = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        self.results = self.hands.process(frameRGB)
+        if self.tracker is not None:
+            self.results = self.tracker.process(frameRGB)
+        else:
+            self.results = self.hands.process(frameRGB)
 
         if self.results.multi_hand_landmarks:
             for handlandmarks in self.results.multi_hand_landmarks:
@@ -32,32 +121,21 @@ class Detector:
         return frame
 
     def Position(self, frame, handNo=0, draw=True):
+        """HandLandmarks of hand handNo in pixel coordinates, or [] when no hand was found."""
         self.landmarkList = []
         if self.results.multi_hand_landmarks:
-            myHands = self.results.multi_hand_landmarks[handNo]
-            for id, lm in enumerate(myHands.landmark):
-                h, w, c = frame.shape
-                x, y = int(lm.x * w), int(lm.y * h)
-                self.landmarkList.append([id, x, y])
-                if draw:
+            h, w = frame.shape[:2]
+            label, score = None, 0.0
+            if self.results.multi_handedness:
+                classification = self.results.multi_handedness[handNo].classification[0]
+                label, score = classification.label, classification.score
+            self.landmarkList = HandLandmarks.fromMediapipe(self.results.multi_hand_landmarks[handNo], w, h, label, score)
+            if draw:
+                for _, x, y in self.landmarkList.points.tolist():
                     cv2.circle(frame, (x, y), 8, red, -1)
         return self.landmarkList
 
     def fing_up(self):
-        fingers = []
         if not self.landmarkList:
             return [0] * 5  # No landmarks detected
-
-        for index in range(1, 5):
-            if self.landmarkList[self.Indexes[index]][2] < self.landmarkList[self.Indexes[index] - 2][2]:
-                fingers.append(1)
-            else:
-                fingers.append(0)
-
-        # Thumb
-        if self.landmarkList[self.Indexes[0]][1] > self.landmarkList[self.Indexes[0] - 2][1]:
-            fingers.append(1)
-        else:
-            fingers.append(0)
-
-        return fingers
+        return self.landmarkList.fingersUp()
@@ -1,10 +1,12 @@
 from flask import Flask, render_template, request, jsonify, url_for
 from flask_cors import CORS
 from flask_sock import Sock
-import sqlite3
 import datetime
 import json
 import os
+import sys
+from threading import Thread
+from command_db import ConnectionPool, BatchWriter, migrate_db, migrate_files, retention_worker
 
 app = Flask(__name__)
 CORS(app)
@@ -13,14 +15,13 @@ sock = Sock(app)
 # نام فایل دیتابیس SQLite
 DB_FILE = "servo_commands.db"
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    return conn
+db_pool = ConnectionPool(DB_FILE)
+# جدول‌هایی که مهاجرت و پاک‌سازی دوره‌ای روی آن‌ها انجام می‌شود
+COMMAND_TABLES = ["servo_commands", "color_commands"]
 
 def init_db():
     """ایجاد دیتابیس و جداول servo_commands و color_commands در صورت عدم وجود"""
-    conn = get_db_connection()
+    conn = db_pool.connect()
     try:
         conn.execute("""
             CREATE TABLE IF NOT EXISTS servo_commands (
@@ -40,38 +41,38 @@ def init_db():
             );
         """)
         conn.commit()
+        migrate_db(conn, COMMAND_TABLES)
         print("✅ دیتابیس و جداول ایجاد شدند یا موجود بودند.")
     except Exception as e:
         print("❌ خطا در ایجاد دیتابیس/جدول:", e)
     finally:
         conn.close()
 
-init_db()
+db_writer = None  # در start_server ساخته می‌شود
 
-def insert_servo_command(servo1, servo2):
-    conn = get_db_connection()
-    try:
-        conn.execute("INSERT INTO servo_commands (servo1, servo2) VALUES (?, ?)", (servo1, servo2))
-        conn.commit()
+def start_server():
+    """ساخت/ارتقای دیتابیس، نویسنده دسته‌ای و پاک‌سازی دوره‌ای؛ import ماژول به دیتابیس دست نمی‌زند
+    و این تابع قبل از app.run یک بار صدا زده می‌شود"""
+    global db_writer
+    if db_writer is not None:
+        return
+    init_db()
+    db_writer = BatchWriter(db_pool)
+    Thread(target=retention_worker, args=(db_pool, COMMAND_TABLES), daemon=True).start()
+
+def insert_servo_command(servo1, servo2, wait=True):
+    if db_writer.submit("INSERT INTO servo_commands (servo1, servo2) VALUES (?, ?)", (servo1, servo2), wait):
         return True
-    except Exception as e:
-        print("❌ خطا در درج دستور سروو:", e)
-        return False
-    finally:
-        conn.close()
+    print("❌ خطا در درج دستور سروو")
+    return False
 
-def insert_color_command(color):
-    conn = get_db_connection()
-    try:
-        conn.execute("INSERT INTO color_commands (color) VALUES (?)", (color,))
-        conn.commit()
+def insert_color_command(color, wait=True):
+    def committed():
         print(f"✅ رنگ '{color}' در جدول ثبت شد.")
+    if db_writer.submit("INSERT INTO color_commands (color) VALUES (?)", (color,), wait, on_commit=committed):
         return True
-    except Exception as e:
-        print("❌ خطا در درج دستور رنگ:", e)
-        return False
-    finally:
-        conn.close()
+    print("❌ خطا در درج دستور رنگ")
+    return False
 
 # لیست اتصال‌های وب‌سوکت فعال
 clients = []
@@ -109,24 +110,22 @@ def set_servo():
 
 @app.route('/get_status', methods=['GET'])
 def get_status():
-    conn = get_db_connection()
     try:
-        cur = conn.execute("""
-            SELECT servo1, servo2, created_at 
-            FROM servo_commands 
-            WHERE processed = 0 
-            ORDER BY created_at DESC 
-            LIMIT 1
-        """)
-        row = cur.fetchone()
-        if row:
-            return jsonify(dict(row))
-        else:
-            return jsonify({'servo1': 90, 'servo2': 90})
+        with db_pool.connection() as conn:
+            cur = conn.execute("""
+                SELECT servo1, servo2, created_at 
+                FROM servo_commands 
+                WHERE processed = 0 
+                ORDER BY created_at DESC 
+                LIMIT 1
+            """)
+            row = cur.fetchone()
+            if row:
+                return jsonify(dict(row))
+            else:
+                return jsonify({'servo1': 90, 'servo2': 90})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
-    finally:
-        conn.close()
 
 @app.route('/get_gallery')
 def get_gallery():
@@ -174,6 +173,11 @@ def save_drawing():
             print("❌ خطا در ارسال به وب‌سوکت:", e)
     return jsonify({'status': 'success', 'message': 'اعلان ارسال شد'})
 
+@app.route('/db_stats')
+def db_stats():
+    """آمار نوشتن دسته‌ای دیتابیس"""
+    return jsonify(db_writer.metrics())
+
 @sock.route('/ws')
 def websocket(ws):
     clients.append(ws)
@@ -190,7 +194,7 @@ def websocket(ws):
                 elif 'color' in msg:
                     color = msg.get("color")
                     print("📥 دریافت دستور رنگ:", color)
-                    insert_color_command(color)
+                    insert_color_command(color, wait=False)
                     for client in clients.copy():
                         try:
                             client.send(json.dumps({"color": color, "timestamp": datetime.datetime.now().isoformat()}))
@@ -205,4 +209,9 @@ def websocket(ws):
         print("یک کلاینت وب‌سوکت قطع شد. تعداد:", len(clients))
 
 if __name__ == '__main__':
+    # ارتقای فایل‌های دیتابیس دیگر بدون اجرای سرور: python 3.py --migrate old.db ...
+    if len(sys.argv) > 1 and sys.argv[1] == '--migrate':
+        migrate_files(sys.argv[2:], COMMAND_TABLES)
+        sys.exit(0)
+    start_server()
     app.run(host='0.0.0.0', port=7000)
\ No newline at end of file
@@ -1,22 +1,39 @@
 from flask import Flask, Response, render_template_string
 from flask_sock import Sock
-import time
+import threading
 
 app = Flask(__name__)
 sock = Sock(app)
 
-# متغیر سراسری جهت ذخیره آخرین فریم دریافتی از ESP32
-latest_frame = None
+# آخرین فریم دریافتی از ESP32
+class FramePublisher:
+    """آخرین فریم JPEG به همراه شماره نسخه؛ بینندگان تا رسیدن نسخه جدید منتظر می‌مانند و فریم تکراری نمی‌گیرند"""
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.frame = None
+        self.version = 0
+
+    def publish(self, frame):
+        with self.condition:
+            self.frame = frame
+            self.version += 1
+            self.condition.notify_all()
+
+    def wait_for_new(self, last_version, timeout=1.0):
+        with self.condition:
+            self.condition.wait_for(lambda: self.frame is not None and self.version != last_version, timeout)
+            return self.version, self.frame
+
+latest_frames = FramePublisher()
 
 # وب‌سوکت برای دریافت فریم‌های باینری از ESP32
 @sock.route('/ws')
 def ws_handler(ws):
-    global latest_frame
     while True:
         data = ws.receive()
         if data is None:
             break
-        latest_frame = data
+        latest_frames.publish(data)
 
 # صفحه اصلی وب با HTML داخلی
 @app.route('/')
@@ -37,16 +54,15 @@ def index():
 
 # تابع تولید کننده فریم‌ها به فرمت MJPEG
 def gen_frames():
-    global latest_frame
+    # بدون sleep ثابت: هر فریم جدید بلافاصله و فقط یک بار ارسال می‌شود
+    last_version = 0
     while True:
-        if latest_frame is None:
-            time.sleep(0.01)
+        version, frame = latest_frames.wait_for_new(last_version)
+        if frame is None or version == last_version:
             continue
-        # ارسال فریم به صورت بخش‌های MJPEG
+        last_version = version
         yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + latest_frame + b'\r\n')
-        # کاهش تاخیر بین ارسال فریم‌ها
-        time.sleep(0.05)
+               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
 
 # endpoint ارائه استریم MJPEG به مرورگر
 @app.route('/video_feed')
@@ -212,50 +212,85 @@ def get_animation_progress(start_time, duration):
     progress = min(elapsed / duration, 1.0)
     return progress
 
+# کش تصاویر آماده پیام‌ها: کادر، حاشیه و متن هر مرحله انیمیشن یک بار رسم می‌شوند
+ANIMATION_STEPS = 16
+TEXT_SPRITE_CACHE_SIZE = 128
+text_sprites = {}
+
+def render_text_sprite(text, position, font, text_color, bg_color, border_color, anim_progress):
+    bidi_text = get_display(arabic_reshaper.reshape(text))
+    text_w, text_h = get_text_size(text, font)
+    bbox = font.getbbox(bidi_text)
+    text_x, text_y = position
+    alpha = int(255 * anim_progress)
+    scale = 1.0 + 0.2 * (1.0 - anim_progress)
+    bg_alpha = int(128 * anim_progress)
+    margin = 10
+    scaled_w = text_w * scale
+    scaled_h = text_h * scale
+    offset_x = (scaled_w - text_w) / 2
+    offset_y = (scaled_h - text_h) / 2
+    # مختصات کادر مثل rounded_rectangle در مختصات فریم گرد می‌شود تا انتقال آن به تصویر کوچک دقیق باشد
+    box = tuple(round(v) for v in (text_x-margin-offset_x, text_y-margin-offset_y, text_x+text_w+margin+offset_x, text_y+text_h+margin+offset_y))
+    left = min(box[0], text_x + bbox[0]) - 1
+    top = min(box[1], text_y + bbox[1]) - 1
+    right = max(box[2], text_x + bbox[2]) + 1
+    bottom = max(box[3], text_y + bbox[3]) + 1
+    size = (right - left, bottom - top)
+    shifted_box = (box[0] - left, box[1] - top, box[2] - left, box[3] - top)
+    layers = []
+    mask = Image.new("L", size, 0)
+    ImageDraw.Draw(mask).rounded_rectangle(shifted_box, radius=5, fill=255)
+    layers.append((mask, bg_color[:3], bg_alpha))
+    if border_color:
+        start_border_color = (100, 100, 100)
+        animated_border = tuple(
+            int(start_border_color[i] + (border_color[i] - start_border_color[i]) * anim_progress)
+            for i in range(3)
+        )
+        mask = Image.new("L", size, 0)
+        ImageDraw.Draw(mask).rounded_rectangle(shifted_box, radius=5, outline=255, width=1)
+        layers.append((mask, animated_border, alpha))
+    # PIL آلفای رنگ متن را روی تصویر RGB نادیده می‌گیرد، پس متن همیشه کامل رسم شده است
+    mask = Image.new("L", size, 0)
+    ImageDraw.Draw(mask).text((text_x - left, text_y - top), bidi_text, font=font, fill=255)
+    layers.append((mask, text_color, 255))
+    # لایه‌ها به ترتیب رسم، از پایین به بالا، با هم ترکیب می‌شوند (رنگ در آلفا ضرب شده، BGR)
+    premultiplied = np.zeros((size[1], size[0], 3), dtype=np.float32)
+    coverage = np.zeros((size[1], size[0], 1), dtype=np.float32)
+    for mask, color, layer_alpha in layers:
+        a = np.asarray(mask, dtype=np.float32)[:, :, None] * (layer_alpha / (255.0 * 255.0))
+        premultiplied = np.array(color[::-1], dtype=np.float32) * a + premultiplied * (1.0 - a)
+        coverage = a + coverage * (1.0 - a)
+    return premultiplied, 1.0 - coverage, left, top
+
+# ترکیب تصویر آماده پیام با فریم فقط در محدوده خود پیام
+def blend_sprite(image, sprite):
+    premultiplied, transparency, left, top = sprite
+    h, w = transparency.shape[:2]
+    ix0, iy0 = max(0, left), max(0, top)
+    ix1, iy1 = min(image.shape[1], left + w), min(image.shape[0], top + h)
+    if ix0 >= ix1 or iy0 >= iy1:
+        return
+    sx, sy = ix0 - left, iy0 - top
+    sw, sh = ix1 - ix0, iy1 - iy0
+    roi = image[iy0:iy1, ix0:ix1]
+    blended = roi * transparency[sy:sy + sh, sx:sx + sw] + premultiplied[sy:sy + sh, sx:sx + sw]
+    roi[:] = (blended + 0.5).astype(np.uint8)
+
 # تابع برای نمایش متن فارسی با انیمیشن
 def draw_persian_text_pil(image, text, position, font, text_color, bg_color=(0, 0, 0, 128), border_color=None, anim_progress=1.0):
     try:
-        pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-        draw = ImageDraw.Draw(pil_image, 'RGBA')
-        
-        reshaped_text = arabic_reshaper.reshape(text)
-        bidi_text = get_display(reshaped_text)
-        text_w, text_h = get_text_size(text, font)
-        text_x, text_y = position
-
-        alpha = int(255 * anim_progress)
-        scale = 1.0 + 0.2 * (1.0 - anim_progress)
-        bg_alpha = int(128 * anim_progress)
-
-        if border_color:
-            start_border_color = (100, 100, 100)
-            border_color = tuple(
-                int(start_border_color[i] + (border_color[i] - start_border_color[i]) * anim_progress)
-                for i in range(3)
-            ) + (alpha,)
-
-        margin = 10
-        scaled_w = text_w * scale
-        scaled_h = text_h * scale
-        offset_x = (scaled_w - text_w) / 2
-        offset_y = (scaled_h - text_h) / 2
-
-        draw.rounded_rectangle(
-            (text_x-margin-offset_x, text_y-margin-offset_y, text_x+text_w+margin+offset_x, text_y+text_h+margin+offset_y),
-            radius=5,
-            fill=(bg_color[0], bg_color[1], bg_color[2], bg_alpha)
-        )
-        
-        if border_color:
-            draw.rounded_rectangle(
-                (text_x-margin-offset_x, text_y-margin-offset_y, text_x+text_w+margin+offset_x, text_y+text_h+margin+offset_y),
-                radius=5,
-                outline=border_color,
-                width=1
-            )
-
-        draw.text((text_x, text_y), bidi_text, font=font, fill=(text_color[0], text_color[1], text_color[2], alpha))
-        image[:] = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+        step = int(round(anim_progress * ANIMATION_STEPS))
+        key = (text, tuple(position), font, tuple(text_color), tuple(bg_color), tuple(border_color) if border_color else None, step)
+        sprite = text_sprites.pop(key, None)
+        if sprite is None:
+            sprite = render_text_sprite(text, position, font, text_color, bg_color, border_color, step / ANIMATION_STEPS)
+            if len(text_sprites) >= TEXT_SPRITE_CACHE_SIZE:
+                text_sprites.pop(next(iter(text_sprites)))
+        # درج دوباره، ترتیب دیکشنری را بر اساس آخرین استفاده نگه می‌دارد
+        text_sprites[key] = sprite
+        blend_sprite(image, sprite)
     except Exception as e:
         print(f"خطا در نمایش متن فارسی: {e}")
 
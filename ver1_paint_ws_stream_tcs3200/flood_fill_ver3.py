@@ -9,6 +9,16 @@ import time
 import os
 import gc
 import sqlite3
+import json
+import queue
+import threading
+import datetime
+try:
+    import websocket
+    WEBSOCKET_AVAILABLE = True
+except ImportError:
+    WEBSOCKET_AVAILABLE = False
+    print("websocket-client نصب نیست؛ دستورها فقط با پرس‌وجوی دیتابیس دریافت می‌شوند")
 
 # دریافت رزولوشن صفحه نمایش
 try:
@@ -96,52 +106,118 @@ def get_db_connection():
     conn.row_factory = sqlite3.Row
     return conn
 
-def get_latest_color():
+def ensure_db_indexes():
+    """ایندکس (processed, created_at) برای کوئری‌های آخرین رنگ و اقدام، اگر سرور هنوز آن را نساخته باشد"""
     conn = get_db_connection()
     try:
-        cur = conn.execute("""
-            SELECT id, color 
-            FROM color_commands 
-            WHERE processed = 0 
-            ORDER BY created_at DESC 
-            LIMIT 1
-        """)
-        row = cur.fetchone()
-        if row:
-            color = row['color']
-            conn.execute("UPDATE color_commands SET processed = 1 WHERE id = ?", (row['id'],))
-            conn.commit()
-            return color
-        return None
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table in ("color_commands", "action_commands"):
+            if table in existing:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_processed_created ON {table} (processed, created_at)")
+        conn.commit()
     except Exception as e:
-        print(f"خطا در دریافت رنگ: {e}")
-        return None
+        print(f"خطا در ساخت ایندکس‌های دیتابیس: {e}")
     finally:
         conn.close()
 
-def get_latest_action():
+ensure_db_indexes()
+
+# ------------------ دریافت دستورهای رنگ و اقدام ------------------
+# ws_servo_control_mysql.py هر دستور رنگ/اقدام را روی /ws برای همه کلاینت‌ها پخش می‌کند. این کلاینت
+# دستورها را در حافظه نگه می‌دارد تا حلقه اصلی در هر فریم سراغ دیتابیس نرود. فقط وقتی اتصال برقرار
+# نیست، دیتابیس هر POLL_INTERVAL ثانیه یک بار (هر دو جدول در یک تراکنش) خوانده می‌شود؛ بعد از هر
+# اتصال (یا اتصال دوباره) هم یک بار خوانده می‌شود تا دستورهای زمان آفلاین بودن برنامه از دست نروند.
+COMMAND_WS_URL = "ws://localhost:7000/ws"
+POLL_INTERVAL = 0.5
+RECONNECT_DELAY = 2
+pending_actions = queue.Queue()
+pending_color = None
+pending_color_lock = threading.Lock()
+command_channel_connected = threading.Event()
+poll_since = ""  # فقط ردیف‌های بعد از قطع اتصال؛ دستورهای قبلی از وب‌سوکت رسیده‌اند
+last_poll_time = 0
+
+def queue_command(key, value):
+    global pending_color
+    if key == "color":
+        with pending_color_lock:
+            pending_color = value  # فقط آخرین رنگ مهم است
+    else:
+        pending_actions.put(value)
+
+def command_listener():
+    global poll_since
+    while True:
+        try:
+            ws = websocket.create_connection(COMMAND_WS_URL, timeout=5)
+        except Exception:
+            time.sleep(RECONNECT_DELAY)
+            continue
+        ws.settimeout(None)
+        # اول علامت اتصال تا حلقه اصلی هم‌زمان پرس‌وجو نکند؛ پیام‌های رسیده در این فاصله در سوکت می‌مانند
+        command_channel_connected.set()
+        print("اتصال به کانال دستورهای سرور برقرار شد")
+        poll_commands()  # دستورهایی که قبل از این اتصال ثبت شده‌اند و پخششان را ندیده‌ایم
+        try:
+            while True:
+                message = ws.recv()
+                if not message:
+                    break
+                if isinstance(message, bytes):
+                    continue
+                try:
+                    msg = json.loads(message)
+                except ValueError:
+                    continue
+                for key in ("color", "action"):
+                    if msg.get(key):
+                        queue_command(key, msg[key])
+        except Exception as e:
+            print(f"کانال دستورهای سرور قطع شد: {e}")
+        finally:
+            poll_since = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+            command_channel_connected.clear()
+            ws.close()
+        time.sleep(RECONNECT_DELAY)
+
+def poll_commands():
+    """آخرین رنگ و اقدام پردازش‌نشده با یک اتصال و یک تراکنش؛ ردیف‌های قدیمی‌تر هم پردازش‌شده علامت می‌خورند"""
     conn = get_db_connection()
     try:
-        cur = conn.execute("""
-            SELECT id, action 
-            FROM action_commands 
-            WHERE processed = 0 
-            ORDER BY created_at DESC 
-            LIMIT 1
-        """)
-        row = cur.fetchone()
-        if row:
-            action = row['action']
-            conn.execute("UPDATE action_commands SET processed = 1 WHERE id = ?", (row['id'],))
-            conn.commit()
-            return action
-        return None
+        with conn:
+            for key, table in (("color", "color_commands"), ("action", "action_commands")):
+                row = conn.execute(f"""
+                    SELECT id, {key} 
+                    FROM {table} 
+                    WHERE processed = 0 AND created_at >= ? 
+                    ORDER BY created_at DESC, id DESC 
+                    LIMIT 1
+                """, (poll_since,)).fetchone()
+                if row:
+                    queue_command(key, row[key])
+                    conn.execute(f"UPDATE {table} SET processed = 1 WHERE processed = 0 AND id <= ?", (row['id'],))
     except Exception as e:
-        print(f"خطا در دریافت اقدام: {e}")
-        return None
+        print(f"خطا در دریافت دستورها از دیتابیس: {e}")
     finally:
         conn.close()
 
+def take_commands(current_time):
+    """(رنگ, اقدام) برای این فریم؛ در هر فریم حداکثر یک اقدام اجرا می‌شود"""
+    global pending_color, last_poll_time
+    if not command_channel_connected.is_set() and current_time - last_poll_time >= POLL_INTERVAL:
+        last_poll_time = current_time
+        poll_commands()
+    with pending_color_lock:
+        color, pending_color = pending_color, None
+    try:
+        action = pending_actions.get_nowait()
+    except queue.Empty:
+        action = None
+    return color, action
+
+if WEBSOCKET_AVAILABLE:
+    threading.Thread(target=command_listener, daemon=True).start()
+
 def load_image(index):
     """بارگذاری و آماده‌سازی تصویر با محافظت از رنگ‌های مشکی"""
     global canvas, artwork_padded, black_mask, initial_canvas, undo_stack
@@ -259,50 +335,85 @@ def get_animation_progress(start_time, duration):
     progress = min(elapsed / duration, 1.0)
     return progress
 
+# کش تصاویر آماده پیام‌ها: کادر، حاشیه و متن هر مرحله انیمیشن یک بار رسم می‌شوند
+ANIMATION_STEPS = 16
+TEXT_SPRITE_CACHE_SIZE = 128
+text_sprites = {}
+
+def render_text_sprite(text, position, font, text_color, bg_color, border_color, anim_progress):
+    bidi_text = get_display(arabic_reshaper.reshape(text))
+    text_w, text_h = get_text_size(text, font)
+    bbox = font.getbbox(bidi_text)
+    text_x, text_y = position
+    alpha = int(255 * anim_progress)
+    scale = 1.0 + 0.2 * (1.0 - anim_progress)
+    bg_alpha = int(128 * anim_progress)
+    margin = 10
+    scaled_w = text_w * scale
+    scaled_h = text_h * scale
+    offset_x = (scaled_w - text_w) / 2
+    offset_y = (scaled_h - text_h) / 2
+    # مختصات کادر مثل rounded_rectangle در مختصات فریم گرد می‌شود تا انتقال آن به تصویر کوچک دقیق باشد
+    box = tuple(round(v) for v in (text_x-margin-offset_x, text_y-margin-offset_y, text_x+text_w+margin+offset_x, text_y+text_h+margin+offset_y))
+    left = min(box[0], text_x + bbox[0]) - 1
+    top = min(box[1], text_y + bbox[1]) - 1
+    right = max(box[2], text_x + bbox[2]) + 1
+    bottom = max(box[3], text_y + bbox[3]) + 1
+    size = (right - left, bottom - top)
+    shifted_box = (box[0] - left, box[1] - top, box[2] - left, box[3] - top)
+    layers = []
+    mask = Image.new("L", size, 0)
+    ImageDraw.Draw(mask).rounded_rectangle(shifted_box, radius=5, fill=255)
+    layers.append((mask, bg_color[:3], bg_alpha))
+    if border_color:
+        start_border_color = (100, 100, 100)
+        animated_border = tuple(
+            int(start_border_color[i] + (border_color[i] - start_border_color[i]) * anim_progress)
+            for i in range(3)
+        )
+        mask = Image.new("L", size, 0)
+        ImageDraw.Draw(mask).rounded_rectangle(shifted_box, radius=5, outline=255, width=1)
+        layers.append((mask, animated_border, alpha))
+    # PIL آلفای رنگ متن را روی تصویر RGB نادیده می‌گیرد، پس متن همیشه کامل رسم شده است
+    mask = Image.new("L", size, 0)
+    ImageDraw.Draw(mask).text((text_x - left, text_y - top), bidi_text, font=font, fill=255)
+    layers.append((mask, text_color, 255))
+    # لایه‌ها به ترتیب رسم، از پایین به بالا، با هم ترکیب می‌شوند (رنگ در آلفا ضرب شده، BGR)
+    premultiplied = np.zeros((size[1], size[0], 3), dtype=np.float32)
+    coverage = np.zeros((size[1], size[0], 1), dtype=np.float32)
+    for mask, color, layer_alpha in layers:
+        a = np.asarray(mask, dtype=np.float32)[:, :, None] * (layer_alpha / (255.0 * 255.0))
+        premultiplied = np.array(color[::-1], dtype=np.float32) * a + premultiplied * (1.0 - a)
+        coverage = a + coverage * (1.0 - a)
+    return premultiplied, 1.0 - coverage, left, top
+
+# ترکیب تصویر آماده پیام با فریم فقط در محدوده خود پیام
+def blend_sprite(image, sprite):
+    premultiplied, transparency, left, top = sprite
+    h, w = transparency.shape[:2]
+    ix0, iy0 = max(0, left), max(0, top)
+    ix1, iy1 = min(image.shape[1], left + w), min(image.shape[0], top + h)
+    if ix0 >= ix1 or iy0 >= iy1:
+        return
+    sx, sy = ix0 - left, iy0 - top
+    sw, sh = ix1 - ix0, iy1 - iy0
+    roi = image[iy0:iy1, ix0:ix1]
+    blended = roi * transparency[sy:sy + sh, sx:sx + sw] + premultiplied[sy:sy + sh, sx:sx + sw]
+    roi[:] = (blended + 0.5).astype(np.uint8)
+
 # تابع برای نمایش متن فارسی با انیمیشن
 def draw_persian_text_pil(image, text, position, font, text_color, bg_color=(0, 0, 0, 128), border_color=None, anim_progress=1.0):
     try:
-        pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-        draw = ImageDraw.Draw(pil_image, 'RGBA')
-        
-        reshaped_text = arabic_reshaper.reshape(text)
-        bidi_text = get_display(reshaped_text)
-        text_w, text_h = get_text_size(text, font)
-        text_x, text_y = position
-
-        alpha = int(255 * anim_progress)
-        scale = 1.0 + 0.2 * (1.0 - anim_progress)
-        bg_alpha = int(128 * anim_progress)
-
-        if border_color:
-            start_border_color = (100, 100, 100)
-            border_color = tuple(
-                int(start_border_color[i] + (border_color[i] - start_border_color[i]) * anim_progress)
-                for i in range(3)
-            ) + (alpha,)
-
-        margin = 10
-        scaled_w = text_w * scale
-        scaled_h = text_h * scale
-        offset_x = (scaled_w - text_w) / 2
-        offset_y = (scaled_h - text_h) / 2
-
-        draw.rounded_rectangle(
-            (text_x-margin-offset_x, text_y-margin-offset_y, text_x+text_w+margin+offset_x, text_y+text_h+margin+offset_y),
-            radius=5,
-            fill=(bg_color[0], bg_color[1], bg_color[2], bg_alpha)
-        )
-        
-        if border_color:
-            draw.rounded_rectangle(
-                (text_x-margin-offset_x, text_y-margin-offset_y, text_x+text_w+margin+offset_x, text_y+text_h+margin+offset_y),
-                radius=5,
-                outline=border_color,
-                width=1
-            )
-
-        draw.text((text_x, text_y), bidi_text, font=font, fill=(text_color[0], text_color[1], text_color[2], alpha))
-        image[:] = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+        step = int(round(anim_progress * ANIMATION_STEPS))
+        key = (text, tuple(position), font, tuple(text_color), tuple(bg_color), tuple(border_color) if border_color else None, step)
+        sprite = text_sprites.pop(key, None)
+        if sprite is None:
+            sprite = render_text_sprite(text, position, font, text_color, bg_color, border_color, step / ANIMATION_STEPS)
+            if len(text_sprites) >= TEXT_SPRITE_CACHE_SIZE:
+                text_sprites.pop(next(iter(text_sprites)))
+        # درج دوباره، ترتیب دیکشنری را بر اساس آخرین استفاده نگه می‌دارد
+        text_sprites[key] = sprite
+        blend_sprite(image, sprite)
     except Exception as e:
         print(f"خطا در نمایش متن فارسی: {e}")
 
@@ -332,8 +443,8 @@ while cap.isOpened():
     save_active = False
     current_time = time.time()
 
-    # پردازش دستورات دیتابیس
-    latest_color = get_latest_color()
+    # پردازش دستورات سرور
+    latest_color, latest_action = take_commands(current_time)
     if latest_color and latest_color in colors:
         selected_color = colors[latest_color]["bgr"]
         coloring_enabled = True
@@ -341,7 +452,6 @@ while cap.isOpened():
             animation_states["color"]["start_time"] = current_time
             animation_states["color"]["last_color"] = selected_color
 
-    latest_action = get_latest_action()
     if latest_action and latest_action in operations:
         if latest_action == "undo" and current_time - last_undo_time > gesture_debounce:
             if undo_stack:
@@ -7,6 +7,7 @@ import requests
 import threading
 import time
 import mediapipe as mp
+import HandModule as hm
 from PIL import Image, ImageTk
 import json
 import websocket  # کتابخانه websocket-client
@@ -114,7 +115,7 @@ class MJPEGStreamReader:
 
 # ------------------ کلاس Detector (تشخیص دست) ------------------
 class Detector:
-    def __init__(self, mode=False, maxHands=2, detectionCon=0.5, trackingCon=0.5):
+    def __init__(self, mode=False, maxHands=2, detectionCon=0.5, trackingCon=0.5, handTracking=True):
         self.mode = mode
         self.maxHands = maxHands
         self.detectionCon = detectionCon
@@ -128,11 +129,23 @@ class Detector:
         )
         self.Draw = mp.solutions.drawing_utils
         self.Indexes = [4, 8, 12, 16, 20]
+        self.tracker = None
+        if handTracking and not self.mode and self.maxHands > 1:
+            trackHands = self.mediapipeHands.Hands(
+                static_image_mode=False,
+                max_num_hands=1,
+                min_detection_confidence=self.detectionCon,
+                min_tracking_confidence=self.trackingCon
+            )
+            self.tracker = hm.HandTracker(self.hands, trackHands)
         self.landmarkList = []
     
     def findHands(self, frame, draw=True):
         frameRGB = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        self.results = self.hands.process(frameRGB)
+        if self.tracker is not None:
+            self.results = self.tracker.process(frameRGB)
+        else:
+            self.results = self.hands.process(frameRGB)
         if self.results.multi_hand_landmarks:
             for handlandmarks in self.results.multi_hand_landmarks:
                 if draw:
@@ -142,51 +155,28 @@ class Detector:
     def Position(self, frame, handNo=0, draw=True):
         self.landmarkList = []
         if self.results.multi_hand_landmarks:
-            myHands = self.results.multi_hand_landmarks[handNo]
-            for id, lm in enumerate(myHands.landmark):
-                h, w, c = frame.shape
-                x, y = int(lm.x * w), int(lm.y * h)
-                self.landmarkList.append([id, x, y])
-                if draw:
+            h, w = frame.shape[:2]
+            label, score = None, 0.0
+            if self.results.multi_handedness:
+                classification = self.results.multi_handedness[handNo].classification[0]
+                label, score = classification.label, classification.score
+            self.landmarkList = hm.HandLandmarks.fromMediapipe(self.results.multi_hand_landmarks[handNo], w, h, label, score)
+            if draw:
+                for _, x, y in self.landmarkList.points.tolist():
                     cv2.circle(frame, (x, y), 8, (0, 0, 255), -1)
         return self.landmarkList
     
     def fing_up(self):
-        fingers = []
         if not self.landmarkList:
             return [0] * 5
-        # بررسی وضعیت انگشتان (اندیس‌های 8، 12، 16، 20)
-        for index in range(1, 5):
-            if self.landmarkList[self.Indexes[index]][2] < self.landmarkList[self.Indexes[index]-2][2]:
-                fingers.append(1)
-            else:
-                fingers.append(0)
-        # بررسی شست (اندیس 4)
-        if self.landmarkList[self.Indexes[0]][1] > self.landmarkList[self.Indexes[0]-2][1]:
-            fingers.append(1)
-        else:
-            fingers.append(0)
-        return fingers
+        return self.landmarkList.fingersUp()
 
 # ------------------ تابع بررسی نزدیک بودن انگشتان ------------------
 def fingers_close(landmarks, threshold=50):
     if not landmarks or len(landmarks) < 21:
         return False
-    indices = [4, 8, 12, 16, 20]
-    pts = []
-    for idx in indices:
-        for lm in landmarks:
-            if lm[0] == idx:
-                pts.append((lm[1], lm[2]))
-                break
-    if len(pts) < len(indices):
-        return False
-    max_dist = 0
-    for i in range(len(pts)):
-        for j in range(i + 1, len(pts)):
-            dist = np.sqrt((pts[i][0] - pts[j][0])**2 + (pts[i][1] - pts[j][1])**2)
-            max_dist = max(max_dist, dist)
-    return max_dist < threshold
+    # بیشترین فاصله بین هر دو نوک انگشت (4، 8، 12، 16، 20)
+    return landmarks.fingertipSpread() < threshold
 
 # ------------------ تنظیمات مسیر و تولبار ------------------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -3,9 +3,11 @@ import numpy as np
 import os
 import time
 import threading
+import queue
 import requests
 import json
 import mediapipe as mp
+import HandModule as hm
 import websocket
 import datetime
 
@@ -14,9 +16,26 @@ from flask import Flask, Response, request, jsonify
 # ------------------ تنظیمات Flask ------------------
 app = Flask(__name__)
 
-# متغیر سراسری برای ذخیره آخرین فریم پردازش‌شده
-output_frame = None
-frame_lock = threading.Lock()
+# آخرین فریم پردازش‌شده (JPEG)
+class FramePublisher:
+    """آخرین فریم JPEG به همراه شماره نسخه؛ بینندگان تا رسیدن نسخه جدید منتظر می‌مانند و فریم تکراری نمی‌گیرند"""
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.frame = None
+        self.version = 0
+
+    def publish(self, frame):
+        with self.condition:
+            self.frame = frame
+            self.version += 1
+            self.condition.notify_all()
+
+    def wait_for_new(self, last_version, timeout=1.0):
+        with self.condition:
+            self.condition.wait_for(lambda: self.frame is not None and self.version != last_version, timeout)
+            return self.version, self.frame
+
+output_frames = FramePublisher()
 
 # ------------------ تنظیمات وب‌سوکت کلاینت ------------------
 WS_URL = "ws://services.fin2.chabokan.net:29434/ws"  # آدرس سرور وب‌سوکت خارجی
@@ -118,7 +137,7 @@ class MJPEGStreamReader:
 
 # ------------------ کلاس Detector (تشخیص دست) ------------------
 class Detector:
-    def __init__(self, mode=False, maxHands=2, detectionCon=0.5, trackingCon=0.5):
+    def __init__(self, mode=False, maxHands=2, detectionCon=0.5, trackingCon=0.5, handTracking=True):
         self.mode = mode
         self.maxHands = maxHands
         self.detectionCon = detectionCon
@@ -132,10 +151,22 @@ class Detector:
         )
         self.Draw = mp.solutions.drawing_utils
         self.Indexes = [4, 8, 12, 16, 20]  # نقاط انگشتان
+        self.tracker = None
+        if handTracking and not self.mode and self.maxHands > 1:
+            trackHands = self.mediapipeHands.Hands(
+                static_image_mode=False,
+                max_num_hands=1,
+                min_detection_confidence=self.detectionCon,
+                min_tracking_confidence=self.trackingCon
+            )
+            self.tracker = hm.HandTracker(self.hands, trackHands)
     
     def findHands(self, frame, draw=True):
         frameRGB = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        self.results = self.hands.process(frameRGB)
+        if self.tracker is not None:
+            self.results = self.tracker.process(frameRGB)
+        else:
+            self.results = self.hands.process(frameRGB)
         if self.results.multi_hand_landmarks:
             for handlandmarks, hand in zip(self.results.multi_hand_landmarks, self.results.multi_handedness):
                 if draw:
@@ -145,37 +176,27 @@ class Detector:
     def Position(self, frame, handNo=0, draw=True):
         landmarkList = []
         if self.results.multi_hand_landmarks:
-            myHands = self.results.multi_hand_landmarks[handNo]
-            for id, lm in enumerate(myHands.landmark):
-                h, w, c = frame.shape
-                x, y = int(lm.x * w), int(lm.y * h)
-                landmarkList.append([id, x, y])
-                if draw:
+            h, w = frame.shape[:2]
+            label, score = None, 0.0
+            if self.results.multi_handedness:
+                classification = self.results.multi_handedness[handNo].classification[0]
+                label, score = classification.label, classification.score
+            landmarkList = hm.HandLandmarks.fromMediapipe(self.results.multi_hand_landmarks[handNo], w, h, label, score)
+            if draw:
+                for _, x, y in landmarkList.points.tolist():
                     cv2.circle(frame, (x, y), 8, (0, 0, 255), -1)
         return landmarkList
     
     def fing_up(self, handLandmarks):
-        fingers = []
         if not handLandmarks:
             return [0] * 5
-        for index in range(1, 5):
-            if handLandmarks[self.Indexes[index]][2] < handLandmarks[self.Indexes[index]-2][2]:
-                fingers.append(1)
-            else:
-                fingers.append(0)
-        if handLandmarks[self.Indexes[0]][1] > handLandmarks[self.Indexes[0]-2][1]:
-            fingers.append(1)
-        else:
-            fingers.append(0)
-        return fingers
+        return handLandmarks.fingersUp()
     
     def is_thumb_index_touched(self, landmarks, threshold=30):
         if not landmarks or len(landmarks) < 21:
             return False
-        thumb_tip = landmarks[4]  # نوک شست
-        index_tip = landmarks[8]  # نوک اشاره
-        distance = np.sqrt((thumb_tip[1] - index_tip[1]) ** 2 + (thumb_tip[2] - index_tip[2]) ** 2)
-        return distance < threshold
+        # فاصله نوک شست (4) تا نوک اشاره (8)
+        return landmarks.pinchDistance() < threshold
 
 # ------------------ تنظیمات مسیر و تولبار ------------------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -219,8 +240,46 @@ x0, y0 = 0, 0
 ready_to_save = False
 running = True
 
+# ------------------ ذخیره‌سازی در پس‌زمینه ------------------
+# پردازش فریم هیچ‌وقت منتظر دیسک یا درخواست HTTP نمی‌ماند؛ ذخیره در یک صف انجام می‌شود
+SAVE_PNG_COMPRESSION = 3  # سطح فشرده‌سازی PNG (۰ تا ۹)
+SAVE_COOLDOWN = 0.5  # حداقل فاصله بین دو ذخیره (ثانیه)
+save_queue = queue.Queue()
+last_save_time = 0
+save_flash_until = 0  # تا این زمان فریم‌ها با هاله سبز نمایش داده می‌شوند
+green_overlay = np.zeros((720, 1280, 3), np.uint8)
+green_overlay[:] = (0, 255, 0)
+
+def save_worker():
+    global save_flash_until
+    session = requests.Session()
+    while True:
+        image, save_path = save_queue.get()
+        tmp_path = save_path + ".tmp"
+        try:
+            ok, encoded = cv2.imencode('.png', image, [cv2.IMWRITE_PNG_COMPRESSION, SAVE_PNG_COMPRESSION])
+            if not ok:
+                raise ValueError("کدگذاری PNG انجام نشد")
+            with open(tmp_path, "wb") as f:
+                f.write(encoded.tobytes())
+            # فایل نیمه‌کاره هیچ‌وقت در گالری دیده نمی‌شود
+            os.replace(tmp_path, save_path)
+            print(f"تصویر ذخیره شد: {save_path}")
+        except Exception as e:
+            print(f"خطا در ذخیره تصویر: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            continue
+        try:
+            response = session.post("http://localhost:7000/save_drawing",
+                                    json={"status": "success", "message": "تصویر با موفقیت ذخیره شد"}, timeout=5)
+            if response.status_code == 200:
+                save_flash_until = time.time() + 0.5
+        except Exception as e:
+            print(f"خطا در ارسال درخواست POST: {e}")
+
 def process_frame():
-    global x0, y0, color, ready_to_save, menu, thick, blank, running, thickness, selected_color, output_frame
+    global x0, y0, color, ready_to_save, menu, thick, blank, running, thickness, selected_color, last_save_time
     while running:
         jpg = stream_reader.get_frame()
         if jpg is None:
@@ -252,27 +311,14 @@ def process_frame():
             fin_pos_right = detector.fing_up(right_hand)
             x1, y1 = right_hand[8][1], right_hand[8][2]  # مختصات نوک انگشت اشاره
             x2, y2 = right_hand[12][1], right_hand[12][2]  # مختصات انگشت میانی
-            if detector.is_thumb_index_touched(right_hand):
-                # ذخیره تصویر
-                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            if detector.is_thumb_index_touched(right_hand) and time.time() - last_save_time > SAVE_COOLDOWN:
+                # ذخیره تصویر در صف؛ بوم قبلی کنار گذاشته می‌شود، پس نیازی به کپی نیست
+                last_save_time = time.time()
+                # با فاصله نیم‌ثانیه‌ای دو ذخیره در یک ثانیه ممکن است؛ میلی‌ثانیه جلوی بازنویسی فایل قبلی را می‌گیرد
+                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
                 save_path = os.path.join(SAVE_PATH, f"drawing_{timestamp}.png")
-                cv2.imwrite(save_path, blank)
-                print(f"تصویر ذخیره شد: {save_path}")
+                save_queue.put((blank, save_path))
                 blank = np.zeros((720, 1280, 3), np.uint8)  # پاک کردن بوم
-                try:
-                    response = requests.post("http://localhost:7000/save_drawing", json={"status": "success", "message": "تصویر با موفقیت ذخیره شد"})
-                    if response.status_code == 200:
-                        green_frame = frame.copy()
-                        green_overlay = np.zeros_like(green_frame)
-                        green_overlay[:] = (0, 255, 0)
-                        cv2.addWeighted(green_overlay, 0.3, green_frame, 0.7, 0, green_frame)
-                        ret, buffer = cv2.imencode('.jpg', green_frame)
-                        if ret:
-                            with frame_lock:
-                                output_frame = buffer.tobytes()
-                        time.sleep(0.5)
-                except Exception as e:
-                    print(f"خطا در ارسال درخواست POST: {e}")
             if fin_pos_right[0] and fin_pos_right[1]:  # شست و اشاره بالا
                 x0, y0 = 0, 0
                 if x1 > 1133 and 125 < y1 < 472:
@@ -338,13 +384,17 @@ def process_frame():
         if thick is not None:
             frame[125:475, 1130:1280] = thick
         
+        # نمایش هاله سبز بعد از ذخیره موفق
+        if time.time() < save_flash_until:
+            cv2.addWeighted(green_overlay, 0.3, frame, 0.7, 0, frame)
+        
         ret, buffer = cv2.imencode('.jpg', frame)
         if ret:
-            with frame_lock:
-                output_frame = buffer.tobytes()
+            output_frames.publish(buffer.tobytes())
         time.sleep(0.01)
 
 threading.Thread(target=process_frame, daemon=True).start()
+threading.Thread(target=save_worker, daemon=True).start()
 threading.Thread(target=ws_client_thread, daemon=True).start()
 
 # ------------------ مسیرهای Flask ------------------
@@ -366,15 +416,15 @@ def save_drawing():
     return jsonify({'status': 'success', 'message': 'تصویر با موفقیت ذخیره شد'})
 
 def generate():
-    global output_frame
+    # به‌جای حلقه مشغول، تا آماده شدن فریم جدید منتظر می‌ماند
+    last_version = 0
     while True:
-        with frame_lock:
-            if output_frame is None:
-                continue
-            frame = output_frame
+        version, frame = output_frames.wait_for_new(last_version)
+        if frame is None or version == last_version:
+            continue
+        last_version = version
         yield (b'--frame\r\n'
                b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-        time.sleep(0.03)
 
 @app.route('/video_feed')
 def video_feed():
@@ -0,0 +1,301 @@
+"""Headless benchmark of the flood_fill_ver5 frame pipeline.
+
+Replays a recorded video (or synthetic frames) and, optionally, a recorded
+landmark stream through camera preprocessing, hand detection, the pinch/EMA
+pointer logic and the region fill/undo logic, then reports per-stage latency
+and throughput. No webcam or Qt window is needed, but the stages are imported
+from flood_fill_ver5, so PyQt6 and MediaPipe must be installed even with
+--no-detection (the hand tracker itself is only created when detecting).
+
+Examples:
+    python benchmark_ver5.py
+    python benchmark_ver5.py --video session.mp4 --record-landmarks session.jsonl
+    python benchmark_ver5.py --video session.mp4 --landmarks session.jsonl --no-detection --json result.json
+    python benchmark_ver5.py --video session.mp4 --compare-tracking
+"""
+import argparse, glob, json, math, os, platform, sys, time
+from types import SimpleNamespace
+import cv2
+import numpy as np
+import flood_fill_ver5 as app
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DESIGNS = os.path.join(BASE_DIR, "draw", "*.png")
+STAGES = ["load_design", "preprocess", "detection", "pinch", "fill", "undo", "redo", "frame"]
+
+
+def load_video_frames(path, limit):
+    """Decode up to limit frames up front so decoding is not part of the measurements."""
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def synthetic_frames(count, width=640, height=480, seed=0):
+    """Reproducible camera-like frames: a moving gradient with sensor noise."""
+    rng = np.random.default_rng(seed)
+    xx, yy = np.meshgrid(np.linspace(0, 1, width), np.linspace(0, 1, height))
+    frames = []
+    for i in range(count):
+        phase = i / max(1, count)
+        base = np.stack([(xx + phase) % 1.0, (yy + phase) % 1.0, (xx * yy + phase) % 1.0], axis=2) * 200 + 30
+        noise = rng.normal(0, 6, (height, width, 3))
+        frames.append(np.clip(base + noise, 0, 255).astype(np.uint8))
+    return frames
+
+
+def make_results(hands):
+    """Wrap plain landmark dicts in the attribute layout of MediaPipe hand results."""
+    if not hands:
+        return SimpleNamespace(multi_hand_landmarks=None, multi_handedness=None)
+    return SimpleNamespace(
+        multi_hand_landmarks=[
+            SimpleNamespace(landmark=[SimpleNamespace(x=x, y=y, z=z) for x, y, z in hand["landmarks"]])
+            for hand in hands
+        ],
+        multi_handedness=[
+            SimpleNamespace(classification=[SimpleNamespace(label=hand["label"], score=hand["score"])])
+            for hand in hands
+        ]
+    )
+
+
+def results_to_hands(results):
+    if not results.multi_hand_landmarks or not results.multi_handedness:
+        return []
+    return [
+        {
+            "label": handedness.classification[0].label,
+            "score": float(handedness.classification[0].score),
+            "landmarks": [[lm.x, lm.y, lm.z] for lm in hand_landmarks.landmark]
+        }
+        for hand_landmarks, handedness in zip(results.multi_hand_landmarks, results.multi_handedness)
+    ]
+
+
+def load_landmark_stream(path):
+    """One JSON object per line: {"hands": [{"label", "score", "landmarks": [[x, y, z] * 21]}]}."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [make_results(json.loads(line).get("hands", [])) for line in f if line.strip()]
+
+
+def synthetic_landmark_stream(count):
+    """A right hand sweeping over the canvas that pinches for 10 frames out of every 30."""
+    stream = []
+    for i in range(count):
+        cx = 0.5 + 0.3 * math.sin(i * 0.07)
+        cy = 0.5 + 0.3 * math.sin(i * 0.11 + 1.0)
+        pinched = i % 30 >= 20
+        landmarks = [[cx + 0.02 * math.cos(k), cy + 0.05 + 0.01 * k / 21, 0.0] for k in range(21)]
+        landmarks[8] = [cx, cy, 0.0]
+        landmarks[4] = [cx + (0.01 if pinched else 0.12), cy + 0.01, 0.0]
+        stream.append(make_results([{"label": "Right", "score": 0.95, "landmarks": landmarks}]))
+    return stream
+
+
+def right_hand_pointer(results, pointer, frame_w, frame_h):
+    """Smoothed fingertip position and pinch flag of the confident right hand, as in update_frame."""
+    if not results.multi_hand_landmarks or not results.multi_handedness:
+        return None, None, False
+    for hand_landmarks, handedness in zip(results.multi_hand_landmarks, results.multi_handedness):
+        if handedness.classification[0].label == "Right" and handedness.classification[0].score > 0.7:
+            x_index, y_index, pinch_distance = app.pinch_state(hand_landmarks, frame_w, frame_h)
+            x_avg, y_avg = pointer.update(x_index, y_index)
+            return x_avg, y_avg, pinch_distance < app.PINCH_THRESHOLD
+    return None, None, False
+
+
+def benchmark_design(design_path, frames, landmark_stream, args, stats, recorder=None):
+    with stats.measure("load_design"):
+        prepared = app.prepare_design(design_path, args.padding, cache_pixels=not args.no_pixel_cache)
+    if prepared is None:
+        print(f"Skipping unreadable design {design_path}")
+        return None
+    initial_canvas, black_mask, region_index = prepared
+    canvas = initial_canvas.copy()
+    history = app.UndoHistory(max_bytes=args.undo_memory_mb * 1024 * 1024)
+    history.clear(region_index, initial_canvas)
+    preprocessor = app.CameraPreprocessor(args.backend, args.denoise, args.skip_static)
+    tracker = None
+    if not args.no_detection:
+        tracker = app.create_hand_tracker()
+        tracker.enabled = not args.no_tracking
+    pointer = app.PointerSmoother()
+    colors = [info["rgb"] for info in app.COLORS.values()]
+    cam_w, cam_h = app.RESOLUTIONS['cam_width'], app.RESOLUTIONS['cam_height']
+    art_h, art_w = canvas.shape[:2]
+    pinch_triggered = False
+    fills = 0
+    for i, frame in enumerate(frames):
+        frame_start = time.perf_counter()
+        with stats.measure("preprocess", i):
+            processed = preprocessor.process(frame)
+        results = None
+        if not args.no_detection:
+            with stats.measure("detection", i):
+                results = tracker.process(cv2.cvtColor(processed, cv2.COLOR_BGR2RGB))
+            if recorder is not None:
+                recorder.append(results_to_hands(results))
+        if landmark_stream:
+            results = landmark_stream[i % len(landmark_stream)]
+        if results is not None:
+            with stats.measure("pinch", i):
+                x_avg, y_avg, pinch_active = right_hand_pointer(results, pointer, processed.shape[1], processed.shape[0])
+            if x_avg is not None:
+                x_art = int(x_avg * (art_w / cam_w))
+                y_art = int(y_avg * (art_h / cam_h))
+                if pinch_active and not pinch_triggered and 0 <= x_art < art_w and 0 <= y_art < art_h and black_mask[y_art, x_art] != 255:
+                    color = "eraser" if fills % 7 == 6 else colors[fills % len(colors)]
+                    with stats.measure("fill", i):
+                        app.fill_region(canvas, initial_canvas, black_mask, region_index, history, x_art, y_art, color)
+                    fills += 1
+                    if fills % 3 == 0:
+                        with stats.measure("undo", i):
+                            history.undo(canvas)
+                        with stats.measure("redo", i):
+                            history.redo(canvas)
+                pinch_triggered = pinch_active
+        stats.record("frame", time.perf_counter() - frame_start, i)
+    summary = {"fills": fills, "undo_bytes": history.used_bytes}
+    if tracker is not None:
+        tracker.close()
+        summary.update(tracked_detections=tracker.tracked_frames, search_detections=tracker.search_frames)
+    return summary
+
+
+def compare_tracking(frames):
+    """Detection latency over the same frames with single-hand tracking off and on."""
+    report = {}
+    for mode, enabled in (("search", False), ("tracking", True)):
+        tracker = app.create_hand_tracker()
+        tracker.enabled = enabled
+        stats = app.PipelineStats(window=len(frames))
+        found = 0
+        for i, frame in enumerate(frames):
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            with stats.measure("detection", i):
+                results = tracker.process(rgb_frame)
+            found += bool(results.multi_hand_landmarks)
+        tracker.close()
+        report[mode] = dict(stats.snapshot()["stages"]["detection"], frames_with_hands=found,
+                            tracked_detections=tracker.tracked_frames, search_detections=tracker.search_frames)
+    report["speedup"] = round(report["search"]["mean_ms"] / report["tracking"]["mean_ms"], 2) if report["tracking"]["mean_ms"] > 0 else None
+    print(f"\nHand detection over {len(frames)} frames")
+    print(f"{'mode':<10}{'mean ms':>10}{'p95 ms':>10}{'hands':>8}{'tracked':>9}{'searched':>10}")
+    for mode in ("search", "tracking"):
+        info = report[mode]
+        print(f"{mode:<10}{info['mean_ms']:>10.3f}{info['p95_ms']:>10.3f}{info['frames_with_hands']:>8}"
+              f"{info['tracked_detections']:>9}{info['search_detections']:>10}")
+    print(f"Single-hand tracking speedup: {report['speedup']}x")
+    return report
+
+
+def print_report(title, snapshot):
+    print(f"\n{title}")
+    print(f"{'stage':<12}{'count':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max fps':>10}")
+    for stage in STAGES:
+        info = snapshot["stages"].get(stage)
+        if info is None:
+            continue
+        max_fps = 1000.0 / info["mean_ms"] if info["mean_ms"] > 0 else float("inf")
+        print(f"{stage:<12}{info['count']:>7}{info['mean_ms']:>10.3f}{info['p50_ms']:>10.3f}"
+              f"{info['p95_ms']:>10.3f}{info['p99_ms']:>10.3f}{max_fps:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless benchmark of the flood_fill_ver5 pipeline")
+    parser.add_argument("--video", help="recorded camera session (default: synthetic frames)")
+    parser.add_argument("--landmarks", help="recorded landmark stream (.jsonl) used for the pinch/fill stages")
+    parser.add_argument("--record-landmarks", help="write the detected landmarks to this .jsonl file")
+    parser.add_argument("--designs", default=DEFAULT_DESIGNS, help="glob of design images (default: draw/*.png)")
+    parser.add_argument("--frames", type=int, default=300, help="maximum number of frames per design")
+    parser.add_argument("--padding", type=int, default=130)
+    parser.add_argument("--backend", default="cpu", choices=["cpu", "opencl", "cuda"])
+    parser.add_argument("--denoise", default=app.DEFAULT_DENOISE_MODE, choices=list(app.DENOISE_MODES))
+    parser.add_argument("--skip-static", action="store_true", help="reuse the denoised frame while the camera image is static")
+    parser.add_argument("--undo-memory-mb", type=int, default=64)
+    parser.add_argument("--no-detection", action="store_true", help="skip hand detection (requires --landmarks or synthetic frames)")
+    parser.add_argument("--no-tracking", action="store_true", help="search the frame for both hands every time")
+    parser.add_argument("--compare-tracking", action="store_true", help="only measure hand detection with tracking off and on")
+    parser.add_argument("--no-pixel-cache", action="store_true", help="disable the per-region pixel index cache")
+    parser.add_argument("--json", help="write the full report to this file")
+    args = parser.parse_args()
+
+    frames = load_video_frames(args.video, args.frames) if args.video else synthetic_frames(args.frames)
+    if not frames:
+        print(f"Error: no frames could be read from {args.video}")
+        return 1
+    if args.landmarks:
+        landmark_stream = load_landmark_stream(args.landmarks)
+    elif not args.video:
+        # MediaPipe finds no hands in synthetic frames, so drive the gesture stages with a synthetic hand
+        landmark_stream = synthetic_landmark_stream(len(frames))
+    else:
+        landmark_stream = None
+    if args.no_detection and landmark_stream is None:
+        print("Error: --no-detection needs --landmarks when replaying a video")
+        return 1
+    if args.backend == "opencl":
+        cv2.ocl.setUseOpenCL(True)
+    if args.compare_tracking:
+        report = compare_tracking(frames)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print(f"Report written to {args.json}")
+        return 0
+
+    designs = sorted(glob.glob(args.designs))
+    if not designs:
+        print(f"Error: no designs match {args.designs}")
+        return 1
+
+    report = {
+        "python": sys.version.split()[0],
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "frames": len(frames),
+        "source": args.video or "synthetic",
+        "landmarks": args.landmarks or ("synthetic" if landmark_stream else "detected"),
+        "denoise": args.denoise,
+        "designs": {}
+    }
+    overall = app.PipelineStats(window=len(frames) * len(designs) + len(designs))
+    recorder = [] if args.record_landmarks and not args.no_detection else None
+    for design_path in designs:
+        stats = app.PipelineStats(window=len(frames) + 1)
+        # Landmarks are recorded once, during the first design's pass over the session
+        summary = benchmark_design(design_path, frames, landmark_stream, args, stats,
+                                   recorder if design_path == designs[0] else None)
+        if summary is None:
+            continue
+        for stage, durations in stats.durations.items():
+            for duration in durations:
+                overall.record(stage, duration)
+        snapshot = stats.snapshot()
+        snapshot.update(summary)
+        report["designs"][os.path.basename(design_path)] = snapshot
+        print_report(f"{os.path.basename(design_path)}: {summary['fills']} fills, undo history {summary['undo_bytes'] / 1024:.1f} KB", snapshot)
+    report["overall"] = overall.snapshot()
+    print_report("All designs", report["overall"])
+
+    if recorder:
+        with open(args.record_landmarks, "w", encoding="utf-8") as f:
+            for hands_data in recorder:
+                f.write(json.dumps({"hands": hands_data}) + "\n")
+        print(f"\nRecorded {len(recorder)} landmark frames to {args.record_landmarks}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
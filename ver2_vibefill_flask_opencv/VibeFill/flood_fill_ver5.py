@@ -1,15 +1,20 @@
-import sys, os, platform, time, glob, threading, cv2, json
+import sys, os, platform, time, glob, threading, multiprocessing, queue, cv2, json
 import numpy as np
 import mediapipe as mp
+from mediapipe.framework.formats import landmark_pb2, classification_pb2
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QLabel, QPushButton, QComboBox, QTabWidget, QGridLayout,
-                             QScrollArea, QDialog, QDialogButtonBox, QTextEdit, QFileDialog,
-                             QGroupBox, QSpinBox, QMessageBox)
-from PyQt6.QtGui import QImage, QPixmap, QColor, QStandardItemModel, QStandardItem
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer
+                             QDialog, QDialogButtonBox, QTextEdit, QFileDialog,
+                             QGroupBox, QSpinBox, QMessageBox, QCheckBox, QListView, QStyledItemDelegate)
+from PyQt6.QtGui import QImage, QPixmap, QColor, QStandardItemModel, QStandardItem, QPainter
+from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer, QRect, QSize, QAbstractListModel, QModelIndex
 from PIL import Image, ImageDraw, ImageFont
-from queue import Queue
-import shutil
+from collections import deque
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import shutil, hashlib
 try:
     from persiantools.jdatetime import JalaliDateTime
     PERSIANTOOLS_AVAILABLE = True
@@ -32,6 +37,44 @@ RESOLUTIONS = {
 # Blur settings
 DEFAULT_BLUR = True
 
+# Denoise filters selectable for camera frames (settings tab), from best quality to cheapest
+DENOISE_MODES = {
+    "bilateral": "دوطرفه (کیفیت بالا)",
+    "bilateral_half": "دوطرفه با وضوح نصف",
+    "guided": "فیلتر هدایت‌شده",
+    "box": "میانگین ساده",
+    "none": "بدون کاهش نویز"
+}
+DEFAULT_DENOISE_MODE = "bilateral_half"
+
+# Mean absolute difference (per channel, 0-255) under which a camera frame counts as unchanged
+STATIC_FRAME_THRESHOLD = 1.5
+
+# JSON-lines file that receives pipeline stats snapshots when stats_log_interval > 0
+STATS_LOG_FILE = "pipeline_stats.jsonl"
+
+# A toast's fade-in is rendered in this many steps; each (text, position, colors, step) sprite is cached
+TOAST_ANIMATION_STEPS = 16
+TOAST_CACHE_SIZE = 128
+
+# Gallery thumbnails are cached on disk, keyed by image path, modification time and size
+THUMBNAIL_SIZE = 200
+THUMBNAIL_CACHE_DIR = ".gallery_thumbs"
+# Decoded thumbnails kept in memory; older ones are reloaded from the disk cache when scrolled back to
+THUMBNAIL_MEMORY_CACHE = 120
+# Width and height of one painted gallery tile: the framed thumbnail, a 5px gap and the date caption
+GALLERY_CAPTION_HEIGHT = 28
+GALLERY_TILE_SIZE = (THUMBNAIL_SIZE + 12, THUMBNAIL_SIZE + 12 + 5 + GALLERY_CAPTION_HEIGHT)
+
+# Formats the save action can write (save_format in the settings file), and the gallery lists
+SAVE_FORMATS = {"png": ".png", "webp": ".webp"}
+
+# Thumb-index distance (fraction of the camera frame width) below which the hand counts as pinching
+PINCH_THRESHOLD = 0.045
+
+# Per-channel tolerance of a fill around the paper color (same as the old flood fill loDiff/upDiff)
+FILL_TOLERANCE = 30
+
 # Color definitions
 COLORS = {
     "red": {"rgb": (0, 0, 255), "name": "قرمز", "text_color": (255, 0, 0), "border_color": (255, 0, 0)},
@@ -62,6 +105,7 @@ COLORS = {
 OPERATIONS = {
     "eraser": {"name": "پاکن", "text_color": (255, 255, 255), "border_color": (200, 0, 0)},
     "undo": {"name": "بازگشت", "text_color": (255, 140, 0), "border_color": (255, 140, 0)},
+    "redo": {"name": "انجام دوباره", "text_color": (255, 200, 0), "border_color": (255, 200, 0)},
     "reset": {"name": "بازنشانی", "text_color": (128, 0, 128), "border_color": (128, 0, 128)},
     "next": {"name": "بعدی", "text_color": (0, 200, 200), "border_color": (0, 200, 200)},
     "prev": {"name": "قبلی", "text_color": (200, 200, 0), "border_color": (200, 200, 0)},
@@ -71,37 +115,103 @@ OPERATIONS = {
 # Mediapipe setup with improved confidence thresholds
 mp_hands = mp.solutions.hands
 mp_drawing = mp.solutions.drawing_utils
-hands = mp_hands.Hands(max_num_hands=2, min_detection_confidence=0.6, min_tracking_confidence=0.6)
 
-# Preprocessing function for camera image with adaptive lighting correction
-def preprocess_camera_image(image, hardware_backend):
-    try:
-        lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
-        l, a, b = cv2.split(lab)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        l = clahe.apply(l)
-        lab = cv2.merge((l, a, b))
-        enhanced = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
-        mean_brightness = np.mean(cv2.cvtColor(enhanced, cv2.COLOR_BGR2GRAY))
-        if mean_brightness < 100:
-            enhanced = cv2.convertScaleAbs(enhanced, alpha=1.2, beta=10)
-        elif mean_brightness > 180:
-            enhanced = cv2.convertScaleAbs(enhanced, alpha=0.8, beta=-10)
-        if hardware_backend == "cuda":
-            gpu_image = cv2.cuda_GpuMat()
-            gpu_image.upload(enhanced)
-            denoised = cv2.cuda.bilateralFilter(gpu_image, d=9, sigmaColor=75, sigmaSpace=75)
-            enhanced_image = denoised.download()
-        elif hardware_backend == "opencl":
-            umat_image = cv2.UMat(enhanced)
-            denoised = cv2.bilateralFilter(umat_image, d=9, sigmaColor=75, sigmaSpace=75)
-            enhanced_image = cv2.UMat.get(denoised)
-        else:
-            enhanced_image = cv2.bilateralFilter(enhanced, d=9, sigmaColor=75, sigmaSpace=75)
-        return enhanced_image
-    except Exception as e:
-        print(f"Error in preprocess_camera_image ({hardware_backend}): {e}")
-        return image
+# Detection processes re-import this module, so Hands instances are created by their owners, not at import
+def create_hands(max_num_hands=2):
+    return mp_hands.Hands(max_num_hands=max_num_hands, min_detection_confidence=0.6, min_tracking_confidence=0.6)
+
+def create_hand_tracker():
+    return HandTracker(create_hands(), create_hands(max_num_hands=1))
+
+# A crashed detection process is restarted this many times before its share of the work is given up
+MAX_DETECTION_RESTARTS = 3
+
+# Self-guided filter (He et al.) built from box filters, used when opencv-contrib's ximgproc is missing
+def guided_filter(image, radius=4, eps=0.01):
+    guide = image.astype(np.float32) / 255.0
+    ksize = (2 * radius + 1, 2 * radius + 1)
+    mean_i = cv2.boxFilter(guide, -1, ksize)
+    var_i = cv2.boxFilter(guide * guide, -1, ksize) - mean_i * mean_i
+    a = var_i / (var_i + eps)
+    b = mean_i - a * mean_i
+    result = cv2.boxFilter(a, -1, ksize) * guide + cv2.boxFilter(b, -1, ksize)
+    return np.clip(result * 255.0, 0, 255).astype(np.uint8)
+
+# Camera frame preprocessing with adaptive lighting correction.
+# Frames are resized to the camera panel first, so CLAHE, the brightness correction and the
+# denoise filter all run on 536x301 instead of the full webcam resolution.
+class CameraPreprocessor:
+    def __init__(self, hardware_backend="cpu", denoise_mode=DEFAULT_DENOISE_MODE, skip_static=False):
+        self.hardware_backend = hardware_backend
+        self.denoise_mode = denoise_mode
+        self.skip_static = skip_static
+        self.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        # convertScaleAbs(alpha=1.2, beta=10) for dark scenes and (alpha=0.8, beta=-10) for bright ones
+        levels = np.arange(256, dtype=np.float32)
+        self.dark_lut = np.clip(np.rint(np.abs(levels * 1.2 + 10)), 0, 255).astype(np.uint8)
+        self.bright_lut = np.clip(np.rint(np.abs(levels * 0.8 - 10)), 0, 255).astype(np.uint8)
+        self.last_probe = None
+        self.last_output = None
+        self.static_frames = 0
+        # Scratch images reused for every frame; only the denoised result is a new array
+        cam_shape = (RESOLUTIONS['cam_height'], RESOLUTIONS['cam_width'])
+        self.resized = np.empty(cam_shape + (3,), dtype=np.uint8)
+        self.flipped = np.empty(cam_shape + (3,), dtype=np.uint8)
+        self.lab = np.empty(cam_shape + (3,), dtype=np.uint8)
+        self.lightness = np.empty(cam_shape, dtype=np.uint8)
+        self.enhanced = np.empty(cam_shape + (3,), dtype=np.uint8)
+
+    def process(self, frame):
+        try:
+            frame = cv2.resize(frame, (RESOLUTIONS['cam_width'], RESOLUTIONS['cam_height']), dst=self.resized, interpolation=cv2.INTER_AREA)
+            frame = cv2.flip(frame, 1, dst=self.flipped)
+            lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB, dst=self.lab)
+            l = cv2.extractChannel(lab, 0, dst=self.lightness)
+            self.clahe.apply(l, dst=l)
+            cv2.insertChannel(l, lab, 0)
+            enhanced = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR, dst=self.enhanced)
+            # Brightness and motion are measured on every 4th pixel in both directions
+            probe = np.ascontiguousarray(enhanced[::4, ::4])
+            mean_b, mean_g, mean_r, _ = cv2.mean(probe)
+            mean_brightness = 0.114 * mean_b + 0.587 * mean_g + 0.299 * mean_r
+            if mean_brightness < 100:
+                cv2.LUT(enhanced, self.dark_lut, dst=enhanced)
+            elif mean_brightness > 180:
+                cv2.LUT(enhanced, self.bright_lut, dst=enhanced)
+            if (self.skip_static and self.last_output is not None and self.last_probe.shape == probe.shape
+                    and cv2.norm(probe, self.last_probe, cv2.NORM_L1) / probe.size < STATIC_FRAME_THRESHOLD):
+                self.static_frames += 1
+                return self.last_output
+            self.last_probe = probe
+            self.last_output = self.denoise(enhanced)
+            return self.last_output
+        except Exception as e:
+            print(f"Error in CameraPreprocessor.process ({self.hardware_backend}, {self.denoise_mode}): {e}")
+            return frame.copy()
+
+    def denoise(self, image):
+        mode = self.denoise_mode
+        if mode == "bilateral":
+            if self.hardware_backend == "cuda":
+                gpu_image = cv2.cuda_GpuMat()
+                gpu_image.upload(image)
+                return cv2.cuda.bilateralFilter(gpu_image, d=9, sigmaColor=75, sigmaSpace=75).download()
+            if self.hardware_backend == "opencl":
+                return cv2.UMat.get(cv2.bilateralFilter(cv2.UMat(image), d=9, sigmaColor=75, sigmaSpace=75))
+            return cv2.bilateralFilter(image, d=9, sigmaColor=75, sigmaSpace=75)
+        if mode == "bilateral_half":
+            h, w = image.shape[:2]
+            small = cv2.resize(image, (w // 2, h // 2), interpolation=cv2.INTER_AREA)
+            small = cv2.bilateralFilter(small, d=5, sigmaColor=75, sigmaSpace=75)
+            return cv2.resize(small, (w, h), interpolation=cv2.INTER_LINEAR)
+        if mode == "guided":
+            if hasattr(cv2, "ximgproc"):
+                return cv2.ximgproc.guidedFilter(image, image, 4, (0.1 * 255) ** 2)
+            return guided_filter(image)
+        if mode == "box":
+            return cv2.blur(image, (3, 3))
+        # The input is a scratch buffer that the next frame overwrites
+        return image.copy()
 
 # Preprocessing function for loaded image
 def preprocess_image(image):
@@ -113,19 +223,813 @@ def preprocess_image(image):
         print(f"Error in preprocess_image: {e}")
         return image
 
+# Fill state of a region that a fallback flood fill or a multi-color undo step changed only in part
+REGION_MIXED = object()
+
+# Connected-component label map of the line art, built once per loaded design.
+# Fills and erases write through a mask of the region's bounding box (cv2.compare + masked bitwise ops),
+# and each region's state (untouched, one fill color or mixed) is tracked so undo can record it without
+# reading the pixels back. The cost of a fill still grows with the region's bounding box, but at memory
+# speed instead of the fancy-index scatter (largest region of draw/1.png: 0.6 ms instead of 7 ms).
+class RegionIndex:
+    def __init__(self, canvas, black_mask, cache_pixels=True):
+        """Label every paper-colored region bounded by the lines; label 0 marks unindexed pixels."""
+        paper = np.all(canvas >= 255 - FILL_TOLERANCE, axis=2)
+        fillable = (paper & (black_mask == 0)).astype(np.uint8)
+        self.num_labels, self.labels, stats, _ = cv2.connectedComponentsWithStats(fillable, connectivity=4, ltype=cv2.CV_32S)
+        # (x, y, w, h) bounding box of every region, so an edit only has to repaint that part of the canvas
+        self.boxes = stats[:, :4].copy()
+        self.areas = stats[:, 4].copy()
+        self.reset_fill_state()
+        self.labels_flat = self.labels.ravel()
+        # Flat bitmap of the line pixels, computed once per design
+        self.is_line = black_mask.ravel() > 0
+        # Reused by fallback flood fills; only the filled bounding box is cleared afterwards
+        self.flood_mask = np.zeros((canvas.shape[0] + 2, canvas.shape[1] + 2), dtype=np.uint8)
+        self.cache_pixels = cache_pixels
+        self.pixel_order = None
+        self.label_starts = None
+        if cache_pixels:
+            # Pixel indices grouped by label, so every region is a contiguous slice
+            counts = np.bincount(self.labels_flat, minlength=self.num_labels)
+            self.label_starts = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+            self.pixel_order = np.argsort(self.labels_flat, kind="stable").astype(np.int32)
+
+    def reset_fill_state(self):
+        """Mark every region untouched (None); a region then holds a fill color tuple or REGION_MIXED."""
+        self.region_colors = [None] * self.num_labels
+
+    def mark_mixed(self, pixels):
+        """Regions overlapping these flat pixel indices no longer hold a single known color."""
+        for label in np.unique(self.labels_flat[pixels]):
+            if label > 0:
+                self.region_colors[label] = REGION_MIXED
+
+    def label_at(self, x, y):
+        return int(self.labels[y, x])
+
+    def box(self, label):
+        x, y, w, h = self.boxes[label]
+        return int(x), int(y), int(w), int(h)
+
+    def pixels(self, label):
+        """Flat pixel indices of a region (a view into the cache when enabled)."""
+        if self.pixel_order is not None:
+            return self.pixel_order[self.label_starts[label]:self.label_starts[label + 1]]
+        return np.flatnonzero(self.labels_flat == label)
+
+    def _mask(self, label):
+        """Bounding box of a region and the 0/255 mask of its pixels inside that box."""
+        x, y, w, h = self.box(label)
+        return (x, y, w, h), cv2.compare(self.labels[y:y + h, x:x + w], int(label), cv2.CMP_EQ)
+
+    def fill(self, canvas, label, color):
+        """Assign color to every pixel of a region in place; returns the number of filled pixels."""
+        if label <= 0 or label >= self.num_labels:
+            return 0
+        (x, y, w, h), mask = self._mask(label)
+        box = canvas[y:y + h, x:x + w]
+        color = tuple(int(c) for c in color)
+        cv2.bitwise_and(box, (0, 0, 0, 0), dst=box, mask=mask)
+        cv2.bitwise_or(box, color + (0,), dst=box, mask=mask)
+        self.region_colors[label] = color
+        return int(self.areas[label])
+
+    def restore(self, canvas, source, label):
+        """Copy a region back from source (used by the eraser); returns the number of restored pixels."""
+        if label <= 0 or label >= self.num_labels:
+            return 0
+        (x, y, w, h), mask = self._mask(label)
+        cv2.copyTo(source[y:y + h, x:x + w], mask, dst=canvas[y:y + h, x:x + w])
+        self.region_colors[label] = None
+        return int(self.areas[label])
+
+# (x, y, w, h) bounding box of flat pixel indices of an image that is width pixels wide
+def pixels_box(pixels, width):
+    ys, xs = np.divmod(pixels, width)
+    x0, y0 = int(xs.min()), int(ys.min())
+    return x0, y0, int(xs.max()) - x0 + 1, int(ys.max()) - y0 + 1
+
+# Undo/redo history that stores only the pixels each edit changed
+class UndoHistory:
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.region_index = None
+        self.baseline = None
+        self.undo_entries = deque()
+        self.redo_entries = deque()
+        self.used_bytes = 0
+
+    def clear(self, region_index=None, baseline=None):
+        """Drop all history; region_index resolves label entries, baseline is the untouched canvas."""
+        self.region_index = region_index
+        self.baseline = baseline
+        if region_index is not None:
+            region_index.reset_fill_state()  # The canvas starts again from the baseline
+        self.undo_entries.clear()
+        self.redo_entries.clear()
+        self.used_bytes = 0
+
+    def _pixels(self, label, idx):
+        return self.region_index.pixels(label) if label is not None else idx
+
+    def _capture(self, canvas, label, idx):
+        """Entry (label, idx, colors) holding the current colors of a region."""
+        if label is not None:
+            state = self.region_index.region_colors[label]
+            if state is None:
+                return (label, idx, None)
+            if state is not REGION_MIXED:
+                return (label, idx, np.array([state], dtype=np.uint8))
+        pixels = self._pixels(label, idx)
+        colors = canvas.reshape(-1, canvas.shape[2])[pixels]
+        if len(colors) > 1 and (colors == colors[0]).all():
+            colors = colors[:1].copy()  # Uniform region: one color is enough
+        elif self.baseline is not None and np.array_equal(colors, self.baseline.reshape(-1, canvas.shape[2])[pixels]):
+            colors = None  # Untouched region: restore it from the baseline
+        return (label, idx, colors)
+
+    @staticmethod
+    def _entry_bytes(entry):
+        label, idx, colors = entry
+        return (colors.nbytes if colors is not None else 0) + (idx.nbytes if idx is not None else 0)
+
+    def _push(self, stack, entry):
+        stack.append(entry)
+        self.used_bytes += self._entry_bytes(entry)
+
+    def _pop(self, stack):
+        entry = stack.pop()
+        self.used_bytes -= self._entry_bytes(entry)
+        return entry
+
+    def _evict(self):
+        # Oldest undo steps go first, then the furthest redo steps; the newest step is always kept
+        while self.used_bytes > self.max_bytes and len(self.undo_entries) + len(self.redo_entries) > 1:
+            stack = self.undo_entries if self.undo_entries else self.redo_entries
+            self.used_bytes -= self._entry_bytes(stack.popleft())
+
+    def _apply(self, canvas, entry):
+        """Write an entry back into the canvas; returns the (x, y, w, h) box of the pixels it touched."""
+        label, idx, colors = entry
+        if label is not None and colors is None:
+            self.region_index.restore(canvas, self.baseline, label)
+            return self.region_index.box(label)
+        if label is not None and len(colors) == 1:
+            self.region_index.fill(canvas, label, colors[0])
+            return self.region_index.box(label)
+        pixels = self._pixels(label, idx)
+        if colors is None:
+            colors = self.baseline.reshape(-1, canvas.shape[2])[pixels]
+        canvas.reshape(-1, canvas.shape[2])[pixels] = colors
+        if self.region_index is not None:
+            self.region_index.mark_mixed(pixels)
+        if label is not None:
+            return self.region_index.box(label)
+        return pixels_box(pixels, canvas.shape[1])
+
+    def record(self, canvas, label=None, idx=None):
+        """Remember a region (a label of region_index or flat pixel indices) before it is changed."""
+        self._push(self.undo_entries, self._capture(canvas, label, idx))
+        while self.redo_entries:
+            self._pop(self.redo_entries)
+        self._evict()
+
+    def undo(self, canvas):
+        """Revert the last edit; returns the changed (x, y, w, h) box, or None when there is nothing to undo."""
+        if not self.undo_entries:
+            return None
+        entry = self._pop(self.undo_entries)
+        self._push(self.redo_entries, self._capture(canvas, entry[0], entry[1]))
+        rect = self._apply(canvas, entry)
+        self._evict()
+        return rect
+
+    def redo(self, canvas):
+        """Reapply the last undone edit; returns the changed box like undo."""
+        if not self.redo_entries:
+            return None
+        entry = self._pop(self.redo_entries)
+        self._push(self.undo_entries, self._capture(canvas, entry[0], entry[1]))
+        rect = self._apply(canvas, entry)
+        self._evict()
+        return rect
+
+# Load a design and build the padded canvas, line mask and region index used for fills
+def prepare_design(image_path, padding, cache_pixels=True):
+    image = cv2.imread(image_path)
+    if image is None:
+        return None
+    image = preprocess_image(image)
+    image = cv2.resize(image, (RESOLUTIONS['canvas_width'], RESOLUTIONS['canvas_height']))
+    padded = cv2.copyMakeBorder(image, padding, padding, padding, padding, cv2.BORDER_CONSTANT, value=(255, 255, 255))
+    gray = cv2.cvtColor(padded, cv2.COLOR_BGR2GRAY)
+    _, black_mask = cv2.threshold(gray, 10, 255, cv2.THRESH_BINARY_INV)
+    black_mask = (black_mask == 255).astype(np.uint8) * 255
+    region_index = RegionIndex(padded, black_mask, cache_pixels=cache_pixels)
+    return padded, black_mask, region_index
+
+# Memory held by a prepared design (padded canvas, line mask and region index)
+def design_bytes(prepared):
+    padded, black_mask, region_index = prepared
+    total = padded.nbytes + black_mask.nbytes
+    if region_index is not None:
+        total += region_index.labels.nbytes + region_index.is_line.nbytes + region_index.flood_mask.nbytes + region_index.boxes.nbytes
+        if region_index.pixel_order is not None:
+            total += region_index.pixel_order.nbytes + region_index.label_starts.nbytes
+    return total
+
+# LRU of prepared designs; a background worker prepares the neighbours of the current design
+# so next/prev can swap them in without decoding in the GUI thread
+class DesignCache:
+    def __init__(self, padding, cache_pixels=True, max_bytes=64 * 1024 * 1024):
+        self.padding = padding
+        self.cache_pixels = cache_pixels
+        self.max_bytes = max_bytes
+        self.entries = {}  # path -> (mtime, bytes, prepared), in least-recently-used order
+        self.used_bytes = 0
+        self.wanted = deque()
+        self.in_progress = None
+        self.running = True
+        self.condition = threading.Condition()
+        self.hits = 0
+        self.misses = 0
+        threading.Thread(target=self.prefetch_worker, daemon=True).start()
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _lookup(self, path):
+        entry = self.entries.pop(path, None)
+        if entry is None:
+            return None
+        if entry[0] != self._mtime(path):
+            self.used_bytes -= entry[1]  # The file changed on disk since it was prepared
+            return None
+        self.entries[path] = entry
+        return entry[2]
+
+    def _store(self, path, mtime, prepared):
+        old = self.entries.pop(path, None)
+        if old is not None:
+            self.used_bytes -= old[1]
+        size = design_bytes(prepared)
+        self.entries[path] = (mtime, size, prepared)
+        self.used_bytes += size
+        # The newest entry is always kept, even if it alone exceeds the cap
+        while self.used_bytes > self.max_bytes and len(self.entries) > 1:
+            self.used_bytes -= self.entries.pop(next(iter(self.entries)))[1]
+
+    def get(self, path):
+        """Prepared (padded, black_mask, region_index) for a design, from the cache when possible."""
+        with self.condition:
+            # Wait for the worker instead of preparing the same design twice
+            while self.in_progress == path:
+                self.condition.wait()
+            prepared = self._lookup(path)
+            if prepared is not None:
+                self.hits += 1
+                return prepared
+            self.misses += 1
+            padding, cache_pixels = self.padding, self.cache_pixels
+        mtime = self._mtime(path)
+        prepared = prepare_design(path, padding, cache_pixels=cache_pixels)
+        if prepared is not None:
+            with self.condition:
+                if padding == self.padding:
+                    self._store(path, mtime, prepared)
+        return prepared
+
+    def prefetch(self, paths):
+        """Prepare these designs in the background; replaces any earlier prefetch request."""
+        with self.condition:
+            self.wanted.clear()
+            self.wanted.extend(path for path in paths if path not in self.entries)
+            self.condition.notify_all()
+
+    def invalidate(self, padding=None, cache_pixels=None):
+        """Drop every prepared design, e.g. after the padding changed."""
+        with self.condition:
+            if padding is not None:
+                self.padding = padding
+            if cache_pixels is not None:
+                self.cache_pixels = cache_pixels
+            self.entries.clear()
+            self.wanted.clear()
+            self.used_bytes = 0
+
+    def prefetch_worker(self):
+        while True:
+            with self.condition:
+                while self.running and not self.wanted:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                path = self.wanted.popleft()
+                if path in self.entries:
+                    continue
+                self.in_progress = path
+                padding, cache_pixels = self.padding, self.cache_pixels
+            try:
+                mtime = self._mtime(path)
+                prepared = prepare_design(path, padding, cache_pixels=cache_pixels)
+            except Exception as e:
+                print(f"Error preparing design {path}: {e}")
+                prepared = None
+            with self.condition:
+                # Results prepared with an outdated padding are discarded
+                if prepared is not None and padding == self.padding and cache_pixels == self.cache_pixels:
+                    self._store(path, mtime, prepared)
+                self.in_progress = None
+                self.condition.notify_all()
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.wanted.clear()
+            self.condition.notify_all()
+
+# Returns (changed pixel count, (x, y, w, h) box of the change); the box is None when nothing changed
+def fill_region(canvas, initial_canvas, black_mask, region_index, undo_history, x, y, color):
+    label = region_index.label_at(x, y) if region_index is not None else 0
+    if label > 0:
+        undo_history.record(canvas, label=label)
+        if color == "eraser":
+            count = region_index.restore(canvas, initial_canvas, label)
+        else:
+            count = region_index.fill(canvas, label, color)
+        return count, region_index.box(label)
+    # Seed is outside the indexed paper regions (e.g. shaded areas of the design): flood fill it
+    if region_index is not None:
+        mask = region_index.flood_mask
+        is_line = region_index.is_line
+    else:
+        mask = np.zeros((canvas.shape[0] + 2, canvas.shape[1] + 2), dtype=np.uint8)
+        is_line = black_mask.ravel() > 0
+    _, _, _, (rect_x, rect_y, rect_w, rect_h) = cv2.floodFill(
+        canvas,
+        mask,
+        (x, y),
+        (0, 0, 0),
+        loDiff=(FILL_TOLERANCE,) * 3,
+        upDiff=(FILL_TOLERANCE,) * 3,
+        flags=cv2.FLOODFILL_FIXED_RANGE | cv2.FLOODFILL_MASK_ONLY | (255 << 8)
+    )
+    # Only the filled bounding box is scanned (and cleared for the next fill)
+    box = mask[1 + rect_y:1 + rect_y + rect_h, 1 + rect_x:1 + rect_x + rect_w]
+    ys, xs = np.nonzero(box)
+    box[:] = 0
+    region = (ys + rect_y) * canvas.shape[1] + (xs + rect_x)
+    # Line pixels always hold their original color, so leaving them out of the fill
+    # replaces restoring every line pixel of the canvas afterwards
+    region = region[~is_line[region]]
+    if region.size == 0:
+        return 0, None
+    undo_history.record(canvas, idx=region)
+    canvas_flat = canvas.reshape(-1, 3)
+    if color == "eraser":
+        canvas_flat[region] = initial_canvas.reshape(-1, 3)[region]
+    else:
+        canvas_flat[region] = color
+    if region_index is not None:
+        region_index.mark_mixed(region)
+    return region.size, (rect_x, rect_y, rect_w, rect_h)
+
+# Pre-rendered toast: the rounded box, animated border and text of one animation step as a small
+# premultiplied BGR patch, so a visible toast costs one alpha blend over its own bounding box per frame
+def render_toast_sprite(display_text, font, position, text_color, border_color, anim_progress, bg_color=(0, 0, 0), border_width=2):
+    """(premultiplied color, 1 - alpha, left, top) of the toast right-aligned at position, in frame coordinates."""
+    bbox = font.getbbox(display_text)
+    text_w = bbox[2] - bbox[0]
+    text_h = bbox[3] - bbox[1]
+    text_x = position[0] - text_w
+    alpha = int(255 * anim_progress)
+    scale = 1.0 + 0.2 * (1.0 - anim_progress)
+    bg_alpha = int(128 * anim_progress)
+    start_border_color = (100, 100, 100)
+    animated_border = tuple(
+        int(start_border_color[i] + (border_color[i] - start_border_color[i]) * anim_progress)
+        for i in range(3)
+    )
+    margin = 10
+    scaled_w = text_w * scale
+    scaled_h = text_h * scale
+    offset_x = (scaled_w - text_w) / 2
+    offset_y = (scaled_h - text_h) / 2
+    # Rounded in frame coordinates exactly as rounded_rectangle did, so moving the box into the patch is exact
+    box = tuple(round(v) for v in (text_x-margin-offset_x, position[1]-margin-offset_y, text_x+text_w+margin+offset_x, position[1]+text_h+margin+offset_y))
+    left = min(box[0], text_x + bbox[0]) - border_width
+    top = min(box[1], position[1] + bbox[1]) - border_width
+    right = max(box[2], text_x + bbox[2]) + border_width
+    bottom = max(box[3], position[1] + bbox[3]) + border_width
+    size = (right - left, bottom - top)
+    shifted_box = (box[0] - left, box[1] - top, box[2] - left, box[3] - top)
+    layers = []
+    mask = Image.new("L", size, 0)
+    ImageDraw.Draw(mask).rounded_rectangle(shifted_box, radius=5, fill=255)
+    layers.append((mask, bg_color, bg_alpha))
+    mask = Image.new("L", size, 0)
+    ImageDraw.Draw(mask).rounded_rectangle(shifted_box, radius=5, outline=255, width=border_width)
+    layers.append((mask, animated_border, alpha))
+    mask = Image.new("L", size, 0)
+    ImageDraw.Draw(mask).text((text_x - left, position[1] - top), display_text, font=font, fill=255)
+    # ImageDraw.text on an RGB frame ignores the fill's alpha, so the glyphs have always been drawn opaque
+    layers.append((mask, text_color, 255))
+    # Composite the layers bottom to top, as PIL blended them onto the frame one after another
+    premultiplied = np.zeros((size[1], size[0], 3), dtype=np.float32)
+    coverage = np.zeros((size[1], size[0], 1), dtype=np.float32)
+    for mask, color, layer_alpha in layers:
+        a = np.asarray(mask, dtype=np.float32)[:, :, None] * (layer_alpha / (255.0 * 255.0))
+        premultiplied = np.array(color[::-1], dtype=np.float32) * a + premultiplied * (1.0 - a)
+        coverage = a + coverage * (1.0 - a)
+    return premultiplied, 1.0 - coverage, left, top
+
+# Alpha-blend a pre-rendered sprite into a BGR image, clipped to the image
+def blend_sprite(image, sprite):
+    premultiplied, transparency, left, top = sprite
+    h, w = transparency.shape[:2]
+    ix0, iy0 = max(0, left), max(0, top)
+    ix1, iy1 = min(image.shape[1], left + w), min(image.shape[0], top + h)
+    if ix0 >= ix1 or iy0 >= iy1:
+        return
+    sx, sy = ix0 - left, iy0 - top
+    sw, sh = ix1 - ix0, iy1 - iy0
+    roi = image[iy0:iy1, ix0:ix1]
+    blended = roi * transparency[sy:sy + sh, sx:sx + sw] + premultiplied[sy:sy + sh, sx:sx + sw]
+    roi[:] = (blended + 0.5).astype(np.uint8)
+
+# Index fingertip position (pixels) and thumb-index distance (fraction of frame width) of one hand
+def pinch_state(hand_landmarks, w, h):
+    index_finger_tip = hand_landmarks.landmark[8]
+    thumb_tip = hand_landmarks.landmark[4]
+    x_index, y_index = int(index_finger_tip.x * w), int(index_finger_tip.y * h)
+    x_thumb, y_thumb = int(thumb_tip.x * w), int(thumb_tip.y * h)
+    pinch_distance = np.sqrt((x_index - x_thumb) ** 2 + (y_index - y_thumb) ** 2) / w
+    return x_index, y_index, pinch_distance
+
+# Moving average over the last few fingertip positions followed by an EMA
+class PointerSmoother:
+    def __init__(self, window=10, alpha=0.6):
+        self.positions = deque(maxlen=window)
+        self.alpha = alpha
+        self.ema_x = None
+        self.ema_y = None
+
+    def update(self, x, y):
+        self.positions.append((x, y))
+        x_mean = sum(pos[0] for pos in self.positions) / len(self.positions)
+        y_mean = sum(pos[1] for pos in self.positions) / len(self.positions)
+        self.ema_x = self.alpha * x_mean + (1 - self.alpha) * (self.ema_x or x_mean)
+        self.ema_y = self.alpha * y_mean + (1 - self.alpha) * (self.ema_y or y_mean)
+        return int(self.ema_x), int(self.ema_y)
+
+# Two MediaPipe instances, each with its own tracking state. The search instance looks for up to two hands;
+# with only one hand in view it re-runs palm detection on every frame looking for the second one. While
+# exactly one hand is known, the track instance (max_num_hands=1) follows it with the landmark model alone,
+# and every refresh_interval frames the search instance checks for new hands. Both always get full frames,
+# so the hand rect MediaPipe carries over from the previous frame stays in the same coordinate space.
+class HandTracker:
+    def __init__(self, search_hands, track_hands, refresh_interval=15):
+        self.search_hands = search_hands
+        self.track_hands = track_hands
+        self.refresh_interval = refresh_interval
+        self.enabled = True
+        self.tracking = False
+        self.frames_since_search = 0
+        self.tracked_frames = 0
+        self.search_frames = 0
+
+    def process(self, rgb_frame):
+        """Same results as hands.process(rgb_frame)."""
+        if self.enabled and self.tracking and self.frames_since_search < self.refresh_interval:
+            results = self.track_hands.process(rgb_frame)
+            if results.multi_hand_landmarks:
+                self.tracked_frames += 1
+                self.frames_since_search += 1
+                return results
+        # Hand lost, no or two hands, tracking off or periodic refresh: look for every hand in the frame
+        results = self.search_hands.process(rgb_frame)
+        self.search_frames += 1
+        self.frames_since_search = 0
+        self.tracking = bool(results.multi_hand_landmarks) and len(results.multi_hand_landmarks) == 1
+        return results
+
+    def close(self):
+        self.search_hands.close()
+        self.track_hands.close()
+
+# Entry point of a detection process: reads RGB frames from shared memory slots and sends back
+# landmarks as a (hands, 21, 3) float32 array plus (label, score) pairs
+def detection_process_main(shm_name, slot_shape, task_queue, result_queue, hand_tracking):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    slots = np.ndarray(slot_shape, dtype=np.uint8, buffer=shm.buf)
+    tracker = create_hand_tracker()
+    tracker.enabled = hand_tracking
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            slot, hand_tracking = task
+            tracker.enabled = hand_tracking
+            try:
+                results = tracker.process(slots[slot])
+            except Exception as e:
+                print(f"Error in detection process {os.getpid()}: {e}")
+                result_queue.put((slot, None, []))
+                continue
+            if results.multi_hand_landmarks and results.multi_handedness:
+                landmarks = np.array([[(lm.x, lm.y, lm.z) for lm in hand_landmarks.landmark]
+                                      for hand_landmarks in results.multi_hand_landmarks], dtype=np.float32)
+                handedness = [(h.classification[0].label, h.classification[0].score) for h in results.multi_handedness]
+                result_queue.put((slot, landmarks, handedness))
+            else:
+                result_queue.put((slot, None, []))
+    finally:
+        del slots
+        shm.close()
+        tracker.close()
+
+# Rebuild MediaPipe-style results (protobuf landmarks) from the compact arrays of a detection process
+def landmarks_to_results(landmarks, handedness):
+    if landmarks is None or not handedness:
+        return SimpleNamespace(multi_hand_landmarks=None, multi_handedness=None)
+    return SimpleNamespace(
+        multi_hand_landmarks=[
+            landmark_pb2.NormalizedLandmarkList(landmark=[
+                landmark_pb2.NormalizedLandmark(x=float(x), y=float(y), z=float(z)) for x, y, z in hand
+            ]) for hand in landmarks
+        ],
+        multi_handedness=[
+            classification_pb2.ClassificationList(classification=[
+                classification_pb2.Classification(index=0 if label == "Left" else 1, label=label, score=score)
+            ]) for label, score in handedness
+        ]
+    )
+
+# Pool of detection processes so MediaPipe runs outside the GIL shared with Qt and the other workers.
+# Frames are written straight into shared memory slots; only slot numbers and landmarks are pickled.
+# Each process keeps its own MediaPipe tracking state, so frames are handed out round-robin.
+class DetectionProcessPool:
+    def __init__(self, processes, frame_shape, slots_per_process=2, hand_tracking=True):
+        self.ctx = multiprocessing.get_context("spawn")
+        self.slot_count = processes * slots_per_process
+        self.slot_shape = (self.slot_count,) + tuple(frame_shape)
+        self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(self.slot_shape)))
+        self.slots = np.ndarray(self.slot_shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.hand_tracking = hand_tracking
+        self.result_queue = self.ctx.Queue()
+        self.task_queues = [None] * processes
+        self.processes = [None] * processes
+        self.restarts = [0] * processes
+        for index in range(processes):
+            self.start_process(index)
+        self.free_slots = deque(range(self.slot_count))
+        self.pending = {}  # slot -> (process index, tag)
+        self.next_process = 0
+        print(f"Hand detection running in {processes} processes")
+
+    def start_process(self, index):
+        # A fresh task queue, so a restarted process does not pick up slots that were already reclaimed
+        self.task_queues[index] = self.ctx.Queue()
+        self.processes[index] = self.ctx.Process(
+            target=detection_process_main,
+            args=(self.shm.name, self.slot_shape, self.task_queues[index], self.result_queue, self.hand_tracking),
+            daemon=True)
+        self.processes[index].start()
+
+    def alive(self):
+        return any(process is not None for process in self.processes)
+
+    def has_free_slot(self):
+        return bool(self.free_slots) and self.alive()
+
+    def busy(self):
+        return bool(self.pending)
+
+    def submit(self, frame, tag):
+        """Convert a BGR frame into a free slot and queue it; returns False when every slot is busy."""
+        if not self.has_free_slot() or frame.shape != self.slot_shape[1:]:
+            return False
+        while self.processes[self.next_process] is None:
+            self.next_process = (self.next_process + 1) % len(self.processes)
+        slot = self.free_slots.popleft()
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.slots[slot])
+        self.pending[slot] = (self.next_process, tag)
+        self.task_queues[self.next_process].put((slot, self.hand_tracking))
+        self.next_process = (self.next_process + 1) % len(self.processes)
+        return True
+
+    def collect(self, timeout=0):
+        """Finished (tag, results) pairs; waits up to timeout seconds for the first one."""
+        finished = []
+        try:
+            item = self.result_queue.get(timeout=timeout) if timeout > 0 else self.result_queue.get_nowait()
+            while True:
+                slot, landmarks, handedness = item
+                # A result for a slot reclaimed from a crashed process is stale
+                if slot in self.pending:
+                    self.free_slots.append(slot)
+                    finished.append((self.pending.pop(slot)[1], landmarks_to_results(landmarks, handedness)))
+                item = self.result_queue.get_nowait()
+        except queue.Empty:
+            pass
+        self.check_processes()
+        return finished
+
+    def check_processes(self):
+        """Reclaim the slots of detection processes that died and restart them."""
+        for index, process in enumerate(self.processes):
+            if process is None or process.is_alive():
+                continue
+            lost = [slot for slot, (owner, _) in self.pending.items() if owner == index]
+            for slot in lost:
+                del self.pending[slot]
+                self.free_slots.append(slot)
+            print(f"Error: detection process {process.pid} exited with code {process.exitcode}, {len(lost)} frames dropped")
+            if self.restarts[index] < MAX_DETECTION_RESTARTS:
+                self.restarts[index] += 1
+                self.start_process(index)
+                print(f"Restarted detection process ({self.restarts[index]}/{MAX_DETECTION_RESTARTS})")
+            else:
+                self.processes[index] = None
+                print("Error: detection process keeps crashing, not restarting it")
+
+    def close(self):
+        for task_queue, process in zip(self.task_queues, self.processes):
+            if process is not None:
+                task_queue.put(None)
+        for process in self.processes:
+            if process is None:
+                continue
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        del self.slots
+        self.shm.close()
+        self.shm.unlink()
+
+# Reusable frame buffers handed between threads. A consumer releases a buffer when it is done with it,
+# so in steady state capture decodes into the same few arrays instead of allocating one per frame.
+class FramePool:
+    def __init__(self, count=4):
+        self.count = count
+        self.free = deque()
+        self.shape = None
+        self.lock = threading.Lock()
+        self.allocated = 0
+
+    def acquire(self, shape):
+        with self.lock:
+            if shape != self.shape:
+                # Resolution changed: buffers of the old size are useless
+                self.free.clear()
+                self.shape = shape
+            if self.free:
+                return self.free.popleft()
+            self.allocated += 1
+        return np.empty(shape, dtype=np.uint8)
+
+    def release(self, buffer):
+        with self.lock:
+            if buffer.shape == self.shape and len(self.free) < self.count:
+                self.free.append(buffer)
+
+# Bounded mailbox between pipeline stages: when full, a new item replaces the oldest unread one
+class FrameMailbox:
+    def __init__(self, name, capacity=1, on_drop=None):
+        self.name = name
+        self.items = deque(maxlen=capacity)
+        self.condition = threading.Condition()
+        self.closed = False
+        self.put_count = 0
+        self.dropped_count = 0
+        self.on_drop = on_drop
+
+    def put(self, item):
+        dropped = None
+        with self.condition:
+            if len(self.items) == self.items.maxlen:
+                self.dropped_count += 1
+                dropped = self.items[0]
+            self.items.append(item)
+            self.put_count += 1
+            self.condition.notify()
+        if dropped is not None and self.on_drop is not None:
+            self.on_drop(dropped)
+
+    def get(self, timeout=None):
+        """Oldest unread item, or None if nothing arrives within timeout (0 = don't wait)."""
+        with self.condition:
+            if not self.items and not self.closed and timeout != 0:
+                self.condition.wait_for(lambda: self.items or self.closed, timeout)
+            return self.items.popleft() if self.items else None
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            return {"put": self.put_count, "dropped": self.dropped_count, "pending": len(self.items)}
+
+# Rolling per-stage timings of the frame pipeline, shown in the overlay and written to the stats log
+class PipelineStats:
+    def __init__(self, window=300):
+        self.window = window
+        self.lock = threading.Lock()
+        self.durations = {}
+        self.timestamps = {}
+        self.last_frame_ids = {}
+
+    def record(self, stage, seconds, frame_id=None):
+        now = time.monotonic()
+        with self.lock:
+            if stage not in self.durations:
+                self.durations[stage] = deque(maxlen=self.window)
+                self.timestamps[stage] = deque(maxlen=self.window)
+            self.durations[stage].append(seconds)
+            self.timestamps[stage].append(now)
+            if frame_id is not None:
+                self.last_frame_ids[stage] = frame_id
+
+    @contextmanager
+    def measure(self, stage, frame_id=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, frame_id)
+
+    def snapshot(self, dropped=None):
+        """p50/p95/p99 latency (ms) and throughput (fps) of every stage over the rolling window."""
+        with self.lock:
+            samples = {stage: (list(self.durations[stage]), self.timestamps[stage][0], self.timestamps[stage][-1])
+                       for stage in self.durations}
+            last_frame_ids = dict(self.last_frame_ids)
+        stages = {}
+        for stage, (durations, first, last) in samples.items():
+            p50, p95, p99 = np.percentile(np.asarray(durations) * 1000.0, [50, 95, 99])
+            stages[stage] = {
+                "count": len(durations),
+                "mean_ms": round(float(np.mean(durations)) * 1000.0, 3),
+                "p50_ms": round(float(p50), 3),
+                "p95_ms": round(float(p95), 3),
+                "p99_ms": round(float(p99), 3),
+                "fps": round((len(durations) - 1) / (last - first), 2) if last > first else 0.0,
+                "last_frame_id": last_frame_ids.get(stage)
+            }
+        return {"time": time.time(), "stages": stages, "dropped_frames": dropped or {}}
+
+# Serve PipelineStats snapshots as JSON on localhost (GET /stats)
+def start_stats_server(snapshot_provider, port):
+    class StatsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/stats"):
+                self.send_error(404)
+                return
+            body = json.dumps(snapshot_provider()).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer(("127.0.0.1", port), StatsHandler)
+    except OSError as e:
+        print(f"Error starting stats server on port {port}: {e}")
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Pipeline stats available at http://127.0.0.1:{port}/stats")
+    return server
+
 # Video processing thread
 class VideoThread(QThread):
-    frame_signal = pyqtSignal(tuple)
+    frame_ready = pyqtSignal()
 
-    def __init__(self):
+    def __init__(self, denoise_mode=DEFAULT_DENOISE_MODE, skip_static=False, hand_tracking=True, detection_processes=0):
         super().__init__()
         self.running = True
         self.cap = cv2.VideoCapture(0)
         if not self.cap.isOpened():
             print("Error: Could not open webcam")
-        self.frame_queue = Queue(maxsize=30)
-        self.processed_frame_queue = Queue(maxsize=30)
-        self.hand_results_queue = Queue(maxsize=30)
+        # Every stage only ever sees the newest frame, so latency stays at one frame when a stage is slow
+        self.capture_pool = FramePool()
+        self.capture_shape = None
+        self.capture_mailbox = FrameMailbox("capture", on_drop=lambda item: self.capture_pool.release(item[2]))
+        self.processed_mailbox = FrameMailbox("preprocess")
+        self.result_mailbox = FrameMailbox("detection")
+        self.stats = PipelineStats()
+        self.frame_id = 0
         self.hardware_backend = "cpu"
         try:
             if cv2.cuda.getCudaEnabledDeviceCount() > 0:
@@ -143,54 +1047,326 @@ class VideoThread(QThread):
                 pass
         if self.hardware_backend == "cpu":
             print("Using CPU backend")
+        self.preprocessor = CameraPreprocessor(self.hardware_backend, denoise_mode, skip_static)
+        self.hand_tracker = create_hand_tracker()
+        self.hand_tracker.enabled = hand_tracking
+        self.detection_pool = None
+        if detection_processes > 0:
+            try:
+                self.detection_pool = DetectionProcessPool(
+                    detection_processes, (RESOLUTIONS['cam_height'], RESOLUTIONS['cam_width'], 3), hand_tracking=hand_tracking)
+            except Exception as e:
+                print(f"Error starting detection processes, falling back to the detection thread: {e}")
         threading.Thread(target=self.preprocess_frame_worker, daemon=True).start()
         threading.Thread(target=self.hand_detection_worker, daemon=True).start()
 
     def preprocess_frame_worker(self):
         while self.running:
             try:
-                frame = self.frame_queue.get(timeout=1)
-                if frame is None:
+                item = self.capture_mailbox.get(timeout=1)
+                if item is None:
                     continue
-                processed_frame = preprocess_camera_image(frame, self.hardware_backend)
-                processed_frame = cv2.resize(processed_frame, (RESOLUTIONS['cam_width'], RESOLUTIONS['cam_height']))
-                processed_frame = cv2.flip(processed_frame, 1)
-                self.processed_frame_queue.put(processed_frame)
-                self.frame_queue.task_done()
+                frame_id, captured_at, frame = item
+                with self.stats.measure("preprocess", frame_id):
+                    processed_frame = self.preprocessor.process(frame)
+                self.capture_pool.release(frame)
+                self.processed_mailbox.put((frame_id, captured_at, processed_frame))
             except Exception:
                 continue
 
     def hand_detection_worker(self):
+        if self.detection_pool is not None:
+            self.pooled_detection_worker()
+        # Also the fallback once every detection process has crashed for good
         while self.running:
             try:
-                frame = self.processed_frame_queue.get(timeout=1)
-                if frame is None:
+                item = self.processed_mailbox.get(timeout=1)
+                if item is None:
                     continue
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                hands_results = hands.process(rgb_frame)
-                self.hand_results_queue.put((frame, hands_results))
-                self.processed_frame_queue.task_done()
+                frame_id, captured_at, frame = item
+                with self.stats.measure("detection", frame_id):
+                    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                    hands_results = self.hand_tracker.process(rgb_frame)
+                self.result_mailbox.put((frame, hands_results, frame_id, captured_at))
+                self.frame_ready.emit()
             except Exception:
                 continue
 
+    def pooled_detection_worker(self):
+        pool = self.detection_pool
+        last_frame_id = 0
+        while self.running:
+            if not pool.alive():
+                print("Error: no detection processes left, falling back to the detection thread")
+                self.detection_pool = None
+                pool.close()
+                return
+            try:
+                if pool.has_free_slot():
+                    item = self.processed_mailbox.get(timeout=0.005 if pool.busy() else 1)
+                    if item is not None:
+                        frame_id, captured_at, frame = item
+                        pool.submit(frame, (frame, frame_id, captured_at, time.perf_counter()))
+                finished = pool.collect(timeout=0 if pool.has_free_slot() else 1)
+                for (frame, frame_id, captured_at, submitted_at), hands_results in finished:
+                    self.stats.record("detection", time.perf_counter() - submitted_at, frame_id)
+                    # With several processes results can arrive out of order; never show an older frame
+                    if frame_id <= last_frame_id:
+                        continue
+                    last_frame_id = frame_id
+                    self.result_mailbox.put((frame, hands_results, frame_id, captured_at))
+                    self.frame_ready.emit()
+            except Exception as e:
+                print(f"Error in pooled_detection_worker: {e}")
+                continue
+
     def run(self):
         while self.running:
-            ret, frame = self.cap.read()
+            buffer = self.capture_pool.acquire(self.capture_shape) if self.capture_shape is not None else None
+            with self.stats.measure("capture"):
+                ret, frame = self.cap.read(buffer) if buffer is not None else self.cap.read()
             if not ret:
                 frame = np.zeros((RESOLUTIONS['cam_height'], RESOLUTIONS['cam_width'], 3), dtype=np.uint8)
-            try:
-                self.frame_queue.put(frame, timeout=0.1)
-                frame, hands_results = self.hand_results_queue.get(timeout=0.1)
-                self.frame_signal.emit((frame, hands_results))
-                self.hand_results_queue.task_done()
-            except Exception:
-                continue
+                self.msleep(33)
+            elif frame.shape != self.capture_shape:
+                # First frame or the camera switched resolution; later reads decode into pooled buffers
+                self.capture_shape = frame.shape
+            self.frame_id += 1
+            self.capture_mailbox.put((self.frame_id, time.monotonic(), frame))
+
+    def dropped_frames(self):
+        return {mailbox.name: mailbox.stats()["dropped"]
+                for mailbox in (self.capture_mailbox, self.processed_mailbox, self.result_mailbox)}
 
     def stop(self):
         self.running = False
+        for mailbox in (self.capture_mailbox, self.processed_mailbox, self.result_mailbox):
+            mailbox.close()
+        if self.detection_pool is not None:
+            self.detection_pool.close()
         if self.cap.isOpened():
             self.cap.release()
 
+# Gallery thumbnails: disk cache of the saved images' thumbnails and the model/delegate of the gallery list view
+def thumbnail_cache_path(image_path, stat):
+    key = f"{os.path.abspath(image_path)}|{stat.st_mtime_ns}|{stat.st_size}"
+    return os.path.join(THUMBNAIL_CACHE_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".png")
+
+# Path of an up-to-date thumbnail of image_path, created from the full image only on a cache miss
+def ensure_thumbnail(image_path, stat):
+    thumb_path = thumbnail_cache_path(image_path, stat)
+    if os.path.exists(thumb_path):
+        return thumb_path
+    image = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        return None
+    h, w = image.shape[:2]
+    scale = min(THUMBNAIL_SIZE / w, THUMBNAIL_SIZE / h, 1.0)
+    if scale < 1.0:
+        image = cv2.resize(image, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+    try:
+        os.makedirs(THUMBNAIL_CACHE_DIR, exist_ok=True)
+        cv2.imwrite(thumb_path, image)
+    except Exception as e:
+        print(f"Error writing thumbnail {thumb_path}: {e}")
+        return None
+    return thumb_path
+
+# Caption under a gallery thumbnail: weekday and date of the file (Jalali when persiantools is installed)
+def gallery_date_text(ctime):
+    if PERSIANTOOLS_AVAILABLE:
+        jalali_dt = JalaliDateTime.fromtimestamp(ctime)
+        date_str = jalali_dt.strftime("%Y/%m/%d %H:%M")
+        weekday = jalali_dt.weekday()
+        persian_weekdays = {
+            0: "شنبه", 1: "یک‌شنبه", 2: "دوشنبه", 3: "سه‌شنبه",
+            4: "چهارشنبه", 5: "پنج‌شنبه", 6: "جمعه"
+        }
+        weekday_str = persian_weekdays[weekday]
+        return f"{weekday_str} | {date_str}"
+    date_str = time.strftime("%Y-%m-%d %H:%M", time.localtime(ctime))
+    return f"Unknown Day | {date_str}"
+
+# Gallery images (SimpleNamespace path/stat/date_text, newest first) for the gallery list view.
+# Rows hold no widgets: the delegate paints them, and asks for a thumbnail only when it paints a row
+# whose pixmap isn't loaded. Those requests queue up in pending and are loaded one per timer tick.
+class GalleryModel(QAbstractListModel):
+    thumbnail_requested = pyqtSignal()
+
+    def __init__(self, parent=None, max_pixmaps=THUMBNAIL_MEMORY_CACHE):
+        super().__init__(parent)
+        self.entries = []
+        self.rows = {}
+        self.max_pixmaps = max_pixmaps
+        self.pixmaps = {}  # path -> QPixmap, least recently painted first
+        self.pending = deque()
+        self.pending_paths = set()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.entries)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.entries):
+            return None
+        entry = self.entries[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return entry.date_text
+        if role == Qt.ItemDataRole.UserRole:
+            return entry.path
+        if role == Qt.ItemDataRole.DecorationRole:
+            pixmap = self.pixmaps.pop(entry.path, None)
+            if pixmap is not None:
+                self.pixmaps[entry.path] = pixmap
+            return pixmap
+        return None
+
+    def set_entries(self, entries):
+        """Replace the rows; nothing is reset when the same files are listed again unchanged."""
+        if len(entries) == len(self.entries) and all(entry is old for entry, old in zip(entries, self.entries)):
+            return
+        self.beginResetModel()
+        kept = {entry.path for entry in entries if self.rows.get(entry.path) is not None and self.entries[self.rows[entry.path]] is entry}
+        self.pixmaps = {path: pixmap for path, pixmap in self.pixmaps.items() if path in kept}
+        self.entries = entries
+        self.rows = {entry.path: row for row, entry in enumerate(entries)}
+        self.pending.clear()
+        self.pending_paths.clear()
+        self.endResetModel()
+
+    def request_thumbnail(self, row):
+        path = self.entries[row].path
+        if path in self.pixmaps or path in self.pending_paths:
+            return
+        self.pending.append(path)
+        self.pending_paths.add(path)
+        self.thumbnail_requested.emit()
+
+    def load_next_thumbnail(self, is_visible):
+        """Load the oldest requested thumbnail whose row is still visible; False once nothing is pending."""
+        while self.pending:
+            path = self.pending.popleft()
+            self.pending_paths.discard(path)
+            row = self.rows.get(path)
+            if row is None:
+                continue
+            index = self.index(row)
+            if not is_visible(index):
+                continue  # Scrolled away before its turn; it is requested again when painted
+            thumb_path = ensure_thumbnail(path, self.entries[row].stat)
+            # A null pixmap marks an unreadable image, so it isn't requested on every repaint
+            self.pixmaps[path] = QPixmap(thumb_path) if thumb_path is not None else QPixmap()
+            while len(self.pixmaps) > self.max_pixmaps:
+                del self.pixmaps[next(iter(self.pixmaps))]
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+            return True
+        return False
+
+# Paints a gallery row like the old tile widgets: the framed thumbnail with its date caption below
+class GalleryDelegate(QStyledItemDelegate):
+    def sizeHint(self, option, index):
+        return QSize(*GALLERY_TILE_SIZE)
+
+    def paint(self, painter, option, index):
+        box = THUMBNAIL_SIZE + 12
+        x = option.rect.x() + (option.rect.width() - box) // 2
+        y = option.rect.y() + (option.rect.height() - GALLERY_TILE_SIZE[1]) // 2
+        image_rect = QRect(x, y, box, box)
+        caption_rect = QRect(x, y + box + 5, box, GALLERY_CAPTION_HEIGHT)
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setPen(QColor("#4e73df"))
+        painter.setBrush(QColor("#2c3e50"))
+        painter.drawRoundedRect(image_rect.adjusted(0, 0, -1, -1), 8, 8)
+        pixmap = index.data(Qt.ItemDataRole.DecorationRole)
+        if pixmap is None:
+            index.model().request_thumbnail(index.row())
+        elif not pixmap.isNull():
+            painter.drawPixmap(x + (box - pixmap.width()) // 2, y + (box - pixmap.height()) // 2, pixmap)
+        painter.setBrush(QColor("#34495e"))
+        painter.drawRoundedRect(caption_rect.adjusted(0, 0, -1, -1), 5, 5)
+        font = painter.font()
+        font.setFamily("Arial")
+        font.setPixelSize(12)
+        font.setBold(True)
+        painter.setFont(font)
+        painter.setPen(QColor("#ecf0f1"))
+        text = painter.fontMetrics().elidedText(index.data(Qt.ItemDataRole.DisplayRole), Qt.TextElideMode.ElideRight, box - 10)
+        painter.drawText(caption_rect, Qt.AlignmentFlag.AlignCenter, text)
+        painter.restore()
+
+# Background writer for the save action: encodes, writes atomically and prepares the gallery
+# thumbnail off the GUI thread, then reports the result through save_finished(path, error)
+class SaveWorker(QThread):
+    save_finished = pyqtSignal(str, str)
+
+    def __init__(self, save_format="png", png_compression=3, webp_quality=95):
+        super().__init__()
+        self.save_format = save_format
+        self.png_compression = png_compression
+        self.webp_quality = webp_quality
+        self.jobs = queue.Queue()
+
+    def submit(self, image, folder, name):
+        """Queue a snapshot of image; returns the path it will be written to."""
+        path = os.path.join(folder, name + SAVE_FORMATS[self.save_format])
+        self.jobs.put((image.copy(), path, self.save_format))
+        return path
+
+    def encode(self, image, save_format):
+        if save_format == "webp":
+            return cv2.imencode(".webp", image, [cv2.IMWRITE_WEBP_QUALITY, self.webp_quality])
+        return cv2.imencode(".png", image, [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression])
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            image, path, save_format = job
+            tmp_path = path + ".tmp"
+            try:
+                ok, encoded = self.encode(image, save_format)
+                if not ok:
+                    raise ValueError(f"could not encode {save_format}")
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(tmp_path, "wb") as f:
+                    f.write(encoded.tobytes())
+                # The gallery never sees a partially written file
+                os.replace(tmp_path, path)
+                ensure_thumbnail(path, os.stat(path))
+                self.save_finished.emit(path, "")
+            except Exception as e:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                self.save_finished.emit(path, str(e))
+
+    def stop(self):
+        """Finish the queued saves, then stop."""
+        self.jobs.put(None)
+        self.wait()
+
+# Label that paints straight from the display buffer; only the rectangles passed to
+# update_buffer_rect are repainted, instead of uploading a new full-size pixmap every frame
+class FrameView(QLabel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.image = None
+
+    def update_buffer_rect(self, x, y, w, h):
+        if w > 0 and h > 0:
+            self.update(QRect(x, y, w, h).translated(self.contentsRect().topLeft()))
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.image is None:
+            return
+        target = event.rect().intersected(self.contentsRect())
+        if target.isEmpty():
+            return
+        painter = QPainter(self)
+        painter.drawImage(target, self.image, target.translated(-self.contentsRect().topLeft()))
+        painter.end()
+
 # Image modal dialog
 class ImageModal(QDialog):
     def __init__(self, image_path, parent=None):
@@ -378,10 +1554,18 @@ class PaintingApp(QMainWindow):
         self.artwork_padded = None
         self.initial_canvas = None
         self.black_mask = None
-        self.undo_stack = []
-        self.finger_positions = []
-        self.ema_x = None
-        self.ema_y = None
+        self.region_index = None
+        self.undo_history = None
+        self.pointer = PointerSmoother()
+        # Display buffers reused every frame (reallocated only when a size changes)
+        self.frame_buffer = None
+        self.display_buffer = None
+        self.display_image = None
+        # Artwork half of the display: scaled once per canvas change, plus the cursor overlay
+        self.artwork_scaled = None
+        self.artwork_dirty = None
+        self.cursor_position = None
+        self.cursor_rect = None
         self.selected_color = None
         self.coloring_enabled = False
         self.last_action_time = {key: 0 for key in OPERATIONS}
@@ -398,6 +1582,11 @@ class PaintingApp(QMainWindow):
         self.pinch_cooldown = 0.2  # Cooldown period in seconds to prevent rapid repeated coloring
         # Initialize settings
         self.load_settings()
+        self.undo_history = UndoHistory(max_bytes=self.undo_memory_mb * 1024 * 1024)
+        self.design_cache = DesignCache(self.padding, self.region_pixel_cache, self.design_cache_mb * 1024 * 1024)
+        self.save_worker = SaveWorker(self.save_format, self.save_png_compression, self.save_webp_quality)
+        self.save_worker.save_finished.connect(self.on_save_finished)
+        self.save_worker.start()
 
         try:
             self.font = ImageFont.truetype("BNazanin.ttf", 22)
@@ -408,10 +1597,15 @@ class PaintingApp(QMainWindow):
             except Exception:
                 print("Warning: No Persian font found, using default font")
                 self.font = ImageFont.load_default()
+        self.toast_sprites = {}
 
         # Initialize video thread
-        self.video_thread = VideoThread()
-        self.video_thread.frame_signal.connect(self.update_frame)
+        self.video_thread = VideoThread(self.denoise_mode, self.denoise_skip_static, self.hand_tracking,
+                                        self.detection_processes)
+        self.video_thread.frame_ready.connect(self.on_frame_ready)
+        self.stats = self.video_thread.stats
+        self.stats_overlay_time = 0
+        self.stats_overlay_lines = []
         self.video_thread.start()
 
         # Setup UI
@@ -425,6 +1619,13 @@ class PaintingApp(QMainWindow):
         self.timer.timeout.connect(self.refresh_display)
         self.timer.start(33)
 
+        # Pipeline stats: periodic JSON log and optional localhost endpoint
+        self.stats_server = start_stats_server(self.stats_snapshot, self.stats_port) if self.stats_port else None
+        self.stats_timer = QTimer()
+        self.stats_timer.timeout.connect(self.write_stats_log)
+        if self.stats_log_interval > 0:
+            self.stats_timer.start(int(self.stats_log_interval * 1000))
+
         self.showMaximized()
 
     def load_settings(self):
@@ -433,6 +1634,19 @@ class PaintingApp(QMainWindow):
         self.padding = 130
         self.max_image_size = (2000, 2000)
         self.gallery_columns = 4
+        self.region_pixel_cache = True
+        self.undo_memory_mb = 64
+        self.show_stats_overlay = False
+        self.stats_log_interval = 0
+        self.stats_port = 0
+        self.denoise_mode = DEFAULT_DENOISE_MODE
+        self.denoise_skip_static = False
+        self.hand_tracking = True
+        self.detection_processes = 0
+        self.design_cache_mb = 64
+        self.save_format = "png"
+        self.save_png_compression = 3
+        self.save_webp_quality = 95
         settings_file = ".paint_settings.json"
         try:
             with open(settings_file, "r", encoding="utf-8") as f:
@@ -446,6 +1660,19 @@ class PaintingApp(QMainWindow):
                     settings.get("max_image_height", 2000)
                 )
                 self.gallery_columns = settings.get("gallery_columns", 4)
+                self.region_pixel_cache = bool(settings.get("region_pixel_cache", True))
+                self.undo_memory_mb = settings.get("undo_memory_mb", 64)
+                self.show_stats_overlay = bool(settings.get("show_stats_overlay", False))
+                self.stats_log_interval = settings.get("stats_log_interval", 0)
+                self.stats_port = settings.get("stats_port", 0)
+                self.denoise_mode = settings.get("denoise_mode", DEFAULT_DENOISE_MODE)
+                self.denoise_skip_static = bool(settings.get("denoise_skip_static", False))
+                self.hand_tracking = bool(settings.get("hand_tracking", settings.get("hand_roi_tracking", True)))
+                self.detection_processes = settings.get("detection_processes", 0)
+                self.design_cache_mb = settings.get("design_cache_mb", 64)
+                self.save_format = settings.get("save_format", "png")
+                self.save_png_compression = settings.get("save_png_compression", 3)
+                self.save_webp_quality = settings.get("save_webp_quality", 95)
                 # Validate loaded values
                 self.blur_amount = max(1, min(201, self.blur_amount))
                 self.padding = max(50, min(300, self.padding))
@@ -454,6 +1681,17 @@ class PaintingApp(QMainWindow):
                     max(500, min(5000, self.max_image_size[1]))
                 )
                 self.gallery_columns = max(2, min(6, self.gallery_columns))
+                self.undo_memory_mb = max(4, min(1024, self.undo_memory_mb))
+                self.detection_processes = max(0, min(os.cpu_count() or 1, self.detection_processes))
+                self.design_cache_mb = max(8, min(1024, self.design_cache_mb))
+                self.save_png_compression = max(0, min(9, self.save_png_compression))
+                self.save_webp_quality = max(1, min(100, self.save_webp_quality))
+                if self.save_format not in SAVE_FORMATS:
+                    self.save_format = "png"
+                self.stats_log_interval = max(0, min(3600, self.stats_log_interval))
+                self.stats_port = self.stats_port if 1024 <= self.stats_port <= 65535 else 0
+                if self.denoise_mode not in DENOISE_MODES:
+                    self.denoise_mode = DEFAULT_DENOISE_MODE
                 print(f"Loaded settings from {settings_file}")
         except (FileNotFoundError, json.JSONDecodeError, Exception) as e:
             print(f"Error loading settings from {settings_file}: {e}, using defaults")
@@ -467,7 +1705,20 @@ class PaintingApp(QMainWindow):
             "padding": self.padding,
             "max_image_width": self.max_image_size[0],
             "max_image_height": self.max_image_size[1],
-            "gallery_columns": self.gallery_columns
+            "gallery_columns": self.gallery_columns,
+            "region_pixel_cache": self.region_pixel_cache,
+            "undo_memory_mb": self.undo_memory_mb,
+            "show_stats_overlay": self.show_stats_overlay,
+            "stats_log_interval": self.stats_log_interval,
+            "stats_port": self.stats_port,
+            "denoise_mode": self.denoise_mode,
+            "denoise_skip_static": self.denoise_skip_static,
+            "hand_tracking": self.hand_tracking,
+            "detection_processes": self.detection_processes,
+            "design_cache_mb": self.design_cache_mb,
+            "save_format": self.save_format,
+            "save_png_compression": self.save_png_compression,
+            "save_webp_quality": self.save_webp_quality
         }
         try:
             with open(settings_file, "w", encoding="utf-8") as f:
@@ -503,7 +1754,7 @@ class PaintingApp(QMainWindow):
         display_layout = QHBoxLayout(display_widget)
         display_layout.setContentsMargins(0, 0, 0, 0)
         display_layout.setSpacing(0)
-        self.display_label = QLabel()
+        self.display_label = FrameView()
         self.display_label.setFixedSize(RESOLUTIONS['final_width'], RESOLUTIONS['final_height'])
         self.display_label.setStyleSheet("border: 1px solid #4e73df; border-radius: 8px;")
         display_layout.addWidget(self.display_label)
@@ -605,10 +1856,19 @@ class PaintingApp(QMainWindow):
         """)
         gallery_layout.addWidget(gallery_header)
 
-        scroll_area = QScrollArea()
-        scroll_area.setWidgetResizable(True)
-        scroll_area.setStyleSheet("""
-            QScrollArea { 
+        # Rows are painted by GalleryDelegate; thumbnails are loaded only for rows that get painted
+        self.gallery_model = GalleryModel(self)
+        self.gallery_view = QListView()
+        self.gallery_view.setViewMode(QListView.ViewMode.IconMode)
+        self.gallery_view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.gallery_view.setMovement(QListView.Movement.Static)
+        self.gallery_view.setUniformItemSizes(True)
+        self.gallery_view.setSelectionMode(QListView.SelectionMode.NoSelection)
+        self.gallery_view.setVerticalScrollMode(QListView.ScrollMode.ScrollPerPixel)
+        self.gallery_view.setItemDelegate(GalleryDelegate(self.gallery_view))
+        self.gallery_view.setModel(self.gallery_model)
+        self.gallery_view.setStyleSheet("""
+            QListView { 
                 background-color: #34495e; 
                 border: none; 
                 border-radius: 8px; 
@@ -632,12 +1892,12 @@ class PaintingApp(QMainWindow):
                 height: 0px; 
             }
         """)
-        gallery_widget = QWidget()
-        self.gallery_grid = QGridLayout(gallery_widget)
-        self.gallery_grid.setContentsMargins(0, 0, 0, 0)
-        self.gallery_grid.setSpacing(10)
-        scroll_area.setWidget(gallery_widget)
-        gallery_layout.addWidget(scroll_area)
+        self.gallery_view.clicked.connect(lambda index: self.show_image_modal(index.data(Qt.ItemDataRole.UserRole)))
+        self.gallery_view.resizeEvent = self.gallery_resize_event
+        gallery_layout.addWidget(self.gallery_view)
+        self.thumbnail_timer = QTimer()
+        self.thumbnail_timer.timeout.connect(self.load_next_thumbnail)
+        self.gallery_model.thumbnail_requested.connect(self.schedule_thumbnail_loads)
 
         self.load_gallery()
 
@@ -703,6 +1963,24 @@ class PaintingApp(QMainWindow):
         image_settings_layout.addWidget(QLabel("حداکثر ارتفاع تصویر (پیکسل):"), 3, 0, Qt.AlignmentFlag.AlignRight)
         image_settings_layout.addWidget(self.max_height_spinbox, 3, 1, Qt.AlignmentFlag.AlignLeft)
 
+        self.denoise_combo = QComboBox()
+        for mode, name in DENOISE_MODES.items():
+            self.denoise_combo.addItem(name, mode)
+        self.denoise_combo.setCurrentIndex(list(DENOISE_MODES).index(self.denoise_mode))
+        self.denoise_combo.setToolTip("روش کاهش نویز تصویر وب‌کم را انتخاب کنید (گزینه‌های پایین‌تر سریع‌ترند)")
+        image_settings_layout.addWidget(QLabel("کاهش نویز وب‌کم:"), 4, 0, Qt.AlignmentFlag.AlignRight)
+        image_settings_layout.addWidget(self.denoise_combo, 4, 1, Qt.AlignmentFlag.AlignLeft)
+
+        self.skip_static_checkbox = QCheckBox("رد کردن فریم‌های بدون تغییر")
+        self.skip_static_checkbox.setChecked(self.denoise_skip_static)
+        self.skip_static_checkbox.setToolTip("وقتی تصویر وب‌کم تغییری نکرده، کاهش نویز دوباره انجام نمی‌شود")
+        image_settings_layout.addWidget(self.skip_static_checkbox, 5, 1, Qt.AlignmentFlag.AlignLeft)
+
+        self.hand_tracking_checkbox = QCheckBox("ردیابی سریع یک دست")
+        self.hand_tracking_checkbox.setChecked(self.hand_tracking)
+        self.hand_tracking_checkbox.setToolTip("وقتی فقط یک دست در تصویر است، همان دست دنبال می‌شود و جستجوی کل تصویر فقط هر چند فریم یک بار انجام می‌شود تا سریع‌تر باشد")
+        image_settings_layout.addWidget(self.hand_tracking_checkbox, 6, 1, Qt.AlignmentFlag.AlignLeft)
+
         settings_layout.addWidget(image_settings_group)
 
         # Gallery Settings
@@ -835,10 +2113,21 @@ class PaintingApp(QMainWindow):
         self.padding = new_padding
         self.max_image_size = (new_max_width, new_max_height)
         self.gallery_columns = new_columns
+        self.denoise_mode = self.denoise_combo.currentData()
+        self.denoise_skip_static = self.skip_static_checkbox.isChecked()
+        # The preprocessing worker picks these up on its next frame
+        self.video_thread.preprocessor.denoise_mode = self.denoise_mode
+        self.video_thread.preprocessor.skip_static = self.denoise_skip_static
+        self.hand_tracking = self.hand_tracking_checkbox.isChecked()
+        self.video_thread.hand_tracker.enabled = self.hand_tracking
+        detection_pool = self.video_thread.detection_pool
+        if detection_pool is not None:
+            detection_pool.hand_tracking = self.hand_tracking
 
         self.save_settings()
 
         if reload_image_required:
+            self.design_cache.invalidate(padding=self.padding)
             self.load_image(self.current_image_index)
         if reload_gallery_required:
             self.load_gallery()
@@ -851,7 +2140,7 @@ class PaintingApp(QMainWindow):
         msg.setLayoutDirection(Qt.LayoutDirection.RightToLeft)
         msg.exec()
 
-        print(f"Settings applied: blur_amount={self.blur_amount}, padding={self.padding}, max_image_size={self.max_image_size}, gallery_columns={self.gallery_columns}")
+        print(f"Settings applied: blur_amount={self.blur_amount}, padding={self.padding}, max_image_size={self.max_image_size}, gallery_columns={self.gallery_columns}, denoise_mode={self.denoise_mode}, denoise_skip_static={self.denoise_skip_static}, hand_tracking={self.hand_tracking}")
 
     def add_new_design(self):
         """Open a file dialog to select a new design, validate, convert to PNG, and load it."""
@@ -908,60 +2197,55 @@ class PaintingApp(QMainWindow):
                 return
 
     def load_gallery(self):
-        """Load images into the gallery with dynamic column count."""
-        for i in range(self.gallery_grid.count()):
-            self.gallery_grid.itemAt(i).widget().deleteLater()
+        """Sync the gallery with static/gallery: only added, changed or deleted images drop their thumbnails."""
         gallery_folder = os.path.join("static", "gallery")
         os.makedirs(gallery_folder, exist_ok=True)
-        images = glob.glob(os.path.join(gallery_folder, "*.png"))
-        images.sort(key=os.path.getctime, reverse=True)
-        for i, img_path in enumerate(images):
-            pixmap = QPixmap(img_path).scaled(200, 200, Qt.AspectRatioMode.KeepAspectRatio)
-            image_label = QLabel()
-            image_label.setPixmap(pixmap)
-            image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            image_label.setStyleSheet("""
-                border: 1px solid #4e73df; 
-                padding: 5px; 
-                border-radius: 8px; 
-                background-color: #2c3e50; 
-            """)
-            image_label.mousePressEvent = lambda event, path=img_path: self.show_image_modal(path)
-            ctime = os.path.getctime(img_path)
-            if PERSIANTOOLS_AVAILABLE:
-                jalali_dt = JalaliDateTime.fromtimestamp(ctime)
-                date_str = jalali_dt.strftime("%Y/%m/%d %H:%M")
-                weekday = jalali_dt.weekday()
-                persian_weekdays = {
-                    0: "شنبه", 1: "یک‌شنبه", 2: "دوشنبه", 3: "سه‌شنبه",
-                    4: "چهارشنبه", 5: "پنج‌شنبه", 6: "جمعه"
-                }
-                weekday_str = persian_weekdays[weekday]
-                date_label_text = f"{weekday_str} | {date_str}"
-            else:
-                date_str = time.strftime("%Y-%m-d %H:%M", time.localtime(ctime))
-                date_label_text = f"Unknown Day | {date_str}"
-            date_label = QLabel(date_label_text)
-            date_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            date_label.setStyleSheet("""
-                background-color: #34495e; 
-                color: #ecf0f1; 
-                border: 1px solid #4e73df; 
-                border-radius: 5px; 
-                padding: 5px; 
-                font-size: 12px; 
-                font-weight: bold; 
-                text-align: center; 
-                font-family: 'Arial';
-            """)
-            container = QWidget()
-            container_layout = QVBoxLayout(container)
-            container_layout.setContentsMargins(0, 0, 0, 0)
-            container_layout.setSpacing(5)
-            container_layout.addWidget(image_label)
-            container_layout.addWidget(date_label)
-            container_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.gallery_grid.addWidget(container, i // self.gallery_columns, i % self.gallery_columns)
+        stats = {}
+        images = [path for ext in SAVE_FORMATS.values() for path in glob.glob(os.path.join(gallery_folder, "*" + ext))]
+        for img_path in images:
+            try:
+                stats[img_path] = os.stat(img_path)
+            except OSError:
+                continue  # Deleted while scanning
+        previous = {entry.path: entry for entry in self.gallery_model.entries}
+        entries = []
+        for img_path, stat in stats.items():
+            entry = previous.get(img_path)
+            if entry is None or (stat.st_mtime_ns, stat.st_size) != (entry.stat.st_mtime_ns, entry.stat.st_size):
+                entry = SimpleNamespace(path=img_path, stat=stat, date_text=gallery_date_text(stat.st_ctime))
+            entries.append(entry)
+        kept = {id(entry) for entry in entries}
+        for entry in previous.values():
+            if id(entry) not in kept:
+                try:
+                    os.remove(thumbnail_cache_path(entry.path, entry.stat))
+                except OSError:
+                    pass
+        entries.sort(key=lambda entry: entry.stat.st_ctime, reverse=True)
+        self.gallery_model.set_entries(entries)
+        self.update_gallery_grid()
+
+    def gallery_resize_event(self, event):
+        QListView.resizeEvent(self.gallery_view, event)
+        self.update_gallery_grid()
+
+    def update_gallery_grid(self):
+        """Split the gallery width into gallery_columns cells."""
+        # IconMode wraps a row that fills the viewport exactly, hence the spare pixel
+        width = self.gallery_view.viewport().width() - 1
+        grid = QSize(max(GALLERY_TILE_SIZE[0] + 10, width // self.gallery_columns), GALLERY_TILE_SIZE[1] + 10)
+        if self.gallery_view.gridSize() != grid:
+            self.gallery_view.setGridSize(grid)
+
+    def schedule_thumbnail_loads(self):
+        if not self.thumbnail_timer.isActive():
+            self.thumbnail_timer.start(0)
+
+    def load_next_thumbnail(self):
+        """Load one requested thumbnail per timer tick, so scrolling stays responsive on cache misses."""
+        viewport = self.gallery_view.viewport().rect()
+        if not self.gallery_model.load_next_thumbnail(lambda index: self.gallery_view.visualRect(index).intersects(viewport)):
+            self.thumbnail_timer.stop()
 
     def show_image_modal(self, image_path):
         modal = ImageModal(image_path, self)
@@ -971,22 +2255,17 @@ class PaintingApp(QMainWindow):
     def load_image(self, index):
         if 0 <= index < len(self.image_files):
             image_path = self.image_files[index]
-            self.canvas = cv2.imread(image_path)
-            if self.canvas is None:
+            prepared = self.design_cache.get(image_path)
+            if prepared is None:
                 print(f"Error: Could not load image {image_path}")
                 return False
-            self.canvas = preprocess_image(self.canvas)
-            self.canvas = cv2.resize(self.canvas, (RESOLUTIONS['canvas_width'], RESOLUTIONS['canvas_height']))
-            self.artwork_padded = cv2.copyMakeBorder(
-                self.canvas, self.padding, self.padding, self.padding, self.padding,
-                cv2.BORDER_CONSTANT, value=(255, 255, 255)
-            )
-            self.initial_canvas = self.artwork_padded.copy()
-            self.canvas = self.artwork_padded.copy()
-            gray = cv2.cvtColor(self.canvas, cv2.COLOR_BGR2GRAY)
-            _, self.black_mask = cv2.threshold(gray, 10, 255, cv2.THRESH_BINARY_INV)
-            self.black_mask = (self.black_mask == 255).astype(np.uint8) * 255
-            self.undo_stack.clear()
+            self.initial_canvas, self.black_mask, self.region_index = prepared
+            self.canvas = self.initial_canvas.copy()
+            self.artwork_padded = self.initial_canvas.copy()
+            self.mark_artwork_dirty()
+            self.undo_history.clear(self.region_index, self.initial_canvas)
+            # Next/prev will most likely ask for a neighbour next
+            self.design_cache.prefetch(self.image_files[i] for i in (index + 1, index - 1) if 0 <= i < len(self.image_files))
             print(f"Loaded image: {image_path}")
             return True
         return False
@@ -1014,18 +2293,20 @@ class PaintingApp(QMainWindow):
                 self.selected_color = "eraser"
                 self.coloring_enabled = True
                 print(f"Eraser activated, coloring_enabled: {self.coloring_enabled}")
-            elif action == "undo" and self.undo_stack:
-                self.canvas = self.undo_stack.pop()
-                self.artwork_padded = self.canvas.copy()
-                print("Undo performed")
-                black_regions = self.black_mask > 0
-                self.canvas[black_regions] = self.initial_canvas[black_regions]
-                self.artwork_padded[black_regions] = self.initial_canvas[black_regions]
-                print("Black lines restored after undo")
+            elif action == "undo":
+                rect = self.undo_history.undo(self.canvas)
+                if rect is not None:
+                    self.sync_artwork(rect)
+                    print(f"Undo performed, history size: {self.undo_history.used_bytes / 1024:.1f} KB")
+            elif action == "redo":
+                rect = self.undo_history.redo(self.canvas)
+                if rect is not None:
+                    self.sync_artwork(rect)
+                    print(f"Redo performed, history size: {self.undo_history.used_bytes / 1024:.1f} KB")
             elif action == "reset":
                 self.canvas = self.initial_canvas.copy()
-                self.artwork_padded = self.canvas.copy()
-                self.undo_stack.clear()
+                self.sync_artwork()
+                self.undo_history.clear(self.region_index, self.initial_canvas)
                 print("Canvas reset")
             elif action == "next" and self.current_image_index < len(self.image_files) - 1:
                 self.current_image_index += 1
@@ -1037,53 +2318,123 @@ class PaintingApp(QMainWindow):
                 print(f"Previous image loaded: {self.current_image_index}")
             elif action == "save":
                 gallery_folder = os.path.join("static", "gallery")
-                os.makedirs(gallery_folder, exist_ok=True)
                 timestamp = time.strftime("%Y%m%d_%H%M%S")
-                file_name = f"saved_{timestamp}.png"
-                file_path = os.path.join(gallery_folder, file_name)
-                cv2.imwrite(file_path, self.artwork_padded)
-                print(f"Image saved to {file_path}")
-                self.load_gallery()
+                file_path = self.save_worker.submit(self.artwork_padded, gallery_folder, f"saved_{timestamp}")
+                print(f"Saving image to {file_path}")
+
+    def on_save_finished(self, path, error):
+        if error:
+            print(f"Error saving image to {path}: {error}")
+            self.current_text = "خطا: ذخیره تصویر انجام نشد"
+            self.text_start_time = time.time()
+            return
+        print(f"Image saved to {path}")
+        self.load_gallery()
+
+    def fill_at(self, x_art, y_art):
+        """Fill (or erase) the region under a point of the padded canvas."""
+        if self.selected_color is None:
+            return
+        changed, rect = fill_region(self.canvas, self.initial_canvas, self.black_mask, self.region_index,
+                                    self.undo_history, x_art, y_art, self.selected_color)
+        if changed:
+            self.sync_artwork(rect)
+            print(f"{'Eraser' if self.selected_color == 'eraser' else 'Painting'} applied successfully, {changed} pixels changed")
+        else:
+            print("Warning: No region filled (empty mask)")
+
+    def mark_artwork_dirty(self, rect=None):
+        """Queue part of the artwork (x, y, w, h in canvas pixels; None for all of it) for repainting."""
+        if self.artwork_padded is None:
+            return
+        if rect is None:
+            rect = (0, 0, self.artwork_padded.shape[1], self.artwork_padded.shape[0])
+        if self.artwork_dirty is not None:
+            x0 = min(rect[0], self.artwork_dirty[0])
+            y0 = min(rect[1], self.artwork_dirty[1])
+            x1 = max(rect[0] + rect[2], self.artwork_dirty[0] + self.artwork_dirty[2])
+            y1 = max(rect[1] + rect[3], self.artwork_dirty[1] + self.artwork_dirty[3])
+            rect = (x0, y0, x1 - x0, y1 - y0)
+        self.artwork_dirty = rect
+
+    def sync_artwork(self, rect=None):
+        """Copy the edited box of the canvas (x, y, w, h; None for all of it) into artwork_padded and queue it for repainting."""
+        if self.artwork_padded is None or self.artwork_padded.shape != self.canvas.shape:
+            self.artwork_padded = self.canvas.copy()
+            self.mark_artwork_dirty()
+            return
+        if rect is None:
+            np.copyto(self.artwork_padded, self.canvas)
+            self.mark_artwork_dirty()
+            return
+        x, y, w, h = rect
+        self.artwork_padded[y:y + h, x:x + w] = self.canvas[y:y + h, x:x + w]
+        self.mark_artwork_dirty(rect)
 
     def draw_persian_text(self, image, text, position, text_color, border_color, anim_progress):
         try:
-            pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-            draw = ImageDraw.Draw(pil_image, 'RGBA')
-            if platform.system() == "Windows":
-                reshaped_text = arabic_reshaper.reshape(text)
-                display_text = get_display(reshaped_text)
-            else:
-                display_text = text
-            bbox = self.font.getbbox(display_text)
-            text_w = bbox[2] - bbox[0]
-            text_h = bbox[3] - bbox[1]
-            text_x = position[0] - text_w
-            alpha = int(255 * anim_progress)
-            scale = 1.0 + 0.2 * (1.0 - anim_progress)
-            bg_alpha = int(128 * anim_progress)
-            start_border_color = (100, 100, 100)
-            animated_border = tuple(
-                int(start_border_color[i] + (border_color[i] - start_border_color[i]) * anim_progress)
-                for i in range(3)
-            ) + (alpha,)
-            margin = 10
-            scaled_w = text_w * scale
-            scaled_h = text_h * scale
-            offset_x = (scaled_w - text_w) / 2
-            offset_y = (scaled_h - text_h) / 2
-            draw.rounded_rectangle(
-                (text_x-margin-offset_x, position[1]-margin-offset_y, text_x+text_w+margin+offset_x, position[1]+text_h+margin+offset_y),
-                radius=5, fill=(0, 0, 0, bg_alpha)
-            )
-            draw.rounded_rectangle(
-                (text_x-margin-offset_x, position[1]-margin-offset_y, text_x+text_w+margin+offset_x, position[1]+text_h+margin+offset_y),
-                radius=5, outline=animated_border, width=2
-            )
-            draw.text((text_x, position[1]), display_text, font=self.font, fill=(*text_color, alpha))
-            image[:] = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+            step = int(round(anim_progress * TOAST_ANIMATION_STEPS))
+            key = (text, tuple(position), tuple(text_color), tuple(border_color), step)
+            sprite = self.toast_sprites.pop(key, None)
+            if sprite is None:
+                if platform.system() == "Windows":
+                    reshaped_text = arabic_reshaper.reshape(text)
+                    display_text = get_display(reshaped_text)
+                else:
+                    display_text = text
+                sprite = render_toast_sprite(display_text, self.font, position, text_color, border_color, step / TOAST_ANIMATION_STEPS)
+                if len(self.toast_sprites) >= TOAST_CACHE_SIZE:
+                    self.toast_sprites.pop(next(iter(self.toast_sprites)))
+            # Re-inserting keeps the dict in least-recently-used order
+            self.toast_sprites[key] = sprite
+            blend_sprite(image, sprite)
         except Exception as e:
             print(f"Error rendering Persian text: {e}")
 
+    def on_frame_ready(self):
+        # Signals queued while the GUI was busy find the mailbox empty and are skipped
+        data = self.video_thread.result_mailbox.get(timeout=0)
+        if data is None:
+            return
+        frame, hands_results, frame_id, captured_at = data
+        with self.stats.measure("update_frame", frame_id):
+            self.update_frame((frame, hands_results))
+        self.stats.record("end_to_end", time.monotonic() - captured_at, frame_id)
+
+    def stats_snapshot(self):
+        return self.stats.snapshot(self.video_thread.dropped_frames())
+
+    def write_stats_log(self):
+        try:
+            with open(STATS_LOG_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(self.stats_snapshot()) + "\n")
+        except Exception as e:
+            print(f"Error writing {STATS_LOG_FILE}: {e}")
+
+    def draw_stats_overlay(self, image, current_time):
+        # Percentiles are recomputed twice a second, not on every frame
+        if current_time - self.stats_overlay_time > 0.5:
+            self.stats_overlay_time = current_time
+            snapshot = self.stats_snapshot()
+            self.stats_overlay_lines = [
+                f"{stage}: p50 {info['p50_ms']:.1f} p95 {info['p95_ms']:.1f} p99 {info['p99_ms']:.1f} ms, {info['fps']:.1f} fps"
+                for stage, info in snapshot["stages"].items()
+            ]
+            dropped = snapshot["dropped_frames"]
+            self.stats_overlay_lines.append("dropped: " + ", ".join(f"{name} {count}" for name, count in dropped.items()))
+        for i, line in enumerate(self.stats_overlay_lines):
+            y = RESOLUTIONS['cam_height'] - 10 - 14 * (len(self.stats_overlay_lines) - 1 - i)
+            cv2.putText(image, line, (6, y), cv2.FONT_HERSHEY_SIMPLEX, 0.35, (0, 0, 0), 3, cv2.LINE_AA)
+            cv2.putText(image, line, (6, y), cv2.FONT_HERSHEY_SIMPLEX, 0.35, (0, 255, 255), 1, cv2.LINE_AA)
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key.Key_F3:
+            self.show_stats_overlay = not self.show_stats_overlay
+            self.save_settings()
+            print(f"Stats overlay: {self.show_stats_overlay}")
+        else:
+            super().keyPressEvent(event)
+
     def update_frame(self, data):
         frame, hands_results = data
         current_time = time.time()
@@ -1093,7 +2444,7 @@ class PaintingApp(QMainWindow):
         is_right_hand_detected_temp = False
         is_right_hand_confident = False
 
-        landmark_frame = np.zeros_like(frame)
+        right_hand_landmarks = []
         if hands_results.multi_hand_landmarks and hands_results.multi_handedness:
             for hand_landmarks, handedness in zip(hands_results.multi_hand_landmarks, hands_results.multi_handedness):
                 hand_label = handedness.classification[0].label
@@ -1103,24 +2454,11 @@ class PaintingApp(QMainWindow):
                 if hand_label == "Right" and confidence > 0.7:
                     is_right_hand_detected_temp = True
                     is_right_hand_confident = True
-                    mp_drawing.draw_landmarks(landmark_frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
-                    index_finger_tip = hand_landmarks.landmark[8]
-                    thumb_tip = hand_landmarks.landmark[4]
+                    right_hand_landmarks.append(hand_landmarks)
                     h, w = frame.shape[:2]
-                    x_index, y_index = int(index_finger_tip.x * w), int(index_finger_tip.y * h)
-                    x_thumb, y_thumb = int(thumb_tip.x * w), int(thumb_tip.y * h)
-                    pinch_distance = np.sqrt((x_index - x_thumb) ** 2 + (y_index - y_thumb) ** 2) / w
-                    pinch_active = pinch_distance < 0.045
-                    # Optimize finger position smoothing for faster response
-                    self.finger_positions.append((x_index, y_index))
-                    if len(self.finger_positions) > 10:  # Reduced window size for faster response
-                        self.finger_positions.pop(0)
-                    x_mean = np.mean([pos[0] for pos in self.finger_positions])
-                    y_mean = np.mean([pos[1] for pos in self.finger_positions])
-                    # Adjusted EMA for quicker reaction
-                    self.ema_x = 0.6 * x_mean + (1 - 0.6) * (self.ema_x or x_mean)
-                    self.ema_y = 0.6 * y_mean + (1 - 0.6) * (self.ema_y or y_mean)
-                    x_avg, y_avg = int(self.ema_x), int(self.ema_y)
+                    x_index, y_index, pinch_distance = pinch_state(hand_landmarks, w, h)
+                    pinch_active = pinch_distance < PINCH_THRESHOLD
+                    x_avg, y_avg = self.pointer.update(x_index, y_index)
 
         if is_left_hand_detected_temp:
             self.left_hand_frame_counter += 1
@@ -1133,18 +2471,24 @@ class PaintingApp(QMainWindow):
         is_left_hand_detected = self.left_hand_frame_counter >= self.min_frames_for_unblur
         is_right_hand_stable = self.right_hand_frame_counter >= self.min_frames_for_right_hand
 
-        final_frame = cv2.GaussianBlur(frame, (self.blur_amount, self.blur_amount), 0) if DEFAULT_BLUR and not is_left_hand_detected else frame.copy()
-        mask = landmark_frame > 0
-        final_frame[mask] = landmark_frame[mask]
+        if self.frame_buffer is None or self.frame_buffer.shape != frame.shape:
+            self.frame_buffer = np.empty_like(frame)
+        final_frame = self.frame_buffer
+        if DEFAULT_BLUR and not is_left_hand_detected:
+            cv2.GaussianBlur(frame, (self.blur_amount, self.blur_amount), 0, dst=final_frame)
+        else:
+            np.copyto(final_frame, frame)
+        # Landmarks are drawn straight onto the composed frame after blurring
+        for hand_landmarks in right_hand_landmarks:
+            mp_drawing.draw_landmarks(final_frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
 
-        artwork_display = self.artwork_padded.copy() if self.artwork_padded is not None else np.zeros((RESOLUTIONS['canvas_height'] + 2 * self.padding, RESOLUTIONS['canvas_width'] + 2 * self.padding, 3), dtype=np.uint8)
-        
+        cursor_position = None
         if x_avg is not None and not is_left_hand_detected and self.canvas is not None and is_right_hand_confident and is_right_hand_stable:
             cam_w, cam_h = RESOLUTIONS['cam_width'], RESOLUTIONS['cam_height']
             art_w, art_h = RESOLUTIONS['canvas_width'] + 2 * self.padding, RESOLUTIONS['canvas_height'] + 2 * self.padding
             x_art = int(x_avg * (art_w / cam_w))
             y_art = int(y_avg * (art_h / cam_h))
-            cv2.circle(artwork_display, (x_art, y_art), 5, (0, 0, 255), -1)
+            cursor_position = (x_art, y_art)
             # Check if enough time has passed since the last pinch to allow a new coloring action
             time_since_last_pinch = current_time - self.last_pinch_time
             if pinch_active and not self.pinch_triggered and self.coloring_enabled and time_since_last_pinch > self.pinch_cooldown:
@@ -1155,46 +2499,11 @@ class PaintingApp(QMainWindow):
                         print(f"Operation skipped: Point ({x_art}, {y_art}) is on a black line")
                     else:
                         print(f"Pinch at ({x_art}, {y_art}), Canvas shape: {self.canvas.shape}")
-                        if len(self.undo_stack) > 100:
-                            self.undo_stack = self.undo_stack[-10:]
-                        self.undo_stack.append(self.canvas.copy())
-                        mask = np.zeros((self.canvas.shape[0] + 2, self.canvas.shape[1] + 2), dtype=np.uint8)
                         if self.selected_color == "eraser":
                             print(f"Erasing at ({x_art}, {y_art})")
-                            _, temp_canvas, mask, _ = cv2.floodFill(
-                                self.canvas.copy(),
-                                mask,
-                                (x_art, y_art),
-                                (255, 255, 255),
-                                loDiff=(30, 30, 30),  # Reduced loDiff/upDiff for faster flood fill
-                                upDiff=(30, 30, 30),
-                                flags=cv2.FLOODFILL_FIXED_RANGE
-                            )
-                            region = (mask[1:-1, 1:-1] > 0)
-                            print(f"Eraser region shape: {region.shape}, Non-zero pixels: {region.sum()}")
-                            if region.sum() > 0:
-                                self.canvas[region] = self.initial_canvas[region]
-                                black_regions = self.black_mask > 0
-                                self.canvas[black_regions] = self.initial_canvas[black_regions]
-                                self.artwork_padded = self.canvas.copy()
-                                print("Eraser applied successfully, black lines restored")
-                            else:
-                                print("Warning: No region erased (empty mask)")
                         elif self.selected_color is not None:
                             print(f"Painting at ({x_art}, {y_art}) with color {self.selected_color}")
-                            cv2.floodFill(
-                                self.canvas,
-                                mask,
-                                (x_art, y_art),
-                                self.selected_color,
-                                loDiff=(30, 30, 30),  # Reduced loDiff/upDiff for faster flood fill
-                                upDiff=(30, 30, 30),
-                                flags=cv2.FLOODFILL_FIXED_RANGE
-                            )
-                            black_regions = self.black_mask > 0
-                            self.canvas[black_regions] = self.initial_canvas[black_regions]
-                            self.artwork_padded = self.canvas.copy()
-                            print("Painting applied successfully, black lines restored")
+                        self.fill_at(x_art, y_art)
             elif not pinch_active:
                 self.pinch_triggered = False
 
@@ -1230,31 +2539,98 @@ class PaintingApp(QMainWindow):
                         text_color = info["text_color"]
                         border_color = info["border_color"]
                         break
-            self.draw_persian_text(final_frame, self.current_text, (RESOLUTIONS['cam_width'] - 20, 30), text_color, border_color, progress)
+            with self.stats.measure("toast"):
+                self.draw_persian_text(final_frame, self.current_text, (RESOLUTIONS['cam_width'] - 20, 30), text_color, border_color, progress)
+
+        if self.show_stats_overlay:
+            self.draw_stats_overlay(final_frame, current_time)
 
         self.current_frame = final_frame
-        self.current_artwork = artwork_display
+        self.cursor_position = cursor_position
 
     def refresh_display(self):
-        if hasattr(self, 'current_frame') and hasattr(self, 'current_artwork') and self.current_frame is not None and self.current_artwork is not None:
-            try:
-                frame_rgb = cv2.cvtColor(self.current_frame, cv2.COLOR_BGR2RGB)
-                artwork_rgb = cv2.cvtColor(self.current_artwork, cv2.COLOR_BGR2RGB)
-                frame_resized = cv2.resize(frame_rgb, (RESOLUTIONS['cam_width'], artwork_rgb.shape[0]))
-                combined_frame = np.hstack((frame_resized, artwork_rgb))
-                combined_frame = cv2.resize(combined_frame, (RESOLUTIONS['final_width'], RESOLUTIONS['final_height']))
-                h, w, c = combined_frame.shape
-                qimage = QImage(combined_frame.data, w, h, w * c, QImage.Format.Format_RGB888)
-                self.display_label.setPixmap(QPixmap.fromImage(qimage))
-            except Exception as e:
-                print(f"Error in refresh_display: {e}")
+        if getattr(self, 'current_frame', None) is None:
+            return
+        try:
+            refresh_start = time.perf_counter()
+            w, h = RESOLUTIONS['final_width'], RESOLUTIONS['final_height']
+            if self.display_buffer is None:
+                self.display_buffer = np.zeros((h, w, 3), dtype=np.uint8)
+                # BGR888 lets Qt read the OpenCV buffer as-is, without a color conversion
+                self.display_image = QImage(self.display_buffer.data, w, h, w * 3, QImage.Format.Format_BGR888)
+                self.display_label.image = self.display_image
+            cam_w = RESOLUTIONS['cam_width']
+            art_w = RESOLUTIONS['canvas_width'] + 2 * self.padding
+            # Same split as scaling the camera and the artwork side by side as one image
+            split = int(round(w * cam_w / (cam_w + art_w)))
+            cv2.resize(self.current_frame, (split, h), dst=self.display_buffer[:, :split])
+            self.display_label.update_buffer_rect(0, 0, split, h)
+            self.refresh_artwork_panel(split)
+            self.stats.record("refresh_display", time.perf_counter() - refresh_start)
+        except Exception as e:
+            print(f"Error in refresh_display: {e}")
+
+    def refresh_artwork_panel(self, split):
+        """Repaint only the changed parts of the artwork half of the display and move the cursor."""
+        h, w = self.display_buffer.shape[:2]
+        panel = self.display_buffer[:, split:]
+        panel_h, panel_w = panel.shape[:2]
+        if self.artwork_scaled is None or self.artwork_scaled.shape[:2] != (panel_h, panel_w):
+            self.artwork_scaled = np.zeros((panel_h, panel_w, 3), dtype=np.uint8)
+            self.mark_artwork_dirty()
+            self.cursor_rect = None
+            panel[:] = 0
+            self.display_label.update_buffer_rect(split, 0, panel_w, panel_h)
+        if self.artwork_padded is not None:
+            art_h, art_w = self.artwork_padded.shape[:2]
+        else:
+            art_h, art_w = RESOLUTIONS['canvas_height'] + 2 * self.padding, RESOLUTIONS['canvas_width'] + 2 * self.padding
+        scale_x, scale_y = panel_w / art_w, panel_h / art_h
+
+        def clip(x0, y0, x1, y1):
+            x0, y0 = max(0, x0), max(0, y0)
+            x1, y1 = min(panel_w, x1), min(panel_h, y1)
+            return (x0, y0, x1 - x0, y1 - y0) if x1 > x0 and y1 > y0 else None
+
+        restore = []
+        if self.artwork_dirty is not None and self.artwork_padded is not None:
+            cv2.resize(self.artwork_padded, (panel_w, panel_h), dst=self.artwork_scaled)
+            x, y, dw, dh = self.artwork_dirty
+            # Bilinear scaling spreads a changed canvas pixel over its neighbours, hence the margin
+            restore.append(clip(int(x * scale_x) - 2, int(y * scale_y) - 2,
+                                int(np.ceil((x + dw) * scale_x)) + 2, int(np.ceil((y + dh) * scale_y)) + 2))
+        self.artwork_dirty = None
+
+        cursor_rect = None
+        if self.cursor_position is not None:
+            radius = max(2, int(round(5 * (scale_x + scale_y) / 2)))
+            center = (int((self.cursor_position[0] + 0.5) * scale_x), int((self.cursor_position[1] + 0.5) * scale_y))
+            cursor_rect = clip(center[0] - radius - 1, center[1] - radius - 1, center[0] + radius + 2, center[1] + radius + 2)
+        if cursor_rect != self.cursor_rect:
+            restore += [self.cursor_rect, cursor_rect]
+        restore = [rect for rect in restore if rect is not None]
+        if not restore:
+            return  # Static canvas and cursor: nothing to repaint on this side
+        for x, y, rw, rh in restore:
+            panel[y:y + rh, x:x + rw] = self.artwork_scaled[y:y + rh, x:x + rw]
+            self.display_label.update_buffer_rect(split + x, y, rw, rh)
+        # The cursor is an overlay on the display buffer, the artwork itself is never copied for it
+        if cursor_rect is not None:
+            cv2.circle(panel, center, radius, (0, 0, 255), -1)
+        self.cursor_rect = cursor_rect
 
     def closeEvent(self, event):
+        if self.stats_server is not None:
+            self.stats_server.shutdown()
         self.video_thread.stop()
-        hands.close()
+        self.save_worker.stop()
+        self.design_cache.close()
+        self.video_thread.hand_tracker.close()
         event.accept()
 
 if __name__ == "__main__":
+    # Spawned detection processes of the frozen (PyInstaller) exe must run detection_process_main, not the app
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     app.setLayoutDirection(Qt.LayoutDirection.RightToLeft)
     window = PaintingApp()
@@ -0,0 +1,224 @@
+# اتصال‌ها، نوشتن دسته‌ای، مهاجرت شِما و پاک‌سازی دوره‌ای دیتابیس دستورها؛ مشترک بین سرورهای Flask
+# نسخه‌های یکسان این فایل: ver1_paint_ws_stream_tcs3200/flask_server، ver2_vibefill_flask_opencv/VibeFill
+# و VibeFill/micropython/ws_servo_server/server؛ هر تغییری در هر سه اعمال شود
+# جدول‌های هر سرور (tables) به migrate_db، apply_retention و retention_worker داده می‌شود
+import sqlite3
+import time
+from queue import Queue, Empty
+from threading import Lock, Thread, Event
+from contextlib import contextmanager
+
+# ------------------ اتصال‌ها و نوشتن دسته‌ای دیتابیس ------------------
+class ConnectionPool:
+    """اتصال‌های باز SQLite که بین درخواست‌ها دوباره استفاده می‌شوند (به‌جای باز و بسته کردن در هر درخواست)"""
+    def __init__(self, path, size=4):
+        self.path = path
+        self.size = size
+        self.idle = Queue()
+        self.created = 0
+        self.lock = Lock()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # در حالت WAL خواندن‌ها منتظر نوشتن نمی‌مانند و synchronous=NORMAL برای WAL امن است
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self.idle.get_nowait()
+        except Empty:
+            with self.lock:
+                can_create = self.created < self.size
+                if can_create:
+                    self.created += 1
+            # وقتی همه اتصال‌ها در حال استفاده‌اند، منتظر آزاد شدن یکی می‌مانیم
+            conn = self.connect() if can_create else self.idle.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self.idle.put(conn)
+
+class BatchWriter:
+    """درج‌ها را در صف جمع می‌کند و هر چند میلی‌ثانیه همه را در یک تراکنش ثبت می‌کند"""
+    def __init__(self, pool, interval=0.005, max_batch=500):
+        self.pool = pool
+        self.interval = interval
+        self.max_batch = max_batch
+        self.jobs = Queue()
+        self.stats_lock = Lock()
+        self.rows = 0
+        self.failed = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.commit_seconds = 0.0
+        self.last_error = None
+        self.started_at = time.time()
+        Thread(target=self.run, daemon=True).start()
+
+    def submit(self, sql, params, wait=True, on_commit=None):
+        """اگر wait باشد تا ثبت تراکنش صبر می‌کند و نتیجه (True/False) را برمی‌گرداند.
+        on_commit فقط بعد از ثبت واقعی سطر در ترد نویسنده اجرا می‌شود، چه wait باشد چه نباشد"""
+        job = [sql, params, Event() if wait else None, False, on_commit]
+        self.jobs.put(job)
+        if not wait:
+            return True
+        job[2].wait()
+        return job[3]
+
+    def run(self):
+        conn = None
+        while True:
+            batch = [self.jobs.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.jobs.get(timeout=remaining))
+                except Empty:
+                    break
+            start = time.perf_counter()
+            try:
+                if conn is None:
+                    conn = self.pool.connect()
+                self.write(conn, batch)
+            except Exception as e:
+                # اتصال باز نشد یا از دست رفت؛ ترد زنده می‌ماند و دسته بعدی با اتصال تازه امتحان می‌شود
+                print("❌ خطا در اتصال نویسنده دیتابیس، این دسته ثبت نشد:", e)
+                self.last_error = str(e)
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                    conn = None
+            finally:
+                self.finish(batch, time.perf_counter() - start)
+
+    def write(self, conn, batch):
+        try:
+            with conn:
+                for job in batch:
+                    conn.execute(job[0], job[1])
+            for job in batch:
+                job[3] = True
+        except Exception as e:
+            print("❌ خطا در ثبت دسته‌ای، ثبت تک‌تک دستورها:", e)
+            # یک دستور خراب نباید بقیه دسته را از بین ببرد
+            for job in batch:
+                try:
+                    with conn:
+                        conn.execute(job[0], job[1])
+                    job[3] = True
+                except Exception as e:
+                    print("❌ خطا در درج دستور:", e)
+                    self.last_error = str(e)
+
+    def finish(self, batch, elapsed):
+        """ثبت آمار، اجرای on_commit ردیف‌های ثبت‌شده و آزاد کردن همه منتظرها (موفق یا ناموفق)"""
+        with self.stats_lock:
+            self.batches += 1
+            self.rows += sum(1 for job in batch if job[3])
+            self.failed += sum(1 for job in batch if not job[3])
+            self.largest_batch = max(self.largest_batch, len(batch))
+            self.commit_seconds += elapsed
+        for job in batch:
+            if job[3] and job[4] is not None:
+                try:
+                    job[4]()
+                except Exception as e:
+                    print("❌ خطا در اجرای کار پس از ثبت:", e)
+            if job[2] is not None:
+                job[2].set()
+
+    def metrics(self):
+        with self.stats_lock:
+            uptime = max(time.time() - self.started_at, 1e-9)
+            return {
+                'rows': self.rows,
+                'failed': self.failed,
+                'batches': self.batches,
+                'avg_batch': self.rows / self.batches if self.batches else 0,
+                'largest_batch': self.largest_batch,
+                'avg_commit_ms': 1000 * self.commit_seconds / self.batches if self.batches else 0,
+                'rows_per_second': self.rows / uptime,
+                'pending': self.jobs.qsize(),
+                'last_error': self.last_error
+            }
+
+# ------------------ مهاجرت شِما و پاک‌سازی دوره‌ای دیتابیس ------------------
+SCHEMA_VERSION = 1
+# هر ردیف که جزو RETENTION_KEEP_ROWS ردیف آخر جدول یا جوان‌تر از RETENTION_MAX_AGE_DAYS روز باشد نگه داشته می‌شود
+RETENTION_KEEP_ROWS = 10000
+RETENTION_MAX_AGE_DAYS = 7
+RETENTION_INTERVAL = 600  # ثانیه
+RETENTION_CHUNK = 5000  # حذف در دسته‌های کوچک تا قفل نوشتن کوتاه بماند
+
+def migrate_db(conn, tables):
+    """ارتقای فایل‌های دیتابیس قدیمی به آخرین نسخه شِما (نسخه در PRAGMA user_version ثبت می‌شود)"""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table in tables:
+        if table in existing:
+            # کوئری «آخرین دستور پردازش‌نشده» مستقیم از روی این ایندکس جواب داده می‌شود
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_processed_created ON {table} (processed, created_at)")
+    conn.commit()
+    # auto_vacuum روی فایل موجود فقط بعد از یک VACUUM اعمال می‌شود
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.commit()
+    print(f"✅ دیتابیس به نسخه {SCHEMA_VERSION} شِما ارتقا یافت.")
+
+def apply_retention(conn, tables):
+    """حذف ردیف‌های قدیمی همه جدول‌ها؛ تعداد ردیف‌های حذف‌شده را برمی‌گرداند"""
+    cutoff = f"-{RETENTION_MAX_AGE_DAYS} days"
+    removed = 0
+    for table in tables:
+        while True:
+            with conn:
+                cur = conn.execute(f"""
+                    DELETE FROM {table} WHERE id IN (
+                        SELECT id FROM {table}
+                        WHERE id <= (SELECT MAX(id) FROM {table}) - ? AND created_at < datetime('now', ?)
+                        LIMIT ?
+                    )
+                """, (RETENTION_KEEP_ROWS, cutoff, RETENTION_CHUNK))
+            removed += cur.rowcount
+            if cur.rowcount < RETENTION_CHUNK:
+                break
+    if removed:
+        # صفحه‌های آزادشده به سیستم‌عامل برگردانده می‌شوند (executescript تا پایان اجرا می‌کند)
+        conn.executescript("PRAGMA incremental_vacuum;")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return removed
+
+def retention_worker(pool, tables):
+    conn = pool.connect()
+    while True:
+        try:
+            start = time.perf_counter()
+            removed = apply_retention(conn, tables)
+            if removed:
+                print(f"🧹 {removed} ردیف قدیمی از دیتابیس حذف شد ({time.perf_counter() - start:.2f} ثانیه).")
+        except Exception as e:
+            print("❌ خطا در پاک‌سازی دیتابیس:", e)
+        time.sleep(RETENTION_INTERVAL)
+
+def migrate_files(paths, tables):
+    """ارتقای فایل‌های دیتابیس دیگر بدون اجرای سرور (گزینه --migrate سرورها)؛ هیچ تردی راه نمی‌افتد"""
+    for path in paths:
+        conn = ConnectionPool(path).connect()
+        try:
+            migrate_db(conn, tables)
+        finally:
+            conn.close()
@@ -0,0 +1,460 @@
+# نسخه async سرور کنترل و استریم (ASGI)؛ همان مسیرهای ws_servo_control_mysql.py روی یک event loop
+# هر بیننده استریم و هر کلاینت وب‌سوکت به‌جای یک ترد سیستم‌عامل فقط یک coroutine است
+# اجرا:  python ws_servo_control_async.py   یا   uvicorn ws_servo_control_async:app --host 0.0.0.0 --port 7000
+import asyncio
+import datetime
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import parse_qsl
+
+try:
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+    from starlette.routing import Mount, Route, WebSocketRoute
+    from starlette.staticfiles import StaticFiles
+except ImportError:
+    print("❌ برای حالت async نصب starlette و uvicorn لازم است: pip install starlette \"uvicorn[standard]\"")
+    sys.exit(1)
+
+# دیتابیس، وضعیت حافظه‌ای، نوشتن دسته‌ای، ادغام سروو و فریم‌های ESP32 از سرور اصلی استفاده می‌شوند
+import ws_servo_control_mysql as server
+
+HOST = '0.0.0.0'
+PORT = 7000
+DB_EXECUTOR_WORKERS = 8  # تردهای کار با SQLite و فایل‌های گالری؛ مستقل از تعداد کلاینت‌ها
+
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+
+async def run_blocking(func, *args, **kwargs):
+    """اجرای کارهای مسدودکننده (SQLite، فایل) در executor تا event loop معطل نشود"""
+    return await asyncio.get_running_loop().run_in_executor(db_executor, partial(func, *args, **kwargs))
+
+# ------------------ پخش پیام به کلاینت‌های وب‌سوکت ------------------
+class AsyncClientChannel:
+    """صف خروجی محدود و task ارسال یک کلاینت؛ همان رفتار ClientChannel سرور اصلی بدون ترد"""
+    def __init__(self, ws, hub):
+        self.ws = ws
+        self.hub = hub
+        self.messages = deque()  # (کلید ادغام, متن پیام, زمان ورود به صف)
+        self.wakeup = asyncio.Event()
+        self.alive = True
+        self.dropped = 0
+        self.last_progress = time.monotonic()
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def offer(self, text, key=None):
+        """پیام‌های با کلید یکسان (مثلاً موقعیت سروو) جایگزین نسخه قبلی در صف می‌شوند"""
+        if not self.alive:
+            return False
+        if key is not None:
+            for i, (queued_key, _, queued_at) in enumerate(self.messages):
+                if queued_key == key:
+                    self.messages[i] = (key, text, queued_at)
+                    return True
+        if len(self.messages) >= server.CLIENT_QUEUE_SIZE:
+            if time.monotonic() - self.last_progress > server.CLIENT_STALL_TIMEOUT:
+                return False  # کلاینت گیر کرده؛ hub آن را حذف می‌کند
+            self.messages.popleft()  # قدیمی‌ترین پیام کنار گذاشته می‌شود
+            self.dropped += 1
+        if not self.messages:
+            # بیکار بودن کلاینت گیر کردن حساب نمی‌شود؛ زمان انتظار از اولین پیام صف شمرده می‌شود
+            self.last_progress = time.monotonic()
+        self.messages.append((key, text, time.monotonic()))
+        self.wakeup.set()
+        return True
+
+    async def run(self):
+        while True:
+            while self.alive and not self.messages:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+            if not self.alive:
+                return
+            _, text, queued_at = self.messages.popleft()
+            start = time.monotonic()
+            try:
+                await self.ws.send_text(text)
+            except Exception as e:
+                print("❌ خطا در ارسال به وب‌سوکت، کلاینت حذف شد:", e)
+                self.hub.evict(self)
+                return
+            now = time.monotonic()
+            self.last_progress = now
+            self.hub.record_send(now - start, now - queued_at)
+
+    def close(self):
+        self.alive = False
+        self.messages.clear()
+        self.wakeup.set()
+        # ارسالی که روی اتصال مرده معطل مانده هم لغو می‌شود
+        if self.task is not asyncio.current_task():
+            self.task.cancel()
+
+    def depth(self):
+        return len(self.messages)
+
+class AsyncBroadcastHub:
+    """همان رابط BroadcastHub؛ همه وضعیت فقط روی event loop تغییر می‌کند و
+    broadcast از تردهای دیگر (مثل ادغام‌کننده سروو) با call_soon_threadsafe به loop سپرده می‌شود"""
+    def __init__(self):
+        self.loop = None
+        self.channels = {}
+        self.sent = 0
+        self.evicted = 0
+        self.closed_dropped = 0  # پیام‌های کنارگذاشته کلاینت‌هایی که دیگر متصل نیستند
+        self.send_seconds = 0.0
+        self.max_send_seconds = 0.0
+        self.queue_seconds = 0.0
+
+    def register(self, ws):
+        self.channels[ws] = AsyncClientChannel(ws, self)
+        return len(self.channels)
+
+    def unregister(self, ws):
+        channel = self.channels.pop(ws, None)
+        if channel is not None:
+            self.closed_dropped += channel.dropped
+            channel.close()
+        return len(self.channels)
+
+    def evict(self, channel):
+        if self.channels.get(channel.ws) is not channel:
+            return
+        del self.channels[channel.ws]
+        self.evicted += 1
+        self.closed_dropped += channel.dropped
+        channel.close()
+        self.loop.create_task(self._close_socket(channel.ws))
+
+    @staticmethod
+    async def _close_socket(ws):
+        try:
+            await ws.close()
+        except Exception:
+            pass
+
+    def broadcast(self, message, key=None):
+        if self.loop is None:
+            return
+        text = message if isinstance(message, str) else json.dumps(message)
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._broadcast(text, key)
+        else:
+            self.loop.call_soon_threadsafe(self._broadcast, text, key)
+
+    def _broadcast(self, text, key):
+        for channel in list(self.channels.values()):
+            if not channel.offer(text, key):
+                print("❌ کلاینت وب‌سوکت پاسخ نمی‌دهد و حذف شد.")
+                self.evict(channel)
+
+    def record_send(self, send_seconds, queue_seconds):
+        self.sent += 1
+        self.send_seconds += send_seconds
+        self.queue_seconds += queue_seconds
+        self.max_send_seconds = max(self.max_send_seconds, send_seconds)
+
+    def count(self):
+        return len(self.channels)
+
+    def metrics(self):
+        channels = list(self.channels.values())
+        depths = [channel.depth() for channel in channels]
+        return {
+            'clients': len(channels),
+            'sent': self.sent,
+            'evicted': self.evicted,
+            'avg_send_ms': 1000 * self.send_seconds / self.sent if self.sent else 0,
+            'max_send_ms': 1000 * self.max_send_seconds,
+            'avg_queue_ms': 1000 * self.queue_seconds / self.sent if self.sent else 0,
+            'queued': sum(depths),
+            'max_queue_depth': max(depths, default=0),
+            'dropped': self.closed_dropped + sum(channel.dropped for channel in channels)
+        }
+
+hub = AsyncBroadcastHub()
+# ادغام‌کننده سروو مخصوص همین سرور؛ از ترد خودش با call_soon_threadsafe به کلاینت‌های async پخش می‌کند
+servo_coalescer = server.ServoCoalescer(hub.broadcast)
+
+# ------------------ فریم‌های ESP32-CAM ------------------
+class FrameSignal:
+    """بیدار کردن بینندگان MJPEG روی event loop با رسیدن فریم جدید (معادل async شرط FrameBroker)"""
+    def __init__(self):
+        self.event = asyncio.Event()
+
+    def notify(self):
+        event, self.event = self.event, asyncio.Event()
+        event.set()
+
+    async def wait(self, timeout=1.0):
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+frame_signal = None  # در lifespan و روی همان loop ساخته می‌شود
+
+# ------------------ پاسخ‌ها ------------------
+def conditional_json(request, payload, version):
+    """پاسخ JSON با ETag؛ اگر کلاینت همین نسخه را دارد (If-None-Match یا since_version) فقط 304 برمی‌گردد"""
+    etag = f"{server.state_store.boot_id}-{version}"
+    try:
+        since_version = int(request.query_params.get('since_version'))
+    except (TypeError, ValueError):
+        since_version = None
+    if_none_match = [tag.strip().removeprefix('W/').strip('"') for tag in request.headers.get('if-none-match', '').split(',')]
+    if etag in if_none_match or '*' in if_none_match or since_version == version:
+        response = Response(status_code=304)
+    else:
+        response = JSONResponse(payload)
+    response.headers['ETag'] = f'"{etag}"'
+    response.headers['X-State-Version'] = str(version)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except Exception:
+        return {}
+
+async def read_form_or_json(request):
+    if request.headers.get('content-type', '').startswith('application/json'):
+        return await read_json(request)
+    # فرم urlencoded بدون وابستگی به python-multipart
+    return dict(parse_qsl((await request.body()).decode('utf-8', 'replace')))
+
+def timestamp():
+    return datetime.datetime.now().isoformat()
+
+# ------------------ مسیرها ------------------
+async def index(request):
+    return FileResponse(os.path.join(server.app.root_path, server.app.template_folder, 'index.html'))
+
+async def set_servo(request):
+    data = await read_form_or_json(request)
+    try:
+        servo1_val = int(data.get('servo1') or data.get('servoX', 90))
+        servo2_val = int(data.get('servo2') or data.get('servoY', 90))
+    except Exception as e:
+        return JSONResponse({'status': 'error', 'message': 'پارامترهای نامعتبر: ' + str(e)})
+
+    if not (0 <= servo1_val <= 180 and 0 <= servo2_val <= 180):
+        return JSONResponse({'status': 'error', 'message': 'زوایا باید بین 0 تا 180 باشند'})
+
+    # ثبت و پخش بعد از ادغام با دستورهای هم‌زمان انجام می‌شود
+    servo_coalescer.submit(servo1_val, servo2_val)
+    return JSONResponse({'status': 'success', 'message': f'دستور سروو ثبت شد: X={servo1_val}°, Y={servo2_val}°'})
+
+async def set_color(request):
+    data = await read_json(request)
+    color = data.get('color')
+    if not color:
+        return JSONResponse({'status': 'error', 'message': 'رنگ مشخص نشده است'})
+    if await run_blocking(server.insert_color_command, color):
+        hub.broadcast({"color": color, "timestamp": timestamp()}, key="color")
+        return JSONResponse({'status': 'success', 'message': f'رنگ {color} ثبت شد'})
+    else:
+        return JSONResponse({'status': 'error', 'message': 'خطا در درج رنگ در دیتابیس'})
+
+async def set_action(request):
+    data = await read_json(request)
+    action = data.get('action')
+    if not action:
+        return JSONResponse({'status': 'error', 'message': 'اقدام مشخص نشده است'})
+    if await run_blocking(server.insert_action_command, action):
+        hub.broadcast({"action": action, "timestamp": timestamp()})
+        return JSONResponse({'status': 'success', 'message': f'اقدام {action} ثبت شد'})
+    else:
+        return JSONResponse({'status': 'error', 'message': 'خطا در درج اقدام در دیتابیس'})
+
+async def set_device_mode(request):
+    data = await read_json(request)
+    device_mode = data.get('device_mode')
+    if not device_mode or device_mode not in ['desktop', 'mobile']:
+        return JSONResponse({'status': 'error', 'message': 'حالت دستگاه نامعتبر است'})
+    if await run_blocking(server.insert_device_mode_command, device_mode):
+        hub.broadcast({"device_mode": device_mode, "timestamp": timestamp()}, key="device_mode")
+        return JSONResponse({'status': 'success', 'message': f'حالت دستگاه {device_mode} ثبت شد'})
+    else:
+        return JSONResponse({'status': 'error', 'message': 'خطا در درج حالت دستگاه در دیتابیس'})
+
+async def get_status(request):
+    version, servo = server.state_store.get("servo")
+    return conditional_json(request, servo or {'servo1': 90, 'servo2': 90}, version)
+
+async def get_state(request):
+    """همه مقادیر وضعیت با نسخه هر کدام؛ since_version و If-None-Match روی نسخه کل اعمال می‌شوند"""
+    version, values = server.state_store.snapshot()
+    return conditional_json(request, {'version': version, 'state': values}, version)
+
+def list_gallery(page, limit):
+    gallery_folder = os.path.join(server.app.static_folder, 'gallery')
+    images = [f for f in os.listdir(gallery_folder) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif'))]
+    images.sort(key=lambda x: os.path.getctime(os.path.join(gallery_folder, x)), reverse=True)
+    offset = page * limit
+    selected = images[offset:offset + limit]
+    image_urls = [f'/static/gallery/{img}' for img in selected]
+    has_more = len(images) > offset + limit
+    return {'image_urls': image_urls, 'has_more': has_more}
+
+async def get_gallery(request):
+    page = int(request.query_params.get('page', 0))
+    limit = int(request.query_params.get('limit', 6))
+    return JSONResponse(await run_blocking(list_gallery, page, limit))
+
+def remove_gallery_image(filename):
+    gallery_folder = os.path.join(server.app.static_folder, 'gallery')
+    file_path = os.path.join(gallery_folder, filename)
+
+    if os.path.exists(file_path):
+        try:
+            os.remove(file_path)
+            return {'status': 'success', 'message': 'تصویر حذف شد'}
+        except Exception as e:
+            return {'status': 'error', 'message': f'خطا در حذف تصویر: {str(e)}'}
+    else:
+        return {'status': 'error', 'message': 'تصویر یافت نشد'}
+
+async def delete_image(request):
+    data = await read_json(request)
+    filename = data.get('filename', '')
+    if not filename:
+        return JSONResponse({'status': 'error', 'message': 'نام فایل مشخص نشده است'})
+
+    if "/" in filename:
+        filename = filename.split('/')[-1]
+
+    return JSONResponse(await run_blocking(remove_gallery_image, filename))
+
+async def save_drawing(request):
+    data = await read_json(request)
+    status = data.get('status')
+    message = data.get('message')
+    hub.broadcast({"type": "toast", "status": status, "message": message})
+    return JSONResponse({'status': 'success', 'message': 'اعلان ارسال شد'})
+
+async def esp32_frame(request):
+    version, jpeg = server.esp32_frames.latest()
+    if jpeg is None:
+        return Response(status_code=503)  # Service Unavailable
+    return Response(jpeg, media_type='image/jpeg', headers={'X-Frame-Version': str(version)})
+
+async def esp32_video_feed(request):
+    async def generate():
+        last_version = 0
+        while True:
+            # بیننده تا رسیدن فریم جدید منتظر می‌ماند؛ همان بایت‌های دوربین برای همه، بدون کدگذاری دوباره
+            version, jpeg = server.esp32_frames.latest()
+            if jpeg is None or version == last_version:
+                await frame_signal.wait()
+                continue
+            last_version = version
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+    return StreamingResponse(generate(), media_type='multipart/x-mixed-replace; boundary=frame')
+
+async def ws_stats(request):
+    """آمار صف‌ها و زمان ارسال پیام‌های وب‌سوکت"""
+    stats = hub.metrics()
+    stats['servo_coalescer'] = servo_coalescer.metrics()
+    return JSONResponse(stats)
+
+async def db_stats(request):
+    """آمار نوشتن دسته‌ای دیتابیس"""
+    return JSONResponse(server.db_writer.metrics())
+
+async def frame_stats(request):
+    """آمار فریم‌های دریافتی از ESP32-CAM"""
+    return JSONResponse(server.esp32_frames.metrics())
+
+def handle_ws_message(msg):
+    # درج‌ها با wait=False فقط در صف BatchWriter قرار می‌گیرند و loop را مسدود نمی‌کنند
+    if 'servo1' in msg and 'servo2' in msg:
+        servo1 = int(msg.get('servo1', 90))
+        servo2 = int(msg.get('servo2', 90))
+        if 0 <= servo1 <= 180 and 0 <= servo2 <= 180:
+            servo_coalescer.submit(servo1, servo2)
+    elif 'color' in msg:
+        color = msg.get("color")
+        print("📥 دریافت دستور رنگ:", color)
+        server.insert_color_command(color, wait=False)
+        hub.broadcast({"color": color, "timestamp": timestamp()}, key="color")
+    elif 'action' in msg:
+        action = msg.get("action")
+        print("📥 دریافت دستور اقدام:", action)
+        server.insert_action_command(action, wait=False)
+        hub.broadcast({"action": action, "timestamp": timestamp()})
+    elif 'device_mode' in msg:
+        device_mode = msg.get("device_mode")
+        if device_mode in ['desktop', 'mobile']:
+            print("📥 دریافت دستور حالت دستگاه:", device_mode)
+            server.insert_device_mode_command(device_mode, wait=False)
+            hub.broadcast({"device_mode": device_mode, "timestamp": timestamp()}, key="device_mode")
+        else:
+            print("❌ حالت دستگاه نامعتبر:", device_mode)
+
+async def websocket(ws):
+    await ws.accept()
+    print("یک کلاینت وب‌سوکت متصل شد. تعداد:", hub.register(ws))
+    try:
+        while True:
+            message = await ws.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            try:
+                # بررسی اگر داده باینری (فریم از ESP32-CAM) باشد
+                if message.get("bytes") is not None:
+                    if server.esp32_frames.publish(message["bytes"]) is not None:
+                        frame_signal.notify()
+                elif message.get("text") is not None:
+                    handle_ws_message(json.loads(message["text"]))
+            except Exception as e:
+                print("❌ خطا در پردازش پیام وب‌سوکت:", e)
+    except Exception as e:
+        print("❌ خطا در وب‌سوکت:", e)
+    finally:
+        print("یک کلاینت وب‌سوکت قطع شد. تعداد:", hub.unregister(ws))
+
+async def lifespan(app):
+    global frame_signal
+    server.start_server()
+    hub.loop = asyncio.get_running_loop()
+    frame_signal = FrameSignal()
+    yield
+    db_executor.shutdown(wait=False)
+
+app = Starlette(routes=[
+    Route('/', index),
+    Route('/set_servo', set_servo, methods=['POST']),
+    Route('/set_color', set_color, methods=['POST']),
+    Route('/set_action', set_action, methods=['POST']),
+    Route('/set_device_mode', set_device_mode, methods=['POST']),
+    Route('/get_status', get_status, methods=['GET']),
+    Route('/get_state', get_state, methods=['GET']),
+    Route('/get_gallery', get_gallery),
+    Route('/delete_image', delete_image, methods=['POST']),
+    Route('/save_drawing', save_drawing, methods=['POST']),
+    Route('/esp32_frame', esp32_frame),
+    Route('/esp32_video_feed', esp32_video_feed),
+    # نام مسیر سرور استریم جدا (stream_cam)؛ ESP32 و بینندگان می‌توانند مستقیم به همین سرور وصل شوند
+    Route('/video_feed', esp32_video_feed),
+    Route('/ws_stats', ws_stats),
+    Route('/db_stats', db_stats),
+    Route('/frame_stats', frame_stats),
+    WebSocketRoute('/ws', websocket),
+    Mount('/static', StaticFiles(directory=server.app.static_folder), name='static'),
+], lifespan=lifespan)
+
+if __name__ == '__main__':
+    uvicorn.run(app, host=HOST, port=PORT)
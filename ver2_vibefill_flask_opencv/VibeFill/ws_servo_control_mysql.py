@@ -1,15 +1,14 @@
 from flask import Flask, render_template, request, jsonify, url_for, Response
 from flask_cors import CORS
 from flask_sock import Sock
-import sqlite3
 import datetime
 import json
 import os
+import sys
 import time
-import numpy as np
-import cv2
-from queue import Queue
-from threading import Lock
+from threading import Lock, Thread, Condition
+from collections import deque
+from command_db import ConnectionPool, BatchWriter, migrate_db, migrate_files, retention_worker
 
 app = Flask(__name__)
 CORS(app)
@@ -18,19 +17,60 @@ sock = Sock(app)
 # نام فایل دیتابیس SQLite
 DB_FILE = "servo_commands.db"
 
-# متغیرهای جهانی برای مدیریت فریم‌های ESP32-CAM
-esp32_frame_queue = Queue(maxsize=1)
-frame_lock = Lock()
-latest_frame = None
+# ------------------ فریم‌های ESP32-CAM ------------------
+class FrameBroker:
+    """بایت‌های JPEG دریافتی از ESP32-CAM را بدون تغییر نگه می‌دارد تا همه بینندگان همان بافر را بگیرند؛
+    سرور هیچ‌وقت فریم را دیکد نمی‌کند"""
+    def __init__(self):
+        # Condition هم نقش قفل را دارد و هم بینندگان منتظر را با رسیدن فریم جدید بیدار می‌کند
+        self.lock = Condition()
+        self.jpeg = None
+        self.version = 0
+        self.published = 0
+        self.rejected = 0
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    def publish(self, data):
+        # بررسی سبک نشانگرهای شروع و پایان JPEG به‌جای دیکد کامل هر فریم
+        if len(data) < 4 or data[:2] != b'\xff\xd8' or b'\xff\xd9' not in data[-16:]:
+            with self.lock:
+                self.rejected += 1
+            return None
+        with self.lock:
+            self.jpeg = bytes(data)
+            self.version += 1
+            self.published += 1
+            self.lock.notify_all()
+            return self.version
+
+    def latest(self):
+        """(نسخه، بایت‌های JPEG) آخرین فریم؛ قبل از اولین فریم (0, None)"""
+        with self.lock:
+            return self.version, self.jpeg
+
+    def wait_for_new(self, last_version, timeout=1.0):
+        """تا رسیدن نسخه‌ای غیر از last_version (یا پایان timeout) منتظر می‌ماند"""
+        with self.lock:
+            self.lock.wait_for(lambda: self.jpeg is not None and self.version != last_version, timeout)
+            return self.version, self.jpeg
+
+    def metrics(self):
+        with self.lock:
+            return {
+                'version': self.version,
+                'published': self.published,
+                'rejected': self.rejected,
+                'frame_bytes': len(self.jpeg) if self.jpeg is not None else 0
+            }
+
+esp32_frames = FrameBroker()
+
+db_pool = ConnectionPool(DB_FILE)
+# جدول‌هایی که مهاجرت و پاک‌سازی دوره‌ای روی آن‌ها انجام می‌شود
+COMMAND_TABLES = ["servo_commands", "color_commands", "action_commands", "device_mode_commands"]
 
 def init_db():
     """ایجاد دیتابیس و جداول servo_commands، color_commands، action_commands و device_mode_commands"""
-    conn = get_db_connection()
+    conn = db_pool.connect()
     try:
         conn.execute("""
             CREATE TABLE IF NOT EXISTS servo_commands (
@@ -66,67 +106,347 @@ def init_db():
             );
         """)
         conn.commit()
+        migrate_db(conn, COMMAND_TABLES)
         print("✅ دیتابیس و جداول ایجاد شدند یا موجود بودند.")
     except Exception as e:
         print("❌ خطا در ایجاد دیتابیس/جدول:", e)
     finally:
         conn.close()
 
-init_db()
+db_writer = None  # در start_server ساخته می‌شود
 
-def insert_servo_command(servo1, servo2):
-    conn = get_db_connection()
-    try:
-        conn.execute("INSERT INTO servo_commands (servo1, servo2) VALUES (?, ?)", (servo1, servo2))
-        conn.commit()
+# ------------------ وضعیت لحظه‌ای در حافظه ------------------
+# دیتابیس فقط گزارش ماندگار دستورهاست؛ /get_status و /get_state از همین حافظه جواب داده می‌شوند
+STATE_KEYS = {
+    "servo": "servo_commands",
+    "color": "color_commands",
+    "action": "action_commands",
+    "device_mode": "device_mode_commands"
+}
+
+class StateStore:
+    """آخرین سروو، رنگ، اقدام و حالت دستگاه، هر کدام با شماره نسخه"""
+    def __init__(self):
+        self.lock = Lock()
+        # شناسه اجرای فعلی در ETag تا بعد از ری‌استارت سرور نسخه‌های قدیمی اشتباهاً معتبر نمانند
+        self.boot_id = format(int(time.time()), "x")
+        self.version = 0
+        self.values = {key: None for key in STATE_KEYS}
+        self.versions = {key: 0 for key in STATE_KEYS}
+
+    def update(self, key, value):
+        with self.lock:
+            self.version += 1
+            self.values[key] = value
+            self.versions[key] = self.version
+            return self.version
+
+    def get(self, key):
+        """(نسخه، مقدار) یک کلید"""
+        with self.lock:
+            return self.versions[key], self.values[key]
+
+    def snapshot(self):
+        with self.lock:
+            return self.version, {key: {"value": self.values[key], "version": self.versions[key]} for key in STATE_KEYS}
+
+    def load_from_db(self):
+        """مقدار اولیه هر کلید از آخرین ردیف پردازش‌نشده دیتابیس"""
+        columns = {"servo": "servo1, servo2", "color": "color", "action": "action", "device_mode": "device_mode"}
+        try:
+            with db_pool.connection() as conn:
+                for key, table in STATE_KEYS.items():
+                    row = conn.execute(f"""
+                        SELECT {columns[key]}, created_at
+                        FROM {table}
+                        WHERE processed = 0
+                        ORDER BY created_at DESC
+                        LIMIT 1
+                    """).fetchone()
+                    if row:
+                        self.update(key, dict(row))
+        except Exception as e:
+            print("❌ خطا در خواندن وضعیت اولیه از دیتابیس:", e)
+
+state_store = StateStore()
+
+def start_server():
+    """ساخت/ارتقای دیتابیس، نویسنده دسته‌ای، پاک‌سازی دوره‌ای و بارگذاری وضعیت؛ import ماژول به دیتابیس دست نمی‌زند
+    و این تابع قبل از سرویس‌دهی (app.run یا lifespan سرور async) یک بار صدا زده می‌شود"""
+    global db_writer
+    if db_writer is not None:
+        return
+    init_db()
+    db_writer = BatchWriter(db_pool)
+    Thread(target=retention_worker, args=(db_pool, COMMAND_TABLES), daemon=True).start()
+    state_store.load_from_db()
+
+def db_timestamp():
+    """زمان فعلی در قالب CURRENT_TIMESTAMP دیتابیس (UTC)"""
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+def conditional_json(payload, version):
+    """پاسخ JSON با ETag؛ اگر کلاینت همین نسخه را دارد (If-None-Match یا since_version) فقط 304 برمی‌گردد"""
+    etag = f"{state_store.boot_id}-{version}"
+    since_version = request.args.get('since_version', type=int)
+    if request.if_none_match.contains(etag) or since_version == version:
+        response = Response(status=304)
+    else:
+        response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['X-State-Version'] = str(version)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def insert_servo_command(servo1, servo2, wait=True):
+    def committed():
+        state_store.update("servo", {"servo1": servo1, "servo2": servo2, "created_at": db_timestamp()})
+    if db_writer.submit("INSERT INTO servo_commands (servo1, servo2) VALUES (?, ?)", (servo1, servo2), wait, on_commit=committed):
         return True
-    except Exception as e:
-        print("❌ خطا در درج دستور سروو:", e)
-        return False
-    finally:
-        conn.close()
+    print("❌ خطا در درج دستور سروو")
+    return False
 
-def insert_color_command(color):
-    conn = get_db_connection()
-    try:
-        conn.execute("INSERT INTO color_commands (color) VALUES (?)", (color,))
-        conn.commit()
+def insert_color_command(color, wait=True):
+    def committed():
+        state_store.update("color", {"color": color, "created_at": db_timestamp()})
         print(f"✅ رنگ '{color}' در جدول ثبت شد.")
+    if db_writer.submit("INSERT INTO color_commands (color) VALUES (?)", (color,), wait, on_commit=committed):
         return True
-    except Exception as e:
-        print("❌ خطا در درج دستور رنگ:", e)
-        return False
-    finally:
-        conn.close()
+    print("❌ خطا در درج دستور رنگ")
+    return False
 
-def insert_action_command(action):
-    conn = get_db_connection()
-    try:
-        conn.execute("INSERT INTO action_commands (action) VALUES (?)", (action,))
-        conn.commit()
+def insert_action_command(action, wait=True):
+    def committed():
+        state_store.update("action", {"action": action, "created_at": db_timestamp()})
         print(f"✅ اقدام '{action}' در جدول ثبت شد.")
+    if db_writer.submit("INSERT INTO action_commands (action) VALUES (?)", (action,), wait, on_commit=committed):
         return True
-    except Exception as e:
-        print("❌ خطا در درج دستور اقدام:", e)
-        return False
-    finally:
-        conn.close()
+    print("❌ خطا در درج دستور اقدام")
+    return False
 
-def insert_device_mode_command(device_mode):
-    conn = get_db_connection()
-    try:
-        conn.execute("INSERT INTO device_mode_commands (device_mode) VALUES (?)", (device_mode,))
-        conn.commit()
+def insert_device_mode_command(device_mode, wait=True):
+    def committed():
+        state_store.update("device_mode", {"device_mode": device_mode, "created_at": db_timestamp()})
         print(f"✅ حالت دستگاه '{device_mode}' در جدول ثبت شد.")
+    if db_writer.submit("INSERT INTO device_mode_commands (device_mode) VALUES (?)", (device_mode,), wait, on_commit=committed):
         return True
-    except Exception as e:
-        print("❌ خطا در درج دستور حالت دستگاه:", e)
-        return False
-    finally:
-        conn.close()
+    print("❌ خطا در درج دستور حالت دستگاه")
+    return False
+
+# ------------------ پخش پیام به کلاینت‌های وب‌سوکت ------------------
+CLIENT_QUEUE_SIZE = 64  # حداکثر پیام در صف خروجی هر کلاینت
+CLIENT_STALL_TIMEOUT = 10  # کلاینتی که این مدت (ثانیه) هیچ پیامی دریافت نکرده و صفش پر است حذف می‌شود
+
+class ClientChannel:
+    """صف خروجی محدود و ترد ارسال یک کلاینت؛ کلاینت کند فقط خودش عقب می‌افتد"""
+    def __init__(self, ws, hub):
+        self.ws = ws
+        self.hub = hub
+        self.messages = deque()  # (کلید ادغام, متن پیام, زمان ورود به صف)
+        self.condition = Condition()
+        self.alive = True
+        self.dropped = 0
+        self.last_progress = time.monotonic()
+        Thread(target=self.run, daemon=True).start()
+
+    def offer(self, text, key=None):
+        """پیام‌های با کلید یکسان (مثلاً موقعیت سروو) جایگزین نسخه قبلی در صف می‌شوند"""
+        with self.condition:
+            if not self.alive:
+                return False
+            if key is not None:
+                for i, (queued_key, _, queued_at) in enumerate(self.messages):
+                    if queued_key == key:
+                        self.messages[i] = (key, text, queued_at)
+                        return True
+            if len(self.messages) >= CLIENT_QUEUE_SIZE:
+                if time.monotonic() - self.last_progress > CLIENT_STALL_TIMEOUT:
+                    return False  # کلاینت گیر کرده؛ hub آن را حذف می‌کند
+                self.messages.popleft()  # قدیمی‌ترین پیام کنار گذاشته می‌شود
+                self.dropped += 1
+            if not self.messages:
+                # بیکار بودن کلاینت گیر کردن حساب نمی‌شود؛ زمان انتظار از اولین پیام صف شمرده می‌شود
+                self.last_progress = time.monotonic()
+            self.messages.append((key, text, time.monotonic()))
+            self.condition.notify()
+            return True
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.alive and not self.messages:
+                    self.condition.wait()
+                if not self.alive:
+                    return
+                _, text, queued_at = self.messages.popleft()
+            start = time.monotonic()
+            try:
+                self.ws.send(text)
+            except Exception as e:
+                print("❌ خطا در ارسال به وب‌سوکت، کلاینت حذف شد:", e)
+                self.hub.evict(self)
+                return
+            now = time.monotonic()
+            self.last_progress = now
+            self.hub.record_send(now - start, now - queued_at)
+
+    def close(self):
+        with self.condition:
+            self.alive = False
+            self.messages.clear()
+            self.condition.notify()
+
+    def depth(self):
+        with self.condition:
+            return len(self.messages)
+
+class BroadcastHub:
+    """پخش پیام به همه کلاینت‌ها بدون منتظر ماندن برای ارسال؛ هر پیام فقط یک بار JSON می‌شود"""
+    def __init__(self):
+        self.lock = Lock()
+        self.channels = {}
+        self.sent = 0
+        self.evicted = 0
+        self.closed_dropped = 0  # پیام‌های کنارگذاشته کلاینت‌هایی که دیگر متصل نیستند
+        self.send_seconds = 0.0
+        self.max_send_seconds = 0.0
+        self.queue_seconds = 0.0
+
+    def register(self, ws):
+        with self.lock:
+            self.channels[ws] = ClientChannel(ws, self)
+            return len(self.channels)
+
+    def unregister(self, ws):
+        with self.lock:
+            channel = self.channels.pop(ws, None)
+            count = len(self.channels)
+            if channel is not None:
+                self.closed_dropped += channel.dropped
+        if channel is not None:
+            channel.close()
+        return count
+
+    def evict(self, channel):
+        with self.lock:
+            if self.channels.get(channel.ws) is not channel:
+                return
+            del self.channels[channel.ws]
+            self.evicted += 1
+            self.closed_dropped += channel.dropped
+        channel.close()
+        # بستن سوکت ممکن است روی اتصال مرده معطل شود، پس در ترد جدا انجام می‌شود
+        Thread(target=self._close_socket, args=(channel.ws,), daemon=True).start()
+
+    @staticmethod
+    def _close_socket(ws):
+        try:
+            ws.close()
+        except Exception:
+            pass
+
+    def broadcast(self, message, key=None):
+        text = message if isinstance(message, str) else json.dumps(message)
+        with self.lock:
+            channels = list(self.channels.values())
+        for channel in channels:
+            if not channel.offer(text, key):
+                print("❌ کلاینت وب‌سوکت پاسخ نمی‌دهد و حذف شد.")
+                self.evict(channel)
+
+    def record_send(self, send_seconds, queue_seconds):
+        with self.lock:
+            self.sent += 1
+            self.send_seconds += send_seconds
+            self.queue_seconds += queue_seconds
+            self.max_send_seconds = max(self.max_send_seconds, send_seconds)
+
+    def count(self):
+        with self.lock:
+            return len(self.channels)
+
+    def metrics(self):
+        with self.lock:
+            channels = list(self.channels.values())
+            sent = self.sent
+            closed_dropped = self.closed_dropped
+            result = {
+                'clients': len(channels),
+                'sent': sent,
+                'evicted': self.evicted,
+                'avg_send_ms': 1000 * self.send_seconds / sent if sent else 0,
+                'max_send_ms': 1000 * self.max_send_seconds,
+                'avg_queue_ms': 1000 * self.queue_seconds / sent if sent else 0
+            }
+        depths = [channel.depth() for channel in channels]
+        result['queued'] = sum(depths)
+        result['max_queue_depth'] = max(depths, default=0)
+        result['dropped'] = closed_dropped + sum(channel.dropped for channel in channels)
+        return result
+
+hub = BroadcastHub()
+
+# ------------------ ادغام دستورهای سروو ------------------
+# هنگام کشیدن اسلایدرها ده‌ها دستور در ثانیه می‌رسد؛ در هر پنجره فقط آخرین هدف ثبت و پخش می‌شود
+SERVO_COALESCE_WINDOW = 0.03  # ثانیه (۲۰ تا ۵۰ میلی‌ثانیه مناسب است)
+
+class ServoCoalescer:
+    """اولین دستور بعد از سکون بلافاصله ارسال می‌شود و بعدی‌ها حداکثر یک بار در هر پنجره.
+    broadcast همان hub.broadcast سروری است که این ادغام‌کننده را ساخته (Flask یا async)"""
+    def __init__(self, broadcast, window=SERVO_COALESCE_WINDOW):
+        self.broadcast = broadcast
+        self.window = window
+        self.condition = Condition()
+        self.pending = None
+        self.last_sent = None
+        self.last_flush = 0
+        self.received = 0
+        self.published = 0
+        Thread(target=self.run, daemon=True).start()
+
+    def submit(self, servo1, servo2):
+        with self.condition:
+            if self.pending is None and time.monotonic() - self.last_flush >= self.window:
+                # یک پنجره کامل بدون ورودی گذشته؛ دستور بعد از سکون (حتی همان زاویه قبلی) همیشه ثبت و پخش می‌شود
+                self.last_sent = None
+            self.pending = (servo1, servo2)
+            self.received += 1
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None:
+                    self.condition.wait()
+                delay = self.last_flush + self.window - time.monotonic()
+                if delay > 0:
+                    # دستورهای رسیده در این فاصله فقط pending را جایگزین می‌کنند
+                    self.condition.wait(delay)
+                    continue
+                target, self.pending = self.pending, None
+                self.last_flush = time.monotonic()
+                # فقط وسط یک رشته دستور، برگشتن به همان هدف ارسال‌شده تکرار نمی‌شود
+                if target == self.last_sent:
+                    continue
+                self.last_sent = target
+            self.publish(*target)
+
+    def publish(self, servo1, servo2):
+        insert_servo_command(servo1, servo2, wait=False)
+        self.broadcast({"servo1": servo1, "servo2": servo2, "timestamp": datetime.datetime.now().isoformat()}, key="servo")
+        with self.condition:
+            self.published += 1
 
-# لیست اتصال‌های وب‌سوکت فعال
-clients = []
+    def metrics(self):
+        with self.condition:
+            return {
+                'received': self.received,
+                'published': self.published,
+                'ratio': self.received / self.published if self.published else 0,
+                'window_ms': 1000 * self.window
+            }
+
+servo_coalescer = ServoCoalescer(hub.broadcast)
 
 @app.route('/')
 def index():
@@ -144,20 +464,9 @@ def set_servo():
     if not (0 <= servo1_val <= 180 and 0 <= servo2_val <= 180):
         return jsonify({'status': 'error', 'message': 'زوایا باید بین 0 تا 180 باشند'})
 
-    if insert_servo_command(servo1_val, servo2_val):
-        command = {
-            'servo1': servo1_val,
-            'servo2': servo2_val,
-            'timestamp': datetime.datetime.now().isoformat()
-        }
-        for ws in clients.copy():
-            try:
-                ws.send(json.dumps(command))
-            except Exception as e:
-                print("❌ خطا در ارسال به وب‌سوکت:", e)
-        return jsonify({'status': 'success', 'message': f'دستور سروو ثبت شد: X={servo1_val}°, Y={servo2_val}°'})
-    else:
-        return jsonify({'status': 'error', 'message': 'خطا در درج دستور در دیتابیس'})
+    # ثبت و پخش بعد از ادغام با دستورهای هم‌زمان انجام می‌شود
+    servo_coalescer.submit(servo1_val, servo2_val)
+    return jsonify({'status': 'success', 'message': f'دستور سروو ثبت شد: X={servo1_val}°, Y={servo2_val}°'})
 
 @app.route('/set_color', methods=['POST'])
 def set_color():
@@ -166,11 +475,7 @@ def set_color():
     if not color:
         return jsonify({'status': 'error', 'message': 'رنگ مشخص نشده است'})
     if insert_color_command(color):
-        for ws in clients.copy():
-            try:
-                ws.send(json.dumps({"color": color, "timestamp": datetime.datetime.now().isoformat()}))
-            except Exception as e:
-                print("❌ خطا در ارسال به وب‌سوکت:", e)
+        hub.broadcast({"color": color, "timestamp": datetime.datetime.now().isoformat()}, key="color")
         return jsonify({'status': 'success', 'message': f'رنگ {color} ثبت شد'})
     else:
         return jsonify({'status': 'error', 'message': 'خطا در درج رنگ در دیتابیس'})
@@ -182,11 +487,7 @@ def set_action():
     if not action:
         return jsonify({'status': 'error', 'message': 'اقدام مشخص نشده است'})
     if insert_action_command(action):
-        for ws in clients.copy():
-            try:
-                ws.send(json.dumps({"action": action, "timestamp": datetime.datetime.now().isoformat()}))
-            except Exception as e:
-                print("❌ خطا در ارسال به وب‌سوکت:", e)
+        hub.broadcast({"action": action, "timestamp": datetime.datetime.now().isoformat()})
         return jsonify({'status': 'success', 'message': f'اقدام {action} ثبت شد'})
     else:
         return jsonify({'status': 'error', 'message': 'خطا در درج اقدام در دیتابیس'})
@@ -198,35 +499,21 @@ def set_device_mode():
     if not device_mode or device_mode not in ['desktop', 'mobile']:
         return jsonify({'status': 'error', 'message': 'حالت دستگاه نامعتبر است'})
     if insert_device_mode_command(device_mode):
-        for ws in clients.copy():
-            try:
-                ws.send(json.dumps({"device_mode": device_mode, "timestamp": datetime.datetime.now().isoformat()}))
-            except Exception as e:
-                print("❌ خطا در ارسال به وب‌سوکت:", e)
+        hub.broadcast({"device_mode": device_mode, "timestamp": datetime.datetime.now().isoformat()}, key="device_mode")
         return jsonify({'status': 'success', 'message': f'حالت دستگاه {device_mode} ثبت شد'})
     else:
         return jsonify({'status': 'error', 'message': 'خطا در درج حالت دستگاه در دیتابیس'})
 
 @app.route('/get_status', methods=['GET'])
 def get_status():
-    conn = get_db_connection()
-    try:
-        cur = conn.execute("""
-            SELECT servo1, servo2, created_at 
-            FROM servo_commands 
-            WHERE processed = 0 
-            ORDER BY created_at DESC 
-            LIMIT 1
-        """)
-        row = cur.fetchone()
-        if row:
-            return jsonify(dict(row))
-        else:
-            return jsonify({'servo1': 90, 'servo2': 90})
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)})
-    finally:
-        conn.close()
+    version, servo = state_store.get("servo")
+    return conditional_json(servo or {'servo1': 90, 'servo2': 90}, version)
+
+@app.route('/get_state', methods=['GET'])
+def get_state():
+    """همه مقادیر وضعیت با نسخه هر کدام؛ since_version و If-None-Match روی نسخه کل اعمال می‌شوند"""
+    version, values = state_store.snapshot()
+    return conditional_json({'version': version, 'state': values}, version)
 
 @app.route('/get_gallery')
 def get_gallery():
@@ -268,42 +555,52 @@ def save_drawing():
     data = request.get_json()
     status = data.get('status')
     message = data.get('message')
-    for ws in clients.copy():
-        try:
-            ws.send(json.dumps({"type": "toast", "status": status, "message": message}))
-        except Exception as e:
-            print("❌ خطا در ارسال به وب‌سوکت:", e)
+    hub.broadcast({"type": "toast", "status": status, "message": message})
     return jsonify({'status': 'success', 'message': 'اعلان ارسال شد'})
 
 @app.route('/esp32_frame')
 def esp32_frame():
-    global latest_frame
-    with frame_lock:
-        if latest_frame is None:
-            return Response(status=503)  # Service Unavailable
-        ret, buffer = cv2.imencode('.jpg', latest_frame)
-        return Response(buffer.tobytes(), mimetype='image/jpeg')
+    version, jpeg = esp32_frames.latest()
+    if jpeg is None:
+        return Response(status=503)  # Service Unavailable
+    response = Response(jpeg, mimetype='image/jpeg')
+    response.headers['X-Frame-Version'] = str(version)
+    return response
 
 @app.route('/esp32_video_feed')
 def esp32_video_feed():
     def generate():
-        global latest_frame
+        last_version = 0
         while True:
-            with frame_lock:
-                if latest_frame is None:
-                    continue
-                ret, buffer = cv2.imencode('.jpg', latest_frame)
-                frame_bytes = buffer.tobytes()
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            time.sleep(0.1)
+            # منتظر فریم جدید می‌ماند؛ همان بایت‌های دریافتی از دوربین برای همه بینندگان، بدون کدگذاری دوباره
+            version, jpeg = esp32_frames.wait_for_new(last_version)
+            if jpeg is None or version == last_version:
+                continue
+            last_version = version
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
     return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@app.route('/ws_stats')
+def ws_stats():
+    """آمار صف‌ها و زمان ارسال پیام‌های وب‌سوکت"""
+    stats = hub.metrics()
+    stats['servo_coalescer'] = servo_coalescer.metrics()
+    return jsonify(stats)
+
+@app.route('/db_stats')
+def db_stats():
+    """آمار نوشتن دسته‌ای دیتابیس"""
+    return jsonify(db_writer.metrics())
+
+@app.route('/frame_stats')
+def frame_stats():
+    """آمار فریم‌های دریافتی از ESP32-CAM"""
+    return jsonify(esp32_frames.metrics())
+
 @sock.route('/ws')
 def websocket(ws):
-    global latest_frame
-    clients.append(ws)
-    print("یک کلاینت وب‌سوکت متصل شد. تعداد:", len(clients))
+    print("یک کلاینت وب‌سوکت متصل شد. تعداد:", hub.register(ws))
     try:
         while True:
             data = ws.receive()
@@ -312,14 +609,7 @@ def websocket(ws):
             try:
                 # بررسی اگر داده باینری (فریم از ESP32-CAM) باشد
                 if isinstance(data, bytes):
-                    img = np.frombuffer(data, dtype=np.uint8)
-                    frame = cv2.imdecode(img, cv2.IMREAD_COLOR)
-                    if frame is not None:
-                        with frame_lock:
-                            latest_frame = frame
-                            if esp32_frame_queue.full():
-                                esp32_frame_queue.get()
-                            esp32_frame_queue.put(frame)
+                    esp32_frames.publish(data)
                 else:
                     # پردازش پیام‌های JSON
                     msg = json.loads(data)
@@ -327,40 +617,23 @@ def websocket(ws):
                         servo1 = int(msg.get('servo1', 90))
                         servo2 = int(msg.get('servo2', 90))
                         if 0 <= servo1 <= 180 and 0 <= servo2 <= 180:
-                            insert_servo_command(servo1, servo2)
-                            for client in clients.copy():
-                                try:
-                                    client.send(json.dumps({"servo1": servo1, "servo2": servo2, "timestamp": datetime.datetime.now().isoformat()}))
-                                except Exception as e:
-                                    print("❌ خطا در ارسال به کلاینت وب‌سوکت:", e)
+                            servo_coalescer.submit(servo1, servo2)
                     elif 'color' in msg:
                         color = msg.get("color")
                         print("📥 دریافت دستور رنگ:", color)
-                        insert_color_command(color)
-                        for client in clients.copy():
-                            try:
-                                client.send(json.dumps({"color": color, "timestamp": datetime.datetime.now().isoformat()}))
-                            except Exception as e:
-                                print("❌ خطا در ارسال به کلاینت وب‌سوکت:", e)
+                        insert_color_command(color, wait=False)
+                        hub.broadcast({"color": color, "timestamp": datetime.datetime.now().isoformat()}, key="color")
                     elif 'action' in msg:
                         action = msg.get("action")
                         print("📥 دریافت دستور اقدام:", action)
-                        insert_action_command(action)
-                        for client in clients.copy():
-                            try:
-                                client.send(json.dumps({"action": action, "timestamp": datetime.datetime.now().isoformat()}))
-                            except Exception as e:
-                                print("❌ خطا در ارسال به کلاینت وب‌سوکت:", e)
+                        insert_action_command(action, wait=False)
+                        hub.broadcast({"action": action, "timestamp": datetime.datetime.now().isoformat()})
                     elif 'device_mode' in msg:
                         device_mode = msg.get("device_mode")
                         if device_mode in ['desktop', 'mobile']:
                             print("📥 دریافت دستور حالت دستگاه:", device_mode)
-                            insert_device_mode_command(device_mode)
-                            for client in clients.copy():
-                                try:
-                                    client.send(json.dumps({"device_mode": device_mode, "timestamp": datetime.datetime.now().isoformat()}))
-                                except Exception as e:
-                                    print("❌ خطا در ارسال به کلاینت وب‌سوکت:", e)
+                            insert_device_mode_command(device_mode, wait=False)
+                            hub.broadcast({"device_mode": device_mode, "timestamp": datetime.datetime.now().isoformat()}, key="device_mode")
                         else:
                             print("❌ حالت دستگاه نامعتبر:", device_mode)
             except Exception as e:
@@ -368,8 +641,12 @@ def websocket(ws):
     except Exception as e:
         print("❌ خطا در وب‌سوکت:", e)
     finally:
-        clients.remove(ws)
-        print("یک کلاینت وب‌سوکت قطع شد. تعداد:", len(clients))
+        print("یک کلاینت وب‌سوکت قطع شد. تعداد:", hub.unregister(ws))
 
 if __name__ == '__main__':
+    # ارتقای فایل‌های دیتابیس دیگر بدون اجرای سرور: python ws_servo_control_mysql.py --migrate old.db ...
+    if len(sys.argv) > 1 and sys.argv[1] == '--migrate':
+        migrate_files(sys.argv[2:], COMMAND_TABLES)
+        sys.exit(0)
+    start_server()
     app.run(host='0.0.0.0', port=7000, threaded=True)
\ No newline at end of file